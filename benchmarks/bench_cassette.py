@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark recording a workload to a cassette and replaying it
+
+Replaying without a speed measures the client side only: parsing, caching
+and concurrency without network or server time.
+
+example 1:
+python benchmarks/bench_cassette.py --hosts 1000 --services 10
+'''
+
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.cassette import record, replay  # noqa: E402
+from icinga2api.client import Client  # noqa: E402
+from common import Results, measure, parser, quiet  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+
+def workload(client, events):
+    '''
+    listings, repeated gets and an event stream
+    '''
+
+    client.objects.list('Service', attrs=['state', 'last_check_result'])
+    for number in range(100):
+        client.objects.get('Host', 'host{0:06d}.example.com'.format(
+            number % 10))
+    client.status.list()
+    for number, _ in enumerate(client.events.subscribe(['CheckResult'],
+                                                       'bench')):
+        if number + 1 >= events:
+            break
+
+
+def main():
+    '''
+    run the benchmarks
+    '''
+
+    args = parser(__doc__.splitlines()[1])
+    args.add_argument('--hosts', type=int, default=1000)
+    args.add_argument('--services', type=int, default=10,
+                      help='services per host')
+    args.add_argument('--latency', type=float, default=0.002)
+    args.add_argument('--events', type=int, default=5000)
+    args = args.parse_args()
+    quiet()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'bench.cassette')
+    results = Results()
+    try:
+        with MockIcinga(args.hosts, args.services, args.latency,
+                        event_batch=100) as server:
+            client = Client(server.url, 'root', 'icinga',
+                            transport=record(path, redact=['address']))
+            seconds = measure(lambda: workload(client, args.events),
+                              repeat=1)
+            client.close()
+            received = server.bytes_sent
+        results.add('recorded workload', seconds * 1000, 'ms',
+                    better='lower')
+        results.add('response bytes', received / 1024.0, 'KiB',
+                    better='lower')
+        results.add('cassette bytes', os.path.getsize(path) / 1024.0, 'KiB',
+                    better='lower')
+        results.add('deduplicated bodies', client.transport.duplicates,
+                    'bodies')
+
+        for speed in (None, 10.0):
+            client = Client('https://localhost:5665/', 'root', 'icinga',
+                            transport=replay(path, speed))
+            seconds = measure(lambda: workload(client, args.events))
+            results.add('replayed workload speed {0}'.format(speed),
+                        seconds * 1000, 'ms', better='lower')
+    finally:
+        shutil.rmtree(directory)
+    results.finish(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark the request and stream paths against the mock server
+
+example 1:
+python benchmarks/bench_client.py --hosts 1000 --services 10
+
+example 2:
+python benchmarks/bench_client.py --save baseline.json
+python benchmarks/bench_client.py --compare baseline.json
+'''
+
+from __future__ import print_function
+import gc
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.client import Client  # noqa: E402
+from common import Results, measure, parser, quiet  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+
+def bench_list(client, results, count):
+    '''
+    Objects.list of all services
+    '''
+
+    seconds = measure(lambda: client.objects.list('Service'))
+    results.add('objects.list(Service) duration', seconds * 1000, 'ms',
+                better='lower')
+    results.add('objects.list(Service) objects/s', count / seconds,
+                'objects/s')
+
+    seconds = measure(lambda: client.objects.get(
+        'Host', 'host000001.example.com'), number=50)
+    results.add('objects.get(Host) latency', seconds * 1000, 'ms',
+                better='lower')
+
+
+def bench_get_many(client, results, hosts):
+    '''
+    Objects.get_many compared with one Objects.get per name
+    '''
+
+    names = ['host{0:06d}.example.com'.format(number)
+             for number in range(min(hosts, 500))]
+    seconds = measure(lambda: client.objects.get_many(
+        'Host', names, attrs=['state']))
+    results.add('objects.get_many(Host) {0} names'.format(len(names)),
+                seconds * 1000, 'ms', better='lower')
+    seconds = measure(lambda: [client.objects.get('Host', name, ['state'])
+                               for name in names], repeat=1)
+    results.add('objects.get(Host) x {0}'.format(len(names)),
+                seconds * 1000, 'ms', better='lower')
+
+
+def bench_memory(client, results, count):
+    '''
+    memory per listed object
+    '''
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    services = client.objects.list('Service')
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    results.add('objects.list(Service) memory/object',
+                float(after - before) / count, 'bytes', better='lower')
+    del services
+
+
+def bench_check_results(client, results, calls, threads):
+    '''
+    Actions.process_check_result throughput
+    '''
+
+    def submit(number):
+        for _ in range(number):
+            client.actions.process_check_result(
+                'Service', 'host000001.example.com!service01', 0,
+                'PING OK - Packet loss = 0%',
+                performance_data=['rta=0.52ms;3000;5000;0'])
+
+    seconds = measure(lambda: submit(calls), repeat=1)
+    results.add('process_check_result sequential', calls / seconds, 'calls/s')
+
+    workers = [threading.Thread(target=submit, args=(calls // threads,))
+               for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - start
+    results.add('process_check_result {0} threads'.format(threads),
+                (calls // threads * threads) / seconds, 'calls/s')
+
+
+def bench_events(client, results, count):
+    '''
+    Events.subscribe throughput
+    '''
+
+    start = time.perf_counter()
+    received = 0
+    for event in client.events.subscribe(['CheckResult'], 'bench'):
+        json.loads(event)
+        received += 1
+        if received >= count:
+            break
+    seconds = time.perf_counter() - start
+    results.add('events.subscribe', received / seconds, 'events/s')
+
+
+def main():
+    '''
+    run the benchmarks
+    '''
+
+    args = parser(__doc__.splitlines()[1])
+    args.add_argument('--hosts', type=int, default=1000)
+    args.add_argument('--services', type=int, default=10,
+                      help='services per host')
+    args.add_argument('--latency', type=float, default=0.0)
+    args.add_argument('--calls', type=int, default=500)
+    args.add_argument('--threads', type=int, default=8)
+    args.add_argument('--events', type=int, default=20000)
+    args.add_argument('--certfile', help='benchmark over TLS')
+    args.add_argument('--keyfile')
+    args = args.parse_args()
+    quiet()
+
+    server = MockIcinga(args.hosts, args.services, args.latency,
+                        event_batch=100, certfile=args.certfile,
+                        keyfile=args.keyfile)
+    count = args.hosts * args.services
+    results = Results()
+    with server:
+        client = Client(server.url, 'root', 'icinga')
+        bench_list(client, results, count)
+        bench_get_many(client, results, args.hosts)
+        bench_memory(client, results, count)
+        bench_check_results(client, results, args.calls, args.threads)
+        bench_events(client, results, args.events)
+    results.finish(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark response and request compression against the mock server
+
+Reports the bytes on the wire, the local duration (compression and
+decompression cost) and the duration estimated for a link of --bandwidth
+Mbit/s for every transport with and without compression.
+
+example 1:
+python benchmarks/bench_compression.py --hosts 2000 --bandwidth 20
+
+example 2:
+python benchmarks/bench_compression.py --transports stdlib --level 1
+'''
+
+from __future__ import print_function
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.client import Client  # noqa: E402
+from icinga2api.exceptions import Icinga2ApiException  # noqa: E402
+from common import Results, measure, parser, quiet  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+JOINS = ['host.name', 'host.address', 'host.state', 'host.last_check_result']
+
+
+def transferred(server, function):
+    '''
+    return the local seconds of function and the bytes sent by the server
+    '''
+
+    before = server.bytes_sent
+    seconds = measure(function, repeat=1)
+    return seconds, server.bytes_sent - before
+
+
+def main():
+    '''
+    run the benchmarks
+    '''
+
+    args = parser(__doc__.splitlines()[1])
+    args.add_argument('--hosts', type=int, default=1000)
+    args.add_argument('--services', type=int, default=10,
+                      help='services per host')
+    args.add_argument('--bandwidth', type=float, default=50.0,
+                      help='link bandwidth in Mbit/s for the estimate')
+    args.add_argument('--level', type=int, default=6,
+                      help='gzip level of the server')
+    args.add_argument('--events', type=int, default=20000)
+    args.add_argument('--transports', nargs='+', default=['requests', 'stdlib'])
+    args = args.parse_args()
+    quiet()
+
+    results = Results()
+    server = MockIcinga(args.hosts, args.services, event_batch=100,
+                        compression=args.level)
+    bandwidth = args.bandwidth * 1e6 / 8
+    with server:
+        for name in args.transports:
+            for compression in (False, True):
+                label = '{0} {1}'.format(
+                    name, 'gzip' if compression else 'identity')
+                try:
+                    client = Client(server.url, 'root', 'icinga',
+                                    transport=name, compression=compression,
+                                    compress_requests=1024 if compression
+                                    else None)
+                except Icinga2ApiException as error:
+                    print('{0}: skipped, {1}'.format(name, error))
+                    break
+                seconds, size = transferred(server, lambda: client.objects.list(
+                    'Service', joins=JOINS))
+                results.add('{0} list(Service, joins) size'.format(label),
+                            size / 1e6, 'MB', better='lower')
+                results.add('{0} list(Service, joins) local'.format(label),
+                            seconds * 1000, 'ms', better='lower')
+                results.add('{0} list(Service, joins) at {1:g} Mbit/s'.format(
+                    label, args.bandwidth),
+                    (seconds + size / bandwidth) * 1000, 'ms', better='lower')
+
+                before = server.bytes_received
+                client.objects.create('Host', 'bench-{0}'.format(
+                    label.replace(' ', '-')), attrs={
+                    'address': '192.0.2.1',
+                    'check_command': 'hostalive',
+                    'vars': dict(('var{0}'.format(number), 'value' * 20)
+                                 for number in range(100)),
+                })
+                results.add('{0} create body size'.format(label),
+                            server.bytes_received - before, 'bytes',
+                            better='lower')
+
+                before = server.bytes_sent
+                start = time.perf_counter()
+                received = 0
+                for event in client.events.subscribe(['CheckResult'], label):
+                    json.loads(event)
+                    received += 1
+                    if received >= args.events:
+                        break
+                seconds = time.perf_counter() - start
+                results.add('{0} events.subscribe'.format(label),
+                            received / seconds, 'events/s')
+                results.add('{0} bytes/event'.format(label),
+                            float(server.bytes_sent - before) / received,
+                            'bytes', better='lower')
+                client.close()
+    results.finish(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark filters evaluated by the mock server and in the client
+
+example 1:
+python benchmarks/bench_filters.py --hosts 1000 --services 20
+'''
+
+from __future__ import print_function
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.client import Client  # noqa: E402
+from icinga2api.filters import Filter, compile_filter  # noqa: E402
+from common import Results, measure, parser, quiet  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+EXPRESSION = ('service.state != 0 && match("*1.example.com", host.name) && '
+              '"group1" in host.groups')
+
+
+def main():
+    '''
+    run the benchmarks
+    '''
+
+    args = parser(__doc__.splitlines()[1])
+    args.add_argument('--hosts', type=int, default=1000)
+    args.add_argument('--services', type=int, default=20,
+                      help='services per host')
+    args = args.parse_args()
+    quiet()
+
+    results = Results()
+    with MockIcinga(args.hosts, args.services) as server:
+        client = Client(server.url, 'root', 'icinga')
+        results.add('server filter', measure(lambda: client.objects.list(
+            'Service', filters=EXPRESSION)) * 1000, 'ms', better='lower')
+        services = client.objects.list('Service', joins=['host.groups'],
+                                       indexed=True)
+    results.add('client filter', measure(
+        lambda: services.filter(EXPRESSION)) * 1000, 'ms', better='lower')
+    results.add('compile', measure(lambda: Filter(EXPRESSION), number=100) *
+                1e6, 'us', better='lower')
+    results.add('compile cached', measure(lambda: compile_filter(EXPRESSION),
+                                          number=1000) * 1e6,
+                'us', better='lower')
+    results.finish(args)
+
+
+if __name__ == '__main__':
+    main()
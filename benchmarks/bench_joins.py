@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark server-side and client-side host joins of service listings
+
+The bytes are counted by the mock server, the memory with tracemalloc.
+
+example 1:
+python benchmarks/bench_joins.py --hosts 1000 --services 20
+'''
+
+from __future__ import print_function
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.client import Client  # noqa: E402
+from common import Results, measure, parser, quiet  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+JOINS = ['host.address', 'host.state', 'host.vars']
+
+
+def run(client, server, results, label, client_joins):
+    '''
+    measure duration, transferred bytes and memory of one listing
+    '''
+
+    def listing():
+        return client.objects.list('Service', attrs=['state'], joins=JOINS,
+                                   client_joins=client_joins)
+
+    seconds = measure(listing)
+    results.add('{0} duration'.format(label), seconds * 1000, 'ms',
+                better='lower')
+
+    sent = server.bytes_sent
+    listing()
+    results.add('{0} response bytes'.format(label),
+                (server.bytes_sent - sent) / 1024.0, 'KiB', better='lower')
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    services = listing()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    results.add('{0} memory'.format(label), (after - before) / 1048576.0,
+                'MiB', better='lower')
+    del services
+
+
+def main():
+    '''
+    run the benchmarks
+    '''
+
+    args = parser(__doc__.splitlines()[1])
+    args.add_argument('--hosts', type=int, default=1000)
+    args.add_argument('--services', type=int, default=20,
+                      help='services per host')
+    args = args.parse_args()
+    quiet()
+
+    results = Results()
+    with MockIcinga(args.hosts, args.services) as server:
+        client = Client(server.url, 'root', 'icinga')
+        run(client, server, results, 'server joins', False)
+        run(client, server, results, 'client joins', True)
+    results.finish(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark provisioning with one PUT per object and with a config package stage
+
+The mock server accepts stages without validating them, the stage numbers
+cover rendering and upload.
+
+example 1:
+python benchmarks/bench_packages.py --hosts 1000 --services 10 --latency 0.001
+'''
+
+from __future__ import print_function
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.client import Client  # noqa: E402
+from common import Results, measure, parser, quiet  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+
+def provisioning(hosts, services):
+    '''
+    return the objects of a provisioning run
+    '''
+
+    objects = []
+    for number in range(hosts):
+        host = 'new{0:06d}.example.com'.format(number)
+        objects.append({'type': 'Host', 'name': host,
+                        'templates': ['generic-host'],
+                        'attrs': {'address': '10.0.0.1',
+                                  'vars.os': 'Linux'}})
+        for service in range(services):
+            objects.append({'type': 'Service',
+                            'name': '{0}!service{1:02d}'.format(host, service),
+                            'templates': ['generic-service'],
+                            'attrs': {'check_command': 'dummy'}})
+    return objects
+
+
+def main():
+    '''
+    run the benchmarks
+    '''
+
+    args = parser(__doc__.splitlines()[1])
+    args.add_argument('--hosts', type=int, default=1000)
+    args.add_argument('--services', type=int, default=10,
+                      help='services per host')
+    args.add_argument('--latency', type=float, default=0.001)
+    args = args.parse_args()
+    quiet()
+
+    objects = provisioning(args.hosts, args.services)
+    results = Results()
+    with MockIcinga(0, 0, args.latency) as server:
+        client = Client(server.url, 'root', 'icinga')
+        requests = server.requests
+        seconds = measure(lambda: client.objects.create_many(objects),
+                          repeat=1)
+        results.add('create_many {0} objects'.format(len(objects)),
+                    seconds * 1000, 'ms', better='lower')
+        results.add('create_many requests', server.requests - requests,
+                    'requests', better='lower')
+
+        requests = server.requests
+        seconds = measure(lambda: client.packages.deploy('bench', objects),
+                          repeat=1)
+        results.add('packages.deploy {0} objects'.format(len(objects)),
+                    seconds * 1000, 'ms', better='lower')
+        results.add('packages.deploy requests', server.requests - requests,
+                    'requests', better='lower')
+    results.finish(args)
+
+
+if __name__ == '__main__':
+    main()
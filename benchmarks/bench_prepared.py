@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark the per-call client overhead of regular and prepared calls
+
+The overhead is measured with a transport answering without network I/O, the
+end-to-end rate against the mock server.
+
+example 1:
+python benchmarks/bench_prepared.py --calls 20000
+'''
+
+from __future__ import print_function
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.client import Client  # noqa: E402
+from icinga2api.transport import Transport  # noqa: E402
+from common import Results, measure, parser, quiet  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+SERVICE = 'host000001.example.com!service01'
+
+
+class _Response(object):
+    '''
+    canned successful response
+    '''
+
+    status_code = 200
+    url = ''
+    text = '{"results": [{"code": 200.0, "status": "ok"}]}'
+
+    @staticmethod
+    def json():
+        return {'results': [{'code': 200.0, 'status': 'ok'}]}
+
+
+class _Transport(Transport):
+    '''
+    transport answering every request without network I/O
+    '''
+
+    def request(self, method, url, payload=None, stream=False):
+        return _Response()
+
+
+def run(client, results, calls, label):
+    '''
+    measure regular and prepared calls
+    '''
+
+    def regular():
+        for _ in range(calls):
+            client.actions.process_check_result('Service', SERVICE, 0, 'OK')
+            client.objects.list('Host', 'host000001.example.com')
+
+    prepared_submit = client.actions.prepare_check_result('Service', SERVICE)
+
+    def prepared():
+        for _ in range(calls):
+            prepared_submit(exit_status=0, plugin_output='OK')
+            client.objects.list('Host', 'host000001.example.com')
+
+    for name, function in (('regular', regular), ('prepared', prepared)):
+        seconds = measure(function, repeat=3) / calls / 2
+        results.add('{0} {1} per call'.format(label, name),
+                    seconds * 1e6, 'us', better='lower')
+
+
+def main():
+    '''
+    run the benchmarks
+    '''
+
+    args = parser(__doc__.splitlines()[1])
+    args.add_argument('--calls', type=int, default=20000)
+    args = args.parse_args()
+    quiet()
+
+    results = Results()
+    client = Client('https://localhost:5665/', 'root', 'icinga',
+                    transport=_Transport)
+    run(client, results, args.calls, 'overhead')
+
+    with MockIcinga(10, 2) as server:
+        client = Client(server.url, 'root', 'icinga')
+        run(client, results, max(args.calls // 50, 10), 'mock server')
+    results.finish(args)
+
+
+if __name__ == '__main__':
+    main()
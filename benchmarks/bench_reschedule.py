@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark spread rescheduling and print its load curve
+
+The check cost of a bucket is the sum of the last execution times of its
+checks. Rescheduling everything at once puts the whole cost in one bucket.
+
+example 1:
+python benchmarks/bench_reschedule.py --hosts 2000 --window 600 --by zone
+'''
+
+from __future__ import print_function
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.client import Client  # noqa: E402
+from icinga2api.reschedule import check_cost  # noqa: E402
+from common import Results, measure, parser, quiet  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+
+def main():
+    '''
+    run the benchmarks
+    '''
+
+    args = parser(__doc__.splitlines()[1])
+    args.add_argument('--hosts', type=int, default=2000)
+    args.add_argument('--services', type=int, default=10,
+                      help='services per host')
+    args.add_argument('--window', type=float, default=300)
+    args.add_argument('--interval', type=float, default=10)
+    args.add_argument('--by', default='cost')
+    args.add_argument('--curve', action='store_true',
+                      help='print the load curve')
+    args = args.parse_args()
+    quiet()
+
+    results = Results()
+    with MockIcinga(args.hosts, args.services) as server:
+        client = Client(server.url, 'root', 'icinga')
+        services = client.objects.list(
+            'Service', attrs=['zone', 'last_check_result'])
+        plans = []
+
+        def reschedule():
+            plans.append(client.actions.reschedule_spread(
+                'Service', objects=services, window=args.window,
+                interval=args.interval, by=args.by))
+
+        requests = server.requests
+        seconds = measure(reschedule, repeat=1)
+        plan = plans[-1]
+        results.add('reschedule_spread {0} services'.format(len(plan)),
+                    seconds * 1000, 'ms', better='lower')
+        results.add('reschedule_spread requests', server.requests - requests,
+                    'requests', better='lower')
+
+    total = sum(check_cost(service) for service in services)
+    results.add('peak bucket cost all at once', total, 's', better='lower')
+    results.add('peak bucket cost spread', plan.peak(), 's', better='lower')
+    if args.curve:
+        start = plan.buckets and min(
+            bucket['next_check'] for bucket in plan.buckets)
+        for point in plan.load_curve():
+            print('{0:8.1f}s {1:6d} checks {2:10.1f}s cost'.format(
+                point['next_check'] - start, point['objects'], point['cost']))
+    results.finish(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark indexed result sets against scanning the listed objects
+
+example 1:
+python benchmarks/bench_resultset.py --hosts 2000 --services 20
+'''
+
+from __future__ import print_function
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.client import Client  # noqa: E402
+from icinga2api.resultset import ResultSet  # noqa: E402
+from common import Results, measure, parser, quiet  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+
+def main():
+    '''
+    run the benchmarks
+    '''
+
+    args = parser(__doc__.splitlines()[1])
+    args.add_argument('--hosts', type=int, default=2000)
+    args.add_argument('--services', type=int, default=20,
+                      help='services per host')
+    args.add_argument('--queries', type=int, default=1000)
+    args = args.parse_args()
+    quiet()
+
+    with MockIcinga(args.hosts, args.services) as server:
+        client = Client(server.url, 'root', 'icinga')
+        services = client.objects.list('Service')
+    hosts = ['host{0:06d}.example.com'.format(number % args.hosts)
+             for number in range(args.queries)]
+
+    def scan():
+        for host in hosts:
+            [service for service in services
+             if service['attrs']['host_name'] == host]
+
+    def indexed():
+        result_set = ResultSet(services)
+        for host in hosts:
+            result_set.where('attrs.host_name', host)
+
+    def count_scan():
+        counts = {}
+        for service in services:
+            state = service['attrs']['state']
+            counts[state] = counts.get(state, 0) + 1
+
+    result_set = ResultSet(services)
+    result_set.count_by('attrs.state')
+
+    def upsert():
+        for service in services[:args.queries]:
+            result_set.upsert(service)
+
+    results = Results()
+    label = '{0} services by host name'.format(args.queries)
+    results.add(label + ' scan', measure(scan, repeat=1) * 1000, 'ms',
+                better='lower')
+    results.add(label + ' index', measure(indexed) * 1000, 'ms',
+                better='lower')
+    results.add('count by state scan', measure(count_scan) * 1000, 'ms',
+                better='lower')
+    results.add('count by state index',
+                measure(lambda: result_set.count_by('attrs.state')) * 1000,
+                'ms', better='lower')
+    results.add('{0} upserts with index'.format(args.queries),
+                measure(upsert, repeat=1) * 1000, 'ms', better='lower')
+
+    def discard():
+        for service in services[:args.queries]:
+            result_set.discard(service['name'])
+    results.add('{0} discards with index'.format(args.queries),
+                measure(discard, repeat=1) * 1000, 'ms', better='lower')
+    results.finish(args)
+
+
+if __name__ == '__main__':
+    main()
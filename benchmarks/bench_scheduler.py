@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark interactive latency while bulk jobs saturate the server
+
+The mock server processes a limited number of requests at once. Bulk threads
+send updates in a loop while interactive calls are measured, with and without
+the request scheduler.
+
+example 1:
+python benchmarks/bench_scheduler.py --workers 8 --bulk-threads 32
+'''
+
+from __future__ import print_function
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.client import Client  # noqa: E402
+from icinga2api.scheduler import RequestScheduler  # noqa: E402
+from common import Results, parser, quiet  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+SERVICE = 'host000001.example.com!service01'
+
+
+def run(client, results, label, args):
+    '''
+    measure interactive calls while bulk threads are running
+    '''
+
+    stop = threading.Event()
+    bulk_calls = [0]
+
+    def bulk():
+        # object updates are bulk requests by default
+        while not stop.is_set():
+            client.objects.update('Service', SERVICE, {'vars.bulk': 1})
+            bulk_calls[0] += 1
+
+    workers = [threading.Thread(target=bulk)
+               for _ in range(args.bulk_threads)]
+    for worker in workers:
+        worker.start()
+    time.sleep(0.5)
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        call = time.perf_counter()
+        client.actions.acknowledge_problem('Service',
+                                           'service.name=="service01"',
+                                           'oncall', 'investigating')
+        latencies.append(time.perf_counter() - call)
+    seconds = time.perf_counter() - start
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    latencies.sort()
+    results.add('{0} interactive p50'.format(label),
+                latencies[len(latencies) // 2] * 1000, 'ms', better='lower')
+    results.add('{0} interactive p99'.format(label),
+                latencies[int(len(latencies) * 0.99)] * 1000, 'ms',
+                better='lower')
+    results.add('{0} bulk'.format(label), bulk_calls[0] / seconds, 'calls/s')
+
+
+def main():
+    '''
+    run the benchmarks
+    '''
+
+    args = parser(__doc__.splitlines()[1])
+    args.add_argument('--workers', type=int, default=8,
+                      help='requests the server processes at once')
+    args.add_argument('--latency', type=float, default=0.005)
+    args.add_argument('--bulk-threads', type=int, default=32)
+    args.add_argument('--calls', type=int, default=200)
+    args = args.parse_args()
+    quiet()
+
+    results = Results()
+    with MockIcinga(10, 2, args.latency, workers=args.workers) as server:
+        client = Client(server.url, 'root', 'icinga', transport='stdlib')
+        run(client, results, 'no scheduler', args)
+        scheduler = RequestScheduler(capacity=args.workers)
+        client = Client(server.url, 'root', 'icinga', transport='stdlib',
+                        scheduler=scheduler)
+        run(client, results, 'scheduler', args)
+        for name, stats in sorted(scheduler.stats().items()):
+            if stats['requests']:
+                results.add('scheduler {0} mean wait'.format(name),
+                            stats['wait_mean'] * 1000, 'ms', better='lower')
+    results.finish(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark sharded listings against the mock server
+
+The mock server runs in a process of its own. It encodes the responses in a
+single process, a real Icinga 2 encodes in parallel, so the measured speedup
+is a lower bound.
+
+example 1:
+python benchmarks/bench_sharding.py --hosts 20000 --services 10 --shards 4
+'''
+
+from __future__ import print_function
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.client import Client  # noqa: E402
+from common import Results, measure, parser, quiet  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+
+def serve(hosts, services, urls):
+    '''
+    run the mock server, send its url
+    '''
+
+    server = MockIcinga(hosts, services)
+    urls.put(server.url)
+    server.server.serve_forever()
+
+
+def main():
+    '''
+    run the benchmarks
+    '''
+
+    args = parser(__doc__.splitlines()[1])
+    args.add_argument('--hosts', type=int, default=5000)
+    args.add_argument('--services', type=int, default=10,
+                      help='services per host')
+    args.add_argument('--shards', type=int, nargs='+', default=[2, 4])
+    args.add_argument('--by', default='range')
+    args = args.parse_args()
+    quiet()
+
+    urls = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=serve, args=(args.hosts, args.services, urls))
+    process.daemon = True
+    process.start()
+    client = Client(urls.get(), 'root', 'icinga')
+    count = args.hosts * args.services
+    directory = tempfile.mkdtemp()
+    results = Results()
+    try:
+        seconds = measure(lambda: client.objects.list('Service'), repeat=1)
+        results.add('list(Service)', count / seconds, 'objects/s')
+        for shards in args.shards:
+            seconds = measure(lambda: sum(1 for _ in client.objects.list_sharded(
+                'Service', shards=shards, by=args.by)), repeat=1)
+            results.add('list_sharded(Service) {0} shards'.format(shards),
+                        count / seconds, 'objects/s')
+
+            def snapshot():
+                client.objects.snapshot_sharded(
+                    'Service', directory, shards=shards, by=args.by).close()
+            seconds = measure(snapshot, repeat=1)
+            results.add('snapshot_sharded(Service) {0} shards'.format(shards),
+                        count / seconds, 'objects/s')
+    finally:
+        shutil.rmtree(directory)
+        process.terminate()
+    results.finish(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark import time and first-call latency of short-lived processes
+
+Every measurement starts a new interpreter, the time of an empty interpreter
+is subtracted.
+
+example 1:
+python benchmarks/bench_startup.py --runs 20
+'''
+
+from __future__ import print_function
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import Results, parser, quiet  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_CALL = '''
+import warnings
+warnings.filterwarnings('ignore')
+from icinga2api.client import Client
+Client({url!r}, 'root', 'icinga', transport={transport!r}).status.list()
+'''
+
+
+def run(code, runs):
+    '''
+    return the best wall time of running code in a new interpreter
+    '''
+
+    environment = dict(os.environ, PYTHONPATH=ROOT)
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', code], env=environment)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    '''
+    run the benchmarks
+    '''
+
+    args = parser(__doc__.splitlines()[1])
+    args.add_argument('--runs', type=int, default=10)
+    args = args.parse_args()
+    quiet()
+
+    results = Results()
+    empty = run('pass', args.runs)
+    results.add('import icinga2api.client',
+                (run('import icinga2api.client', args.runs) - empty) * 1000,
+                'ms', better='lower')
+    results.add('import requests (reference)',
+                (run('import requests', args.runs) - empty) * 1000,
+                'ms', better='lower')
+
+    with MockIcinga(10, 2) as server:
+        for transport in ('requests', 'stdlib'):
+            code = FIRST_CALL.format(url=server.url, transport=transport)
+            results.add('import + first call ({0})'.format(transport),
+                        (run(code, args.runs) - empty) * 1000,
+                        'ms', better='lower')
+    results.finish(args)
+
+
+if __name__ == '__main__':
+    main()
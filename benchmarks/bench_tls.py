@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark TLS connection setup against the mock server
+
+Every call opens a new connection, once with full handshakes and once
+resuming the TLS session (stdlib transport), then for the other transports.
+
+example 1:
+python benchmarks/bench_tls.py --certfile server.pem --keyfile server.key
+'''
+
+from __future__ import print_function
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.client import Client  # noqa: E402
+from icinga2api.exceptions import Icinga2ApiException  # noqa: E402
+from common import Results, measure, parser, quiet  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+
+def reconnect(client, calls):
+    '''
+    return the seconds of a request over a new connection
+    '''
+
+    def call():
+        client.status.list('IcingaApplication')
+        client.transport.close()
+
+    return measure(call, number=calls)
+
+
+def main():
+    '''
+    run the benchmarks
+    '''
+
+    args = parser(__doc__.splitlines()[1])
+    args.add_argument('--calls', type=int, default=200)
+    args.add_argument('--certfile', required=True)
+    args.add_argument('--keyfile')
+    args.add_argument('--transports', nargs='+',
+                      default=['requests', 'urllib3', 'httpx'])
+    args = args.parse_args()
+    quiet()
+
+    results = Results()
+    with MockIcinga(10, 2, certfile=args.certfile,
+                    keyfile=args.keyfile) as server:
+        client = Client(server.url, 'root', 'icinga', transport='stdlib')
+        client.tls.resume = False
+        results.add('stdlib new connection, full handshake',
+                    reconnect(client, args.calls) * 1000, 'ms',
+                    better='lower')
+        client = Client(server.url, 'root', 'icinga', transport='stdlib')
+        results.add('stdlib new connection, resumed',
+                    reconnect(client, args.calls) * 1000, 'ms',
+                    better='lower')
+        stats = client.tls.stats()
+        results.add('stdlib resumed handshakes',
+                    100.0 * stats['resumed'] / max(stats['handshakes'], 1),
+                    '%')
+        for name in args.transports:
+            try:
+                client = Client(server.url, 'root', 'icinga', transport=name)
+            except Icinga2ApiException as error:
+                print('{0}: skipped, {1}'.format(name, error))
+                continue
+            results.add('{0} new connection'.format(name),
+                        reconnect(client, args.calls) * 1000, 'ms',
+                        better='lower')
+    results.finish(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark the transports against the mock server
+
+Transports whose module is not installed are skipped.
+
+example 1:
+python benchmarks/bench_transports.py --hosts 1000 --threads 8
+
+example 2:
+python benchmarks/bench_transports.py --transports stdlib urllib3
+'''
+
+from __future__ import print_function
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.client import Client  # noqa: E402
+from icinga2api.exceptions import Icinga2ApiException  # noqa: E402
+from icinga2api.transport import TRANSPORTS  # noqa: E402
+from common import Results, measure, parser, quiet  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+SERVICE = 'host000001.example.com!service01'
+
+
+def submit(client, calls, threads):
+    '''
+    return the rate of process_check_result calls from threads
+    '''
+
+    def worker():
+        for _ in range(calls // threads):
+            client.actions.process_check_result('Service', SERVICE, 0, 'OK')
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return (calls // threads * threads) / (time.perf_counter() - start)
+
+
+def stream(client, count):
+    '''
+    return the rate of received events
+    '''
+
+    start = time.perf_counter()
+    received = 0
+    for event in client.events.subscribe(['CheckResult'], 'bench'):
+        json.loads(event)
+        received += 1
+        if received >= count:
+            break
+    return received / (time.perf_counter() - start)
+
+
+def main():
+    '''
+    run the benchmarks
+    '''
+
+    args = parser(__doc__.splitlines()[1])
+    args.add_argument('--hosts', type=int, default=1000)
+    args.add_argument('--services', type=int, default=10,
+                      help='services per host')
+    args.add_argument('--calls', type=int, default=2000)
+    args.add_argument('--threads', type=int, default=8)
+    args.add_argument('--events', type=int, default=20000)
+    args.add_argument('--transports', nargs='+',
+                      default=['requests', 'urllib3', 'httpx', 'http2',
+                               'stdlib'])
+    args.add_argument('--certfile', help='benchmark over TLS')
+    args.add_argument('--keyfile')
+    args = args.parse_args()
+    quiet()
+
+    results = Results()
+    server = MockIcinga(args.hosts, args.services, event_batch=100,
+                        certfile=args.certfile, keyfile=args.keyfile)
+    with server:
+        for name in args.transports:
+            if name not in TRANSPORTS:
+                args.error('unknown transport {0}'.format(name))
+            try:
+                client = Client(server.url, 'root', 'icinga', transport=name)
+            except Icinga2ApiException as error:
+                print('{0}: skipped, {1}'.format(name, error))
+                continue
+            seconds = measure(lambda: client.objects.list('Service'))
+            results.add('{0} objects.list(Service)'.format(name),
+                        seconds * 1000, 'ms', better='lower')
+            seconds = measure(lambda: client.objects.get(
+                'Host', 'host000001.example.com'), number=200)
+            results.add('{0} objects.get(Host) latency'.format(name),
+                        seconds * 1e6, 'us', better='lower')
+            results.add('{0} process_check_result {1} threads'.format(
+                name, args.threads),
+                submit(client, args.calls, args.threads), 'calls/s')
+            results.add('{0} events.subscribe'.format(name),
+                        stream(client, args.events), 'events/s')
+            client.close()
+    results.finish(args)
+
+
+if __name__ == '__main__':
+    main()
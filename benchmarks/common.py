@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+'''
+Helpers shared by the benchmarks
+'''
+
+from __future__ import print_function
+import argparse
+import json
+import sys
+import time
+import warnings
+
+
+def measure(function, repeat=3, number=1):
+    '''
+    run function number times per round, return the best seconds per call
+    '''
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = (time.perf_counter() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def parser(description):
+    '''
+    return an argument parser with the common options
+    '''
+
+    result = argparse.ArgumentParser(description=description)
+    result.add_argument('--save', metavar='FILE',
+                        help='write the results to FILE')
+    result.add_argument('--compare', metavar='FILE',
+                        help='compare the results to FILE')
+    result.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative regression (default: 0.2)')
+    return result
+
+
+def quiet():
+    '''
+    silence the warnings about unverified TLS connections
+    '''
+
+    warnings.filterwarnings('ignore', message='Unverified HTTPS request')
+
+
+class Results(object):
+    '''
+    collect, print, save and compare benchmark results
+
+    Every result has a direction: "higher" for throughput like values and
+    "lower" for durations and sizes.
+    '''
+
+    def __init__(self):
+        self.results = {}
+
+    def add(self, name, value, unit, better='higher'):
+        '''
+        record and print a result
+        '''
+
+        self.results[name] = {'value': value, 'unit': unit, 'better': better}
+        print('{0:<45} {1:>14.2f} {2}'.format(name, value, unit))
+
+    def finish(self, args):
+        '''
+        save and compare the results, exit with 1 on regressions
+        '''
+
+        if args.save:
+            with open(args.save, 'w') as handle:
+                json.dump(self.results, handle, indent=2, sort_keys=True)
+        if not args.compare:
+            return
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+        regressions = []
+        for name, result in sorted(self.results.items()):
+            if name not in baseline or not baseline[name]['value']:
+                continue
+            change = result['value'] / baseline[name]['value'] - 1
+            if result['better'] == 'lower':
+                change = -change
+            if change < -args.tolerance:
+                regressions.append(name)
+            print('{0:<45} {1:>+13.1%}'.format(name, change))
+        if regressions:
+            print('Regressions: {0}'.format(', '.join(regressions)))
+            sys.exit(1)
@@ -0,0 +1,680 @@
+# -*- coding: utf-8 -*-
+'''
+Local stand-in for the Icinga 2 API
+
+Serves v1/objects, v1/actions, v1/status, v1/config and a streaming v1/events
+endpoint
+from a synthetic dataset, over HTTP or TLS, with configurable latency and
+optional gzip compression. Filters are evaluated with icinga2api.filters.
+
+example 1:
+python benchmarks/mockserver.py --hosts 1000 --services 10 --port 5665
+
+example 2:
+with MockIcinga(hosts=1000, services_per_host=10) as server:
+    client = Client(server.url, 'root', 'icinga')
+'''
+
+from __future__ import print_function
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import ssl
+import sys
+import threading
+import time
+import zlib
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import unquote, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import unquote
+    from urlparse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.filters import compile_filter  # noqa: E402
+
+LOG = logging.getLogger(__name__)
+
+PLURALS = {
+    'hosts': 'Host',
+    'services': 'Service',
+    'hostgroups': 'HostGroup',
+    'zones': 'Zone',
+}
+
+
+class Dataset(object):
+    '''
+    synthetic hosts, services, host groups and zones
+    '''
+
+    def __init__(self, hosts=1000, services_per_host=10, zones=4, groups=8,
+                 seed=0):
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        # config package stages by package, active stage by package
+        self.packages = {}
+        self.active = {}
+        self.objects = dict((object_type, {}) for object_type in
+                            PLURALS.values())
+        self._cache = {}
+        now = time.time()
+        # shared between the objects to keep large datasets small
+        self._results = dict((state, self._check_result(state, now))
+                             for state in range(4))
+        for number in range(zones):
+            self.add('Zone', 'zone{0}'.format(number),
+                     {'parent': 'master', 'endpoints': []})
+        for number in range(groups):
+            self.add('HostGroup', 'group{0}'.format(number),
+                     {'display_name': 'Group {0}'.format(number)})
+        for number in range(hosts):
+            host = 'host{0:06d}.example.com'.format(number)
+            self.add('Host', host, self._host_attrs(host, number, zones,
+                                                    groups, now))
+            for service in range(services_per_host):
+                name = 'service{0:02d}'.format(service)
+                self.add('Service', '{0}!{1}'.format(host, name),
+                         self._service_attrs(host, name, number, zones, now))
+
+    def _check_result(self, state, now):
+        return {
+            'active': True,
+            'check_source': 'satellite1.example.com',
+            'command': ['/usr/lib/nagios/plugins/check_ping', '-H',
+                        '192.0.2.1'],
+            # failing checks take longer, e.g. until a timeout
+            'execution_start': now - 1.2 - 4 * state,
+            'execution_end': now - 0.2,
+            'exit_status': state,
+            'output': 'PING OK - Packet loss = 0%, RTA = 0.52 ms',
+            'performance_data': ['rta=0.52ms;3000;5000;0', 'pl=0%;80;100;0'],
+            'schedule_start': now - 1.3,
+            'schedule_end': now - 0.2,
+            'state': state,
+            'type': 'CheckResult',
+        }
+
+    def _host_attrs(self, host, number, zones, groups, now):
+        state = self.random.choice([0, 0, 0, 0, 1])
+        return {
+            'address': '192.0.2.{0}'.format(number % 250 + 1),
+            'check_command': 'hostalive',
+            'check_interval': 60.0,
+            'display_name': host,
+            'enable_active_checks': True,
+            'groups': ['group{0}'.format(number % groups)],
+            'last_check': now - self.random.random() * 60,
+            'last_check_result': self._results[state],
+            'last_state_change': now - self.random.random() * 86400,
+            'state': float(state),
+            'state_type': 1.0,
+            'vars': {'os': 'Linux', 'rack': 'r{0}'.format(number % 40)},
+            'version': 0.0,
+            'zone': 'zone{0}'.format(number % zones),
+        }
+
+    def _service_attrs(self, host, name, number, zones, now):
+        state = self.random.choice([0, 0, 0, 0, 0, 0, 1, 2, 3])
+        return {
+            'check_command': 'ping4',
+            'check_interval': 60.0,
+            'display_name': name,
+            'enable_active_checks': True,
+            'groups': [],
+            'host_name': host,
+            'last_check': now - self.random.random() * 60,
+            'last_check_result': self._results[state],
+            'last_state_change': now - self.random.random() * 86400,
+            'state': float(state),
+            'state_type': 1.0,
+            'vars': {'sla': '24x7'},
+            'version': 0.0,
+            'zone': 'zone{0}'.format(number % zones),
+        }
+
+    def add(self, object_type, name, attrs):
+        '''
+        add or replace an object
+        '''
+
+        attrs = dict(attrs)
+        attrs['__name'] = name
+        attrs['name'] = name.split('!')[-1]
+        attrs['type'] = object_type
+        with self.lock:
+            self.objects[object_type][name] = attrs
+            self._cache.pop(object_type, None)
+
+    def update(self, object_type, names, attrs):
+        '''
+        change attributes of objects
+        '''
+
+        with self.lock:
+            for name in names:
+                if name not in self.objects[object_type]:
+                    continue
+                self.objects[object_type][name].update(attrs)
+                self.objects[object_type][name]['version'] = time.time()
+            self._cache.pop(object_type, None)
+
+    def delete(self, object_type, names):
+        '''
+        delete objects
+        '''
+
+        with self.lock:
+            for name in names:
+                self.objects[object_type].pop(name, None)
+            self._cache.pop(object_type, None)
+
+    def select(self, object_type, name=None, payload=None):
+        '''
+        return the matching objects as in a v1/objects response
+        '''
+
+        payload = payload or {}
+        with self.lock:
+            objects = self.objects[object_type]
+            if name is not None:
+                names = [name] if name in objects else []
+            else:
+                names = list(objects)
+            attrs = payload.get('attrs')
+            joins = payload.get('joins')
+            matches = self._matcher(object_type, payload)
+            results = []
+            for object_name in names:
+                obj = objects[object_name]
+                if matches is not None and not matches(object_name, obj):
+                    continue
+                result = {
+                    'attrs': obj if not attrs else dict(
+                        (attr, obj.get(attr)) for attr in attrs),
+                    'joins': {},
+                    'meta': {},
+                    'name': object_name,
+                    'type': object_type,
+                }
+                if object_type == 'Service' and \
+                        (payload.get('all_joins') or joins):
+                    host = self.objects['Host'].get(obj['host_name'], {})
+                    if joins:
+                        host = dict(
+                            (join.split('.', 1)[1], host.get(
+                                join.split('.', 1)[1]))
+                            for join in joins if join.startswith('host.'))
+                    result['joins']['host'] = host
+                results.append(result)
+        return results
+
+    def _matcher(self, object_type, payload):
+        '''
+        return a predicate for the filter of a request, or None
+        '''
+
+        if not payload.get('filter'):
+            return None
+        predicate = compile_filter(payload['filter']).predicate(
+            payload.get('filter_vars'))
+        hosts = self.objects['Host']
+
+        def matches(name, obj):
+            result = {'attrs': obj, 'name': name, 'type': object_type}
+            if 'host_name' in obj:
+                result['joins'] = {'host': hosts.get(obj['host_name'], {})}
+            return predicate(result)
+        return matches
+
+    def listing(self, object_type):
+        '''
+        return the encoded full listing of a type, cached until it changes
+        '''
+
+        with self.lock:
+            body = self._cache.get(object_type)
+        if body is None:
+            body = json.dumps(
+                {'results': self.select(object_type)}).encode('utf-8')
+            with self.lock:
+                self._cache[object_type] = body
+        return body
+
+    def event(self):
+        '''
+        return a random CheckResult event
+        '''
+
+        with self.lock:
+            names = self.objects['Service']
+            name = self.random.choice(list(names)) if names else 'host!service'
+        host, service = name.split('!', 1)
+        now = time.time()
+        state = self.random.choice([0, 0, 0, 0, 0, 0, 1, 2, 3])
+        return {
+            'check_result': self._check_result(state, now),
+            'host': host,
+            'service': service,
+            'timestamp': now,
+            'type': 'CheckResult',
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    '''
+    request handler of the mock server
+    '''
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        # headers and body are written separately, don't wait for ACKs
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        BaseHTTPRequestHandler.setup(self)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        LOG.debug(format, *args)
+
+    def _gzip_accepted(self):
+        return self.server.compression and \
+            'gzip' in (self.headers.get('Accept-Encoding') or '')
+
+    def _send_json(self, body, status=200):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        gzip = self._gzip_accepted()
+        if gzip:
+            compressor = zlib.compressobj(self.server.compression,
+                                          zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            body = compressor.compress(body) + compressor.flush()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.server.bytes_sent += len(body)
+        self.wfile.write(body)
+
+    def _payload(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        body = self.rfile.read(length)
+        self.server.bytes_received += length
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        return json.loads(body.decode('utf-8'))
+
+    def _handle(self):
+        if self.server.workers is None:
+            return self._process()
+        with self.server.workers:
+            return self._process()
+
+    def _process(self):
+        server = self.server
+        self.server.requests += 1
+        payload = self._payload()
+        if server.latency:
+            time.sleep(server.latency)
+        method = (self.headers.get('X-HTTP-Method-Override') or
+                  self.command).upper()
+        parts = [unquote(part) for part in
+                 urlparse(self.path).path.strip('/').split('/')]
+        if parts[:1] != ['v1'] or len(parts) < 2:
+            return self._send_json({'error': 404, 'status': 'Not found'}, 404)
+
+        if parts[1] == 'objects':
+            return self._objects(method, parts[2:], payload)
+        if parts[1] == 'actions' and len(parts) == 3:
+            return self._send_json({'results': [{
+                'code': 200.0,
+                'status': 'Successfully executed action {0}.'.format(parts[2]),
+            }]})
+        if parts[1] == 'status':
+            return self._status(parts[2:])
+        if parts[1] == 'events':
+            return self._events(payload)
+        if parts[1:] == ['config', 'packages'] and method == 'GET':
+            dataset = server.dataset
+            with dataset.lock:
+                return self._send_json({'results': [{
+                    'active-stage': dataset.active.get(package, ''),
+                    'name': package,
+                    'stages': sorted(stages),
+                } for package, stages in sorted(dataset.packages.items())]})
+        if parts[1] == 'config' and len(parts) >= 4:
+            return self._config(method, parts[2], parts[3], parts[4:],
+                                payload)
+        return self._send_json({'error': 404, 'status': 'Not found'}, 404)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def _objects(self, method, parts, payload):
+        dataset = self.server.dataset
+        object_type = PLURALS.get(parts[0] if parts else None)
+        if object_type is None:
+            return self._send_json(
+                {'error': 404, 'status': 'Unknown object type'}, 404)
+        name = '/'.join(parts[1:]) or None
+
+        if method == 'GET':
+            if name is None and not payload:
+                return self._send_json(dataset.listing(object_type))
+            return self._send_json(
+                {'results': dataset.select(object_type, name, payload)})
+        if method == 'PUT':
+            dataset.add(object_type, name, payload.get('attrs') or {})
+            return self._send_json({'results': [{
+                'code': 200.0, 'status': 'Object was created.'}]})
+        names = [name] if name else [
+            result['name'] for result in dataset.select(object_type, None, {
+                'filter': payload.get('filter'),
+                'filter_vars': payload.get('filter_vars'),
+            })]
+        if method == 'POST':
+            dataset.update(object_type, names, payload.get('attrs') or {})
+            status = 'Attributes updated.'
+        elif method == 'DELETE':
+            dataset.delete(object_type, names)
+            status = 'Object was deleted.'
+        else:
+            return self._send_json(
+                {'error': 405, 'status': 'Method not allowed'}, 405)
+        return self._send_json({'results': [
+            {'code': 200.0, 'name': object_name, 'status': status,
+             'type': object_type}
+            for object_name in names]})
+
+    def _config(self, method, kind, package, parts, payload):
+        # stages are valid as uploaded, nothing is parsed or activated
+        dataset = self.server.dataset
+        with dataset.lock:
+            stages = dataset.packages.get(package)
+            if kind == 'packages' and method == 'POST':
+                dataset.packages.setdefault(package, {})
+                return self._send_json({'results': [{
+                    'code': 200.0, 'package': package,
+                    'status': 'Created package.'}]})
+            if kind == 'packages' and method == 'DELETE':
+                dataset.packages.pop(package, None)
+                dataset.active.pop(package, None)
+                return self._send_json({'results': [{
+                    'code': 200.0, 'package': package,
+                    'status': 'Deleted package.'}]})
+            if stages is None:
+                return self._send_json(
+                    {'error': 404, 'status': 'Package not found'}, 404)
+            if kind == 'stages' and method == 'POST':
+                stage = 'mock-{0}'.format(len(stages) + 1)
+                files = dict(payload.get('files') or {})
+                count = sum(text.count('\nobject ') + text.startswith('object ')
+                            for text in files.values())
+                files['startup.log'] = 'information/cli: Finished ' \
+                    'validating the configuration file(s), {0} objects.\n' \
+                    .format(count)
+                files['status'] = '0\n'
+                stages[stage] = files
+                if payload.get('reload', True):
+                    dataset.active[package] = stage
+                return self._send_json({'results': [{
+                    'code': 200.0, 'package': package, 'stage': stage,
+                    'status': 'Created stage. Reload triggered.'}]})
+            files = stages.get(parts[0]) if parts else None
+            if kind == 'stages' and files is not None and method == 'GET':
+                return self._send_json({'results': [
+                    {'name': path, 'type': 'file'} for path in sorted(files)]})
+            if kind == 'stages' and files is not None and method == 'DELETE':
+                del stages[parts[0]]
+                return self._send_json({'results': [{
+                    'code': 200.0, 'status': 'Stage deleted.'}]})
+            if kind == 'files' and files is not None and \
+                    '/'.join(parts[1:]) in files:
+                body = files['/'.join(parts[1:])].encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.server.bytes_sent += len(body)
+                self.wfile.write(body)
+                return None
+        return self._send_json({'error': 404, 'status': 'Not found'}, 404)
+
+    def _status(self, parts):
+        results = [{
+            'name': 'IcingaApplication',
+            'perfdata': [],
+            'status': {'icingaapplication': {'app': {
+                'node_name': 'mock', 'version': 'r2.13.0'}}},
+        }, {
+            'name': 'CIB',
+            'perfdata': [],
+            'status': {'num_hosts_up': float(len(
+                self.server.dataset.objects['Host']))},
+        }]
+        if parts:
+            results = [result for result in results
+                       if result['name'] == parts[0]]
+        return self._send_json({'results': results})
+
+    def _events(self, payload):
+        server = self.server
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        compressor = None
+        if self._gzip_accepted():
+            self.send_header('Content-Encoding', 'gzip')
+            compressor = zlib.compressobj(
+                self.server.compression, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self.end_headers()
+        interval = 1.0 / server.event_rate if server.event_rate else 0
+        sent = 0
+        try:
+            while not server.stopping and \
+                    (not server.event_count or sent < server.event_count):
+                lines = []
+                for _ in range(server.event_batch):
+                    lines.append(json.dumps(server.dataset.event()) + '\n')
+                chunk = ''.join(lines).encode('utf-8')
+                if compressor is not None:
+                    # flush every chunk, clients decode as they receive
+                    chunk = compressor.compress(chunk) + \
+                        compressor.flush(zlib.Z_SYNC_FLUSH)
+                self.server.bytes_sent += len(chunk)
+                self.wfile.write('{0:x}\r\n'.format(len(chunk)).encode('ascii'))
+                self.wfile.write(chunk + b'\r\n')
+                self.wfile.flush()
+                sent += server.event_batch
+                if interval:
+                    time.sleep(interval * server.event_batch)
+            self.wfile.write(b'0\r\n\r\n')
+        except (IOError, OSError):
+            pass
+        self.close_connection = True
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    '''
+    threaded HTTP server carrying the mock configuration
+    '''
+
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+class MockIcinga(object):
+    '''
+    Icinga 2 API stand-in server running in a background thread
+    '''
+
+    def __init__(self,
+                 hosts=1000,
+                 services_per_host=10,
+                 latency=0.0,
+                 event_rate=None,
+                 event_count=None,
+                 event_batch=1,
+                 certfile=None,
+                 keyfile=None,
+                 host='127.0.0.1',
+                 port=0,
+                 compression=0,
+                 workers=None):
+        '''
+        initialize object
+
+        :param hosts: number of synthetic hosts
+        :type hosts: int
+        :param services_per_host: number of services per host
+        :type services_per_host: int
+        :param latency: seconds to wait before answering a request
+        :type latency: float
+        :param event_rate: events per second, unlimited by default
+        :type event_rate: float
+        :param event_count: end the event stream after this many events
+        :type event_count: int
+        :param event_batch: events written per chunk
+        :type event_batch: int
+        :param certfile: serve TLS using this certificate
+        :type certfile: string
+        :param keyfile: the key of the certificate
+        :type keyfile: string
+        :param compression: gzip level of the responses if the client accepts
+            gzip, and accept gzip request bodies; 0 disables compression
+            like Icinga 2 without a proxy
+        :type compression: int
+        :param workers: requests processed at once like the API threads of
+            Icinga 2, unlimited by default; event streams hold one
+        :type workers: int
+        '''
+
+        self.dataset = Dataset(hosts, services_per_host)
+        self.server = _Server((host, port), _Handler)
+        self.server.dataset = self.dataset
+        self.server.latency = latency
+        self.server.event_rate = event_rate
+        self.server.event_count = event_count
+        self.server.event_batch = event_batch
+        self.server.compression = compression
+        self.server.workers = threading.Semaphore(workers) if workers \
+            else None
+        self.server.requests = 0
+        self.server.bytes_sent = 0
+        self.server.bytes_received = 0
+        self.server.stopping = False
+        self.scheme = 'http'
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.server.socket = context.wrap_socket(
+                self.server.socket, server_side=True)
+            self.scheme = 'https'
+        self._thread = None
+
+    @property
+    def url(self):
+        '''
+        the base url of the server
+        '''
+
+        host, port = self.server.server_address[:2]
+        return '{0}://{1}:{2}/'.format(self.scheme, host, port)
+
+    @property
+    def requests(self):
+        '''
+        number of requests handled
+        '''
+
+        return self.server.requests
+
+    @property
+    def bytes_sent(self):
+        '''
+        number of body bytes sent, after compression
+        '''
+
+        return self.server.bytes_sent
+
+    @property
+    def bytes_received(self):
+        '''
+        number of body bytes received, before decompression
+        '''
+
+        return self.server.bytes_received
+
+    def start(self):
+        '''
+        serve requests in a background thread
+        '''
+
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        '''
+        stop serving requests
+        '''
+
+        self.server.stopping = True
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    '''
+    run the mock server in the foreground
+    '''
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5665)
+    parser.add_argument('--hosts', type=int, default=1000)
+    parser.add_argument('--services', type=int, default=10,
+                        help='services per host')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--event-rate', type=float)
+    parser.add_argument('--certfile')
+    parser.add_argument('--keyfile')
+    parser.add_argument('--compression', type=int, default=0,
+                        help='gzip level, 0 disables compression')
+    args = parser.parse_args()
+
+    server = MockIcinga(args.hosts, args.services, args.latency,
+                        args.event_rate, certfile=args.certfile,
+                        keyfile=args.keyfile, host=args.host, port=args.port,
+                        compression=args.compression)
+    print('Serving {0} hosts and {1} services on {2}'.format(
+        len(server.dataset.objects['Host']),
+        len(server.dataset.objects['Service']),
+        server.url))
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -30,3 +30,14 @@ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 __author__ = 'fmnisme, Tobias von der Krone'
 __contact__ = 'fmnisme@gmail.com, tobias@vonderkrone.info'
 __version__ = '0.6.0'
+
+
+def __getattr__(name):
+    '''
+    import the client on first access of icinga2api.Client (Python 3.7+)
+    '''
+
+    if name == 'Client':
+        from icinga2api.client import Client
+        return Client
+    raise AttributeError(name)
@@ -44,6 +44,7 @@ class Actions(Base):
     '''
 
     base_url_path = 'v1/actions'
+    priority = 'actions'
 
     def process_check_result(self,
                              object_type,
@@ -104,6 +105,51 @@ class Actions(Base):
 
         return self._request('POST', url, payload)
 
+    def prepare_check_result(self,
+                             object_type,
+                             name,
+                             check_command=None,
+                             check_source=None):
+        '''
+        Prepare process_check_result() calls for one host or service.
+
+        The url, headers and the constant part of the payload are built once,
+        call the result with exit_status, plugin_output and optionally
+        performance_data.
+
+        :param object_type: Host or Service
+        :type object_type: string
+        :param name: name of the object
+        :type name: string
+        :param check_command: check command path followed by its arguments
+        :type check_command: list
+        :param check_source: name of the command_endpoint
+        :type check_source: string
+        :returns: the prepared call
+        :rtype: PreparedCall
+
+        example 1:
+        submit = prepare_check_result('Service', 'myhost.domain!ping4')
+        submit(exit_status=0, plugin_output='PING OK')
+        '''
+
+        if object_type not in ['Host', 'Service']:
+            raise Icinga2ApiException(
+                'object_type needs to be "Host" or "Service".'
+            )
+
+        url = '{}/{}'.format(self.base_url_path, 'process-check-result')
+
+        payload = {
+            object_type.lower(): name,
+        }
+        if check_command:
+            payload['check_command'] = check_command
+        if check_source:
+            payload['check_source'] = check_source
+
+        return self._prepare('POST', url, payload)
+
     def reschedule_check(self,
                          object_type,
                          filters,
@@ -150,6 +196,75 @@ class Actions(Base):
 
         return self._request('POST', url, payload)
 
+    def reschedule_spread(self,
+                          object_type,
+                          filters=None,
+                          filter_vars=None,
+                          objects=None,
+                          window=300,
+                          interval=10,
+                          by='cost',
+                          parallelism=4,
+                          force_check=True,
+                          dry_run=False,
+                          chunk_size=500):
+        '''
+        Reschedule checks spread over a time window instead of all at once.
+
+        The matched objects are split into buckets of interval seconds,
+        balanced by the execution time of their last check (cost), per zone
+        (zone) or by number (count). Every bucket is rescheduled with one
+        request, the requests run concurrently. Buckets with more than
+        chunk_size objects are split into several requests.
+
+        example 1:
+        plan = reschedule_spread('Service', 'service.state != 0', window=600)
+        plan.load_curve()
+
+        :param object_type: Host or Service
+        :type object_type: string
+        :param filters: filters matched object(s)
+        :type filters: string
+        :param filter_vars: variables used in the for filters expression
+        :type filter_vars: dict
+        :param objects: listed objects to reschedule instead of filters
+        :type objects: list
+        :param window: seconds to spread the checks over
+        :type window: float
+        :param interval: seconds per bucket
+        :type interval: float
+        :param by: cost, zone or count
+        :type by: string
+        :param parallelism: maximum concurrent requests
+        :type parallelism: int
+        :param force_check: ignore period restrictions and disabled checks
+        :type force_check: bool
+        :param dry_run: only plan, don't reschedule
+        :type dry_run: bool
+        :param chunk_size: names per request
+        :type chunk_size: int
+        :returns: the plan with the results
+        :rtype: ReschedulePlan
+        '''
+
+        if object_type not in ['Host', 'Service']:
+            raise Icinga2ApiException(
+                'object_type needs to be "Host" or "Service".'
+            )
+
+        from icinga2api.reschedule import plan_reschedule, submit_plan
+
+        if objects is None:
+            objects = self.manager.objects.list(
+                object_type,
+                attrs=['zone', 'last_check_result'],
+                filters=filters,
+                filter_vars=filter_vars)
+        plan = plan_reschedule(object_type, objects, window, interval, by)
+        if dry_run:
+            return plan
+        return submit_plan(self, plan, parallelism, force_check, chunk_size)
+
     def send_custom_notification(self,
                                  object_type,
                                  filters,
@@ -27,27 +27,134 @@ Icinga 2 API client base
 '''
 
 from __future__ import print_function
+import json
 import logging
-import sys
-import requests
-# pylint: disable=import-error,no-name-in-module
-if sys.version_info >= (3, 0):
-    from urllib.parse import urljoin
-else:
-    from urlparse import urljoin
-# pylint: enable=import-error,no-name-in-module
+import threading
 
 from icinga2api.exceptions import Icinga2ApiException
 
 LOG = logging.getLogger(__name__)
 
 
+class _Call(object):
+    '''
+    an in-flight call shared by single-flight callers
+    '''
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    '''
+    Share one execution between identical concurrent calls
+
+    The first caller of a key executes the call, callers arriving while it is
+    in flight wait for it and get the same result (or exception).
+    '''
+
+    def __init__(self):
+        '''
+        initialize object
+        '''
+
+        self.calls = 0
+        self.collapsed = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def do(self, key, function):
+        '''
+        execute function once for all concurrent callers of key
+
+        :param key: identifies identical calls
+        :type key: hashable
+        :param function: the call to execute
+        :type function: callable
+        :returns: the result of the call
+        '''
+
+        with self._lock:
+            self.calls += 1
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+
+        return call.result
+
+    def stats(self):
+        '''
+        return the number of calls and collapsed calls
+
+        :returns: calls, collapsed calls and calls in flight
+        :rtype: dictionary
+        '''
+
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'collapsed': self.collapsed,
+                'in_flight': len(self._in_flight),
+            }
+
+
+class PreparedCall(object):
+    '''
+    A request with precomputed url, headers and payload
+
+    Calling it sends the request, keyword arguments are added to the payload.
+    '''
+
+    def __init__(self, endpoint, method, url_path, payload=None):
+        '''
+        initialize object
+        '''
+
+        self.endpoint = endpoint
+        self.method = method.upper()
+        self.url = endpoint.manager.base_url + url_path
+        self.payload = payload or {}
+
+    def __call__(self, **payload):
+        body = self.payload
+        if payload:
+            body = dict(self.payload)
+            body.update(payload)
+        # pylint: disable=protected-access
+        return self.endpoint._do_request(self.method, self.url, body)
+
+
 class Base(object):
     '''
     Icinga 2 API Base class
     '''
 
     base_url_path = None  # 继承
+    # priority class of requests, see icinga2api.scheduler
+    priority = 'interactive'
+    # priority class of requests other than GET, None for priority
+    write_priority = None
 
     def __init__(self, manager):
         '''
@@ -57,30 +164,6 @@ class Base(object):
         self.manager = manager
         self.stream_cache = ""
 
-    def _create_session(self, method='POST'):
-        '''
-        create a session object
-        '''
-
-        session = requests.Session()
-        # prefer certificate authentification
-        if self.manager.certificate and self.manager.key:
-            # certificate and key are in different files
-            session.cert = (self.manager.certificate, self.manager.key)
-        elif self.manager.certificate:
-            # certificate and key are in the same file
-            session.cert = self.manager.certificate
-        elif self.manager.username and self.manager.password:
-            # use username and password
-            session.auth = (self.manager.username, self.manager.password)
-        session.headers = {
-            'User-Agent': 'Python-icinga2api/{0}'.format(self.manager.version),
-            'X-HTTP-Method-Override': method.upper(),
-            'Accept': 'application/json'
-        }
-
-        return session
-
     def _request(self, method, url_path, payload=None, stream=False):
         '''
         make the request and return the body
@@ -95,30 +178,51 @@ class Base(object):
         :rtype: dictionary
         '''
 
-        request_url = urljoin(self.manager.url, url_path)
-        LOG.debug("Request URL: %s", request_url)
+        request_url = self.manager.base_url + url_path
+        single_flight = self.manager.single_flight
+        if single_flight is not None and not stream and \
+                method.upper() == 'GET':
+            key = ('GET', url_path, json.dumps(payload, sort_keys=True))
+            return single_flight.do(
+                key, lambda: self._do_request(method, request_url, payload))
 
-        # create session
-        session = self._create_session(method)
+        return self._do_request(method, request_url, payload, stream)
 
-        # create arguments for the request
-        request_args = {
-            'url': request_url
-        }
-        if payload:
-            request_args['json'] = payload
-        if self.manager.ca_certificate:
-            request_args['verify'] = self.manager.ca_certificate
-        else:
-            request_args['verify'] = False
-        if stream:
-            request_args['stream'] = True
+    def _prepare(self, method, url_path, payload=None):
+        '''
+        return a reusable call of method on url_path with a fixed payload
 
-        # do the request
-        response = session.post(**request_args)
+        :param method: the HTTP method
+        :type method: string
+        :param url_path: the requested url path
+        :type url_path: string
+        :param payload: the payload sent with every call
+        :type payload: dictionary
+        :returns: the prepared call
+        :rtype: PreparedCall
+        '''
+
+        return PreparedCall(self, method, url_path, payload)
+
+    def _do_request(self, method, request_url, payload=None, stream=False):
+        '''
+        make the request to the full url and return the body
+        '''
+
+        LOG.debug("Request URL: %s", request_url)
+
+        scheduler = self.manager.scheduler
+        if scheduler is not None and not stream:
+            priority = self.priority
+            if self.write_priority and method.upper() != 'GET':
+                priority = self.write_priority
+            with scheduler.slot(priority):
+                response = self.manager.transport.request(
+                    method, request_url, payload, stream)
+        else:
+            response = self.manager.transport.request(
+                method, request_url, payload, stream)
 
-        if not stream:
-            session.close()
         # # for debugging
         # from pprint import pprint
         # pprint(request_url)
@@ -126,12 +230,16 @@ class Base(object):
         # pprint(response)
 
         if not 200 <= response.status_code <= 299:
+            text = response.text
+            if stream:
+                response.close()
             raise Icinga2ApiException(
                 'Request "{}" failed with status {}: {}'.format(
                     response.url,
                     response.status_code,
-                    response.text,
-                ))
+                    text,
+                ),
+                status_code=response.status_code)
 
         if stream:
             return response
@@ -141,19 +249,17 @@ class Base(object):
     @staticmethod
     def _get_message_from_stream(stream):
         '''
-        make the request and return the body
+        read the stream and yield one message per line
 
         :param stream: the stream
         :type method: request
         :returns: the message
-        :rtype: dictionary
+        :rtype: string
         '''
 
-        # TODO: test iter_lines()
-        message = ''
-        for char in stream.iter_content():
-            if char == '\n':
-                yield message
-                message = ''
-            else:
-                message += char
+        for line in stream.iter_lines():
+            if not line:
+                continue
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            yield line
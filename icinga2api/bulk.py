@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API bulk operations
+
+Order objects by their dependencies and process them level by level, group
+identical changes of many objects.
+'''
+
+from __future__ import print_function
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.scheduler import carry
+
+LOG = logging.getLogger(__name__)
+
+# object types are created in this order, types of the same rank are only
+# ordered by their references, unknown types get rank 1
+TYPE_RANKS = {
+    'Zone': 0,
+    'Endpoint': 0,
+    'ApiUser': 0,
+    'CheckCommand': 1,
+    'EventCommand': 1,
+    'NotificationCommand': 1,
+    'TimePeriod': 1,
+    'HostGroup': 1,
+    'ServiceGroup': 1,
+    'UserGroup': 1,
+    'Host': 2,
+    'User': 2,
+    'Service': 3,
+    'Comment': 4,
+    'Dependency': 4,
+    'Downtime': 4,
+    'Notification': 4,
+    'ScheduledDowntime': 4,
+}
+
+# attributes referencing other objects: attribute -> referenced type
+REFERENCES = {
+    'zone': 'Zone',
+    'parent': 'Zone',
+    'endpoints': 'Endpoint',
+    'command_endpoint': 'Endpoint',
+    'check_command': 'CheckCommand',
+    'event_command': 'EventCommand',
+    'command': 'NotificationCommand',
+    'check_period': 'TimePeriod',
+    'period': 'TimePeriod',
+    'host_name': 'Host',
+    'parent_host_name': 'Host',
+    'child_host_name': 'Host',
+    'users': 'User',
+    'user_groups': 'UserGroup',
+}
+
+GROUP_TYPES = {
+    'Host': 'HostGroup',
+    'Service': 'ServiceGroup',
+    'User': 'UserGroup',
+}
+
+SERVICE_REFERENCES = {
+    'service_name': 'host_name',
+    'parent_service_name': 'parent_host_name',
+    'child_service_name': 'child_host_name',
+}
+
+
+def _as_list(value):
+    '''
+    return a reference attribute as list
+    '''
+
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def references(obj):
+    '''
+    return the (type, name) keys an object definition refers to
+
+    :param obj: object definition with type, name and attrs
+    :type obj: dictionary
+    :returns: the referenced objects
+    :rtype: list
+    '''
+
+    attrs = obj.get('attrs') or {}
+    result = []
+    for attr, object_type in REFERENCES.items():
+        if attr == 'parent' and obj['type'] != 'Zone':
+            continue
+        for name in _as_list(attrs.get(attr)):
+            result.append((object_type, name))
+    if obj['type'] in GROUP_TYPES:
+        for name in _as_list(attrs.get('groups')):
+            result.append((GROUP_TYPES[obj['type']], name))
+    for attr, host_attr in SERVICE_REFERENCES.items():
+        if attrs.get(attr) and attrs.get(host_attr):
+            result.append(('Service', '{}!{}'.format(
+                attrs[host_attr], attrs[attr])))
+    if obj['type'] == 'Service' and '!' in obj['name']:
+        result.append(('Host', obj['name'].split('!', 1)[0]))
+    return result
+
+
+def _levels(depends):
+    '''
+    return the longest path level of every node, nodes in or behind a cycle
+    are missing from the result
+    '''
+
+    dependents = dict((key, []) for key in depends)
+    missing = {}
+    for key, deps in depends.items():
+        missing[key] = len(deps)
+        for dep in deps:
+            dependents[dep].append(key)
+
+    level = {}
+    ready = [key for key, count in missing.items() if not count]
+    while ready:
+        key = ready.pop()
+        if key[0] == 'barrier':
+            # barriers don't take a level of their own
+            level[key] = max([level[dep] for dep in depends[key]] or [-1])
+        else:
+            level[key] = max([level[dep] + 1 for dep in depends[key]] or [0])
+        for dependent in dependents[key]:
+            missing[dependent] -= 1
+            if not missing[dependent]:
+                ready.append(dependent)
+    return level
+
+
+def dependency_levels(objects):
+    '''
+    group object definitions into levels which can be created concurrently
+
+    An object is placed after all objects of lower type rank and after all
+    objects of the same rank it references. Objects in or behind a reference
+    cycle are returned separately.
+
+    :param objects: object definitions with type, name and attrs
+    :type objects: list
+    :returns: the levels (lists of objects) and the objects in cycles
+    :rtype: tuple
+    '''
+
+    by_key = {}
+    for obj in objects:
+        by_key[(obj['type'], obj['name'])] = obj
+
+    def rank(key):
+        return TYPE_RANKS.get(key[0], 1)
+
+    # references within a rank decide the order inside the rank
+    depends = {}
+    for key, obj in by_key.items():
+        depends[key] = set(ref for ref in references(obj)
+                           if ref in by_key and ref != key and
+                           rank(ref) == rank(key))
+    in_cycle = set(by_key)
+    for key in _levels(depends):
+        in_cycle.discard(key)
+    # objects behind a cycle are placed normally and skipped when running
+    for key in in_cycle:
+        del depends[key]
+    for deps in depends.values():
+        deps -= in_cycle
+
+    # virtual barrier nodes keep the rank order with O(n) edges
+    ranks = sorted(set(rank(key) for key in depends))
+    for key, deps in depends.items():
+        position = ranks.index(rank(key))
+        if position:
+            deps.add(('barrier', ranks[position - 1]))
+    for number in ranks:
+        depends[('barrier', number)] = set(
+            key for key in by_key
+            if key not in in_cycle and rank(key) == number)
+
+    level = _levels(depends)
+    levels = []
+    for key, obj in by_key.items():
+        if key in in_cycle:
+            continue
+        while len(levels) <= level[key]:
+            levels.append([])
+        levels[level[key]].append(obj)
+    cycles = [by_key[key] for key in in_cycle]
+    return [objs for objs in levels if objs], cycles
+
+
+class BulkResult(object):
+    '''
+    result of a bulk operation
+    '''
+
+    def __init__(self, total):
+        self.total = total
+        self.done = []
+        self.failed = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ok(self):
+        '''
+        True if no object failed
+        '''
+
+        return not self.failed
+
+    def __repr__(self):
+        return '<BulkResult total={} done={} failed={}>'.format(
+            self.total, len(self.done), len(self.failed))
+
+
+def run_levels(levels, cycles, function, parallelism=8, progress=None):
+    '''
+    call function for every object, level by level, concurrently per level
+
+    Objects referencing a failed object are not processed and reported as
+    failed.
+
+    :param levels: the levels as returned by dependency_levels()
+    :type levels: list
+    :param cycles: objects which can't be ordered
+    :type cycles: list
+    :param function: called with every object definition
+    :type function: callable
+    :param parallelism: maximum concurrent calls
+    :type parallelism: int
+    :param progress: called with the BulkResult after every object
+    :type progress: callable
+    :returns: the result
+    :rtype: BulkResult
+    '''
+
+    result = BulkResult(sum(len(objs) for objs in levels) + len(cycles))
+
+    def finish(key, error=None):
+        with result._lock:  # pylint: disable=protected-access
+            if error is None:
+                result.done.append(key)
+            else:
+                result.failed[key] = error
+        if progress:
+            progress(result)
+
+    for obj in cycles:
+        finish((obj['type'], obj['name']), 'dependency cycle')
+
+    def process(obj):
+        key = (obj['type'], obj['name'])
+        for ref in references(obj):
+            if ref in result.failed:
+                finish(key, 'dependency {} "{}" failed'.format(*ref))
+                return
+        try:
+            function(obj)
+        except Exception as error:  # pylint: disable=broad-except
+            LOG.debug('%s "%s" failed: %s', key[0], key[1], error)
+            finish(key, str(error))
+        else:
+            finish(key)
+
+    process = carry(process, 'bulk')
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        for objs in levels:
+            list(executor.map(process, objs))
+
+    return result
+
+
+def group_changes(changes):
+    '''
+    group object names by identical attribute changes
+
+    :param changes: attributes to change by object name
+    :type changes: dictionary
+    :returns: (attributes, names) per distinct change, largest group first
+    :rtype: list
+    '''
+
+    groups = {}
+    for name, attrs in changes.items():
+        key = json.dumps(attrs, sort_keys=True)
+        if key not in groups:
+            groups[key] = (attrs, [])
+        groups[key][1].append(name)
+    return sorted(groups.values(), key=lambda group: -len(group[1]))
+
+
+def stream_results(requests, function, parallelism=4):
+    '''
+    run function(attrs, names) for all requests, yield one result per name
+
+    The requests are started right away, the results are yielded as the
+    requests finish. Names without a result get code 404, names of a failed
+    request the status code and message of the error.
+
+    :param requests: (attrs, names) tuples
+    :type requests: list
+    :param function: sends a request, returns its per-object results
+    :type function: callable
+    :param parallelism: maximum concurrent requests
+    :type parallelism: int
+    :returns: dictionaries with name, code and status
+    :rtype: iterator
+    '''
+
+    function = carry(function, 'bulk')
+    executor = ThreadPoolExecutor(max_workers=max(1, parallelism))
+    futures = dict(
+        (executor.submit(function, attrs, names), names)
+        for attrs, names in requests)
+
+    def stream():
+        try:
+            for future in as_completed(futures):
+                names = futures[future]
+                try:
+                    results = future.result()
+                except Exception as error:  # pylint: disable=broad-except
+                    code = getattr(error, 'status_code', None) \
+                        if isinstance(error, Icinga2ApiException) else None
+                    for name in names:
+                        yield {'name': name, 'code': code or 500,
+                               'status': str(error)}
+                    continue
+                found = set()
+                for result in results:
+                    found.add(result.get('name'))
+                    yield result
+                for name in names:
+                    if name not in found:
+                        yield {'name': name, 'code': 404,
+                               'status': 'No object found.'}
+        finally:
+            executor.shutdown(wait=False)
+
+    return stream()
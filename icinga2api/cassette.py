@@ -0,0 +1,476 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API record and replay transports
+
+A recording transport sends requests with another transport and writes the
+requests, responses and the lines of streams with their timing to a
+cassette file. A replay transport answers requests from a cassette without
+a server, immediately or at the recorded timing divided by a speed factor.
+
+A cassette is a gzip compressed file of JSON lines:
+
+    {"cassette": 1, "redact": [...]}                   header
+    {"b": "<id>", "d": "<text>"}                        body, stored once
+    {"q": 1, "m": "GET", "u": "v1/...", "p": "<id>",
+     "s": 200, "r": "<id>", "at": 0.1, "dt": 0.02}      request and response
+    {"l": 1, "at": 0.5, "b": "<id>"}                    line of a stream
+'''
+
+from __future__ import print_function
+import collections
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.transport import Transport, create_transport
+
+LOG = logging.getLogger(__name__)
+
+VERSION = 1
+REDACTED = '***'
+
+
+def _redact(value, keys):
+    '''
+    return value with the values of keys replaced, recursively
+    '''
+
+    if isinstance(value, dict):
+        return dict((key, REDACTED if key in keys else _redact(item, keys))
+                    for key, item in value.items())
+    if isinstance(value, list):
+        return [_redact(item, keys) for item in value]
+    return value
+
+
+def _redact_text(text, keys):
+    '''
+    return a JSON text with the values of keys replaced
+    '''
+
+    if not keys or not text:
+        return text
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return text
+    return json.dumps(_redact(value, keys), sort_keys=True)
+
+
+def _payload_text(payload, keys):
+    '''
+    return a payload as canonical JSON text, redacted
+    '''
+
+    if payload is None:
+        return None
+    return json.dumps(_redact(payload, keys) if keys else payload,
+                      sort_keys=True)
+
+
+def _digest(text):
+    '''
+    return the id of a body
+    '''
+
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _path(client, url):
+    '''
+    return the url relative to the base url of the client
+    '''
+
+    if url.startswith(client.base_url):
+        return url[len(client.base_url):]
+    return url
+
+
+class _RecordingStream(object):
+    '''
+    streamed response recording its lines as they are read
+    '''
+
+    def __init__(self, response, recorder, number, start):
+        self.response = response
+        self.recorder = recorder
+        self.number = number
+        self.start = start
+        self.status_code = response.status_code
+        self.url = response.url
+
+    @property
+    def content(self):
+        '''
+        the body as bytes
+        '''
+
+        return self.text.encode('utf-8')
+
+    @property
+    def text(self):
+        '''
+        the body as text, recorded as one line
+        '''
+
+        text = self.response.text
+        self.recorder.write_line(self.number, self.start, text)
+        return text
+
+    def json(self):
+        '''
+        the body decoded from JSON
+        '''
+
+        return json.loads(self.text)
+
+    def iter_lines(self):
+        '''
+        yield the body line by line as it arrives, recording every line
+        '''
+
+        for line in self.response.iter_lines():
+            text = line.decode('utf-8') if isinstance(line, bytes) else line
+            if text:
+                self.recorder.write_line(self.number, self.start, text)
+            yield line
+
+    def close(self):
+        '''
+        close the response
+        '''
+
+        close = getattr(self.response, 'close', None)
+        if close is not None:
+            close()
+
+
+class RecordingTransport(Transport):
+    '''
+    Record the requests of another transport to a cassette
+    '''
+
+    def __init__(self, client, path, transport='requests', redact=None):
+        '''
+        initialize object
+
+        :param client: the client
+        :type client: Client
+        :param path: the cassette file, overwritten
+        :type path: string
+        :param transport: the transport sending the requests, see
+            create_transport()
+        :type transport: string
+        :param redact: keys whose values are replaced in recorded payloads,
+            responses and lines, e.g. ['password', 'address']
+        :type redact: list
+        '''
+
+        super(RecordingTransport, self).__init__(client)
+        self.path = path
+        self.transport = create_transport(client, transport)
+        self.redact = frozenset(redact or ())
+        self.requests = 0
+        self.bodies = 0
+        self.duplicates = 0
+        self._seen = set()
+        self._lock = threading.Lock()
+        self._start = time.time()
+        self._file = gzip.open(path, 'wt')
+        self._write({'cassette': VERSION, 'redact': sorted(self.redact)})
+
+    def _write(self, entry):
+        '''
+        write a record to the cassette
+        '''
+
+        self._file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+    def _body(self, text):
+        '''
+        write a body unless it was written before, return its id
+        '''
+
+        if text is None:
+            return None
+        body_id = _digest(text)
+        if body_id in self._seen:
+            self.duplicates += 1
+        else:
+            self._seen.add(body_id)
+            self.bodies += 1
+            self._write({'b': body_id, 'd': text})
+        return body_id
+
+    def write_line(self, number, start, text):
+        '''
+        record a line of a streamed response
+
+        :param number: the number of the request
+        :type number: int
+        :param start: time the request was sent
+        :type start: float
+        :param text: the line
+        :type text: string
+        '''
+
+        text = _redact_text(text, self.redact)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._write({'l': number, 'at': round(time.time() - start, 6),
+                         'b': self._body(text)})
+
+    def request(self, method, url, payload=None, stream=False):
+        start = time.time()
+        response = self.transport.request(method, url, payload, stream)
+        duration = time.time() - start
+        text = None if stream else _redact_text(response.text, self.redact)
+        with self._lock:
+            self.requests += 1
+            number = self.requests
+            if not self._file.closed:
+                self._write({
+                    'q': number,
+                    'm': method.upper(),
+                    'u': _path(self.client, url),
+                    'p': self._body(_payload_text(payload, self.redact)),
+                    's': response.status_code,
+                    'r': self._body(text),
+                    'at': round(start - self._start, 6),
+                    'dt': round(duration, 6),
+                    'st': stream,
+                })
+        if stream:
+            return _RecordingStream(response, self, number, start)
+        return response
+
+    def close(self):
+        '''
+        close the cassette and the transport
+        '''
+
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+        self.transport.close()
+        LOG.debug('Recorded %d requests, %d bodies, %d duplicates',
+                  self.requests, self.bodies, self.duplicates)
+
+
+class CassetteResponse(object):
+    '''
+    response replayed from a cassette
+    '''
+
+    def __init__(self, status_code, url, text, lines=None, speed=None):
+        self.status_code = status_code
+        self.url = url
+        self.headers = {}
+        self._text = text
+        self._lines = lines
+        self._speed = speed
+
+    @property
+    def content(self):
+        '''
+        the body as bytes
+        '''
+
+        return self.text.encode('utf-8')
+
+    @property
+    def text(self):
+        '''
+        the body as text
+        '''
+
+        if self._text is None and self._lines:
+            return '\n'.join(line for _, line in self._lines)
+        return self._text or ''
+
+    def json(self):
+        '''
+        the body decoded from JSON
+        '''
+
+        return json.loads(self.text)
+
+    def iter_lines(self):
+        '''
+        yield the recorded lines, at the recorded timing if replayed with a
+        speed
+        '''
+
+        start = time.time()
+        for offset, line in self._lines or ():
+            if self._speed:
+                delay = offset / self._speed - (time.time() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            yield line.encode('utf-8')
+
+    def close(self):
+        '''
+        nothing to release
+        '''
+
+
+class ReplayTransport(Transport):
+    '''
+    Answer requests from a cassette
+    '''
+
+    def __init__(self, client, path, speed=None):
+        '''
+        initialize object
+
+        Requests are matched by method, url path and payload, repeated
+        requests get the recorded responses in order, then start over.
+        Requests without a match get the responses of the same method and
+        url path, or else a 404 response.
+
+        :param client: the client
+        :type client: Client
+        :param path: the cassette file
+        :type path: string
+        :param speed: divide the recorded response times by this factor,
+            1.0 for the original timing, None to answer immediately
+        :type speed: float
+        '''
+
+        super(ReplayTransport, self).__init__(client)
+        self.path = path
+        self.speed = speed
+        self.requests = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._responses = collections.defaultdict(list)
+        self._by_path = collections.defaultdict(list)
+        self._next = collections.defaultdict(int)
+        self._load(path)
+
+    def _load(self, path):
+        '''
+        read the requests and responses of a cassette
+        '''
+
+        bodies = {}
+        requests = {}
+        with gzip.open(path, 'rt') as handle:
+            header = json.loads(handle.readline() or 'null')
+            if not isinstance(header, dict) or \
+                    header.get('cassette') != VERSION:
+                raise Icinga2ApiException(
+                    'File "{}" is not a cassette.'.format(path))
+            self.redact = frozenset(header.get('redact') or ())
+            for line in handle:
+                entry = json.loads(line)
+                if 'b' in entry and 'd' in entry:
+                    bodies[entry['b']] = entry['d']
+                elif 'q' in entry:
+                    entry['lines'] = [] if entry.get('st') else None
+                    requests[entry['q']] = entry
+                    key = (entry['m'], entry['u'], entry['p'])
+                    self._responses[key].append(entry)
+                    self._by_path[(entry['m'], entry['u'])].append(entry)
+                elif 'l' in entry and entry['l'] in requests:
+                    lines = requests[entry['l']]['lines']
+                    if lines is not None:
+                        lines.append((entry['at'], bodies[entry['b']]))
+        for entry in requests.values():
+            entry['text'] = bodies.get(entry['r'])
+        LOG.debug('Loaded %d requests from %s', len(requests), path)
+
+    def request(self, method, url, payload=None, stream=False):
+        path = _path(self.client, url)
+        payload_text = _payload_text(payload, self.redact)
+        key = (method.upper(), path,
+               _digest(payload_text) if payload_text is not None else None)
+        with self._lock:
+            self.requests += 1
+            entries = self._responses.get(key)
+            if not entries:
+                key = (method.upper(), path)
+                entries = self._by_path.get(key)
+            if not entries:
+                self.misses += 1
+                entry = None
+            else:
+                entry = entries[self._next[key] % len(entries)]
+                self._next[key] += 1
+        if entry is None:
+            return CassetteResponse(404, url, json.dumps({
+                'error': 404, 'status': 'Request not in cassette.'}))
+        if self.speed and entry.get('dt'):
+            time.sleep(entry['dt'] / self.speed)
+        return CassetteResponse(entry['s'], url, entry['text'],
+                                entry['lines'], self.speed)
+
+
+def record(path, transport='requests', redact=None):
+    '''
+    return a transport factory recording to a cassette
+
+    example 1:
+    client = Client(url, username, password,
+                    transport=record('prod.cassette', redact=['address']))
+
+    :param path: the cassette file, overwritten
+    :type path: string
+    :param transport: the transport sending the requests
+    :type transport: string
+    :param redact: keys whose values are replaced in the cassette
+    :type redact: list
+    :returns: function creating the transport for a client
+    :rtype: callable
+    '''
+
+    return lambda client: RecordingTransport(client, path, transport, redact)
+
+
+def replay(path, speed=None):
+    '''
+    return a transport factory replaying a cassette
+
+    example 1:
+    client = Client('https://localhost:5665/', 'root', 'icinga',
+                    transport=replay('prod.cassette', speed=10))
+
+    :param path: the cassette file
+    :type path: string
+    :param speed: divide the recorded timing by this factor, None to
+        answer immediately
+    :type speed: float
+    :returns: function creating the transport for a client
+    :rtype: callable
+    '''
+
+    return lambda client: ReplayTransport(client, path, speed)
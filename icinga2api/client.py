@@ -30,18 +30,36 @@ programmatic way using HTTP requests.
 '''
 
 from __future__ import print_function
+import importlib
 import logging
+import sys
+# pylint: disable=import-error,no-name-in-module
+if sys.version_info >= (3, 0):
+    from urllib.parse import urljoin
+else:
+    from urlparse import urljoin
+# pylint: enable=import-error,no-name-in-module
 
 import icinga2api
-from icinga2api.actions import Actions
+from icinga2api.base import SingleFlight
 from icinga2api.configfile import ClientConfigFile
-from icinga2api.events import Events
 from icinga2api.exceptions import Icinga2ApiException
-from icinga2api.objects import Objects
-from icinga2api.status import Status
+from icinga2api.tls import TlsContext
+from icinga2api.transport import create_transport
 
 LOG = logging.getLogger(__name__)
 
+# endpoints are imported and created on first access:
+# attribute -> (module, class)
+ENDPOINTS = {
+    'actions': ('icinga2api.actions', 'Actions'),
+    'console': ('icinga2api.console', 'Console'),
+    'events': ('icinga2api.events', 'Events'),
+    'objects': ('icinga2api.objects', 'Objects'),
+    'packages': ('icinga2api.packages', 'ConfigPackages'),
+    'status': ('icinga2api.status', 'Status'),
+}
+
 
 class Client(object):
     '''
@@ -56,7 +74,12 @@ class Client(object):
                  certificate=None,
                  key=None,
                  ca_certificate=None,
-                 config_file=None):
+                 config_file=None,
+                 single_flight=False,
+                 transport='requests',
+                 compression=False,
+                 compress_requests=None,
+                 scheduler=None):
         '''
         initialize object
         '''
@@ -77,10 +100,17 @@ class Client(object):
             config_from_file.key
         self.ca_certificate = ca_certificate or \
             config_from_file.ca_certificate
-        self.objects = Objects(self)
-        self.actions = Actions(self)
-        self.events = Events(self)
-        self.status = Status(self)
+        self.single_flight = SingleFlight() if single_flight else None
+        # ask for gzip/deflate responses
+        self.compression = compression
+        # gzip request bodies larger than this many bytes
+        self.compress_requests = compress_requests
+        # share the request slots between priority classes
+        if scheduler is True:
+            # imported here to keep importing the client fast
+            from icinga2api.scheduler import RequestScheduler
+            scheduler = RequestScheduler()
+        self.scheduler = scheduler or None
         self.version = icinga2api.__version__
 
         if not self.url:
@@ -89,3 +119,29 @@ class Client(object):
             raise Icinga2ApiException(
                 'Neither username/password nor certificate defined.'
             )
+        # one SSL context for all connections, built on the first request
+        self.tls = TlsContext(self.certificate, self.key, self.ca_certificate)
+        # a name of icinga2api.transport.TRANSPORTS or a Transport
+        self.transport = create_transport(self, transport)
+        # requests only append their url path to this
+        self.base_url = urljoin(self.url, '.')
+
+    def __getattr__(self, name):
+        '''
+        import and create an endpoint on first access
+        '''
+
+        if name not in ENDPOINTS:
+            raise AttributeError(name)
+        module_name, class_name = ENDPOINTS[name]
+        module = importlib.import_module(module_name)
+        endpoint = getattr(module, class_name)(self)
+        setattr(self, name, endpoint)
+        return endpoint
+
+    def close(self):
+        '''
+        close the connections of the transport
+        '''
+
+        self.transport.close()
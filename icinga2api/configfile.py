@@ -28,12 +28,6 @@ Icinga 2 API client config file
 
 import os
 import sys
-# pylint: disable=import-error,no-name-in-module
-if sys.version_info >= (3, 0):
-    import configparser as configparser
-else:
-    import ConfigParser as configparser
-# pylint: enable=import-error,no-name-in-module
 
 from icinga2api.exceptions import Icinga2ApiConfigFileException
 
@@ -89,6 +83,13 @@ class ClientConfigFile(object):
         parse the config file
         '''
 
+        # pylint: disable=import-error,no-name-in-module
+        if sys.version_info >= (3, 0):
+            import configparser as configparser
+        else:
+            import ConfigParser as configparser
+        # pylint: enable=import-error,no-name-in-module
+
         cfg = configparser.ConfigParser()
         cfg.read(self.file_name)
 
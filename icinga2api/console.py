@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API console
+
+Runs scripts in the Icinga 2 DSL on the master. The aggregations count, group
+and sum objects there and return only the aggregates. Like API filters they
+run sandboxed, a filter can't access files, processes or the configuration.
+'''
+
+from __future__ import print_function
+import json
+import logging
+import re
+
+from icinga2api.base import Base
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.joins import HOST_JOIN_TYPES
+
+LOG = logging.getLogger(__name__)
+
+PATH = re.compile(r'^[A-Za-z_]\w*(\.[A-Za-z_]\w*)*$')
+# attribute paths added or subtracted
+VALUE = re.compile(r'^[A-Za-z_][\w.]*(\s*[-+]\s*[A-Za-z_][\w.]*)*$')
+NAME = re.compile(r'^[A-Za-z_]\w*$')
+
+try:
+    TEXT_TYPES = (str, unicode)  # pylint: disable=undefined-variable
+except NameError:
+    TEXT_TYPES = (str,)
+
+
+def _literal(value):
+    '''
+    return a value as a literal of the Icinga 2 DSL
+    '''
+
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, TEXT_TYPES):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, (list, tuple)):
+        return '[ {} ]'.format(', '.join(_literal(item) for item in value))
+    if isinstance(value, dict):
+        return '{{ {} }}'.format(', '.join(
+            '{} = {}'.format(_literal(str(key)), _literal(item))
+            for key, item in value.items()))
+    raise Icinga2ApiException(
+        'Cannot use {!r} in a console script.'.format(value))
+
+
+def _path(path):
+    '''
+    return a validated attribute path
+    '''
+
+    if not PATH.match(path):
+        raise Icinga2ApiException('Invalid attribute path "{}".'.format(path))
+    return path
+
+
+def _value(value):
+    '''
+    return a validated sum or difference of attribute paths
+    '''
+
+    if not VALUE.match(value) or not all(
+            PATH.match(term.strip()) for term in re.split(r'[-+]', value)):
+        raise Icinga2ApiException('Invalid value "{}".'.format(value))
+    return '({})'.format(value)
+
+
+def aggregation_script(object_type, group_by=None, value=None, filters=None,
+                       filter_vars=None):
+    '''
+    return a script counting or summing objects, optionally grouped
+
+    The objects are available as the lower case type name (e.g. service) and
+    objects with a host_name attribute also as host, as in API filters. Array
+    values count the object in every element's group, groups are nested in
+    the order of group_by.
+
+    :param object_type: type of the objects, e.g. Service
+    :type object_type: string
+    :param group_by: attribute paths to group by, e.g. ['host.groups']
+    :type group_by: list
+    :param value: attribute path to sum, or paths added or subtracted like
+        'service.last_check_result.execution_end -
+        service.last_check_result.execution_start', None to count
+    :type value: string
+    :param filters: only aggregate objects matching this filter
+    :type filters: string
+    :param filter_vars: variables used in the filters expression
+    :type filter_vars: dictionary
+    :returns: the script
+    :rtype: string
+    '''
+
+    if not NAME.match(object_type):
+        raise Icinga2ApiException(
+            'Invalid object type "{}".'.format(object_type))
+    group_by = [_path(path) for path in group_by or []]
+    variable = object_type.lower()
+
+    lines = ['var icinga2api_result = {}'.format('{}' if group_by else '0')]
+    for name, var_value in sorted((filter_vars or {}).items()):
+        if not NAME.match(name):
+            raise Icinga2ApiException(
+                'Invalid filter variable "{}".'.format(name))
+        lines.append('var {} = {}'.format(name, _literal(var_value)))
+    lines.append('for (icinga2api_object in get_objects({})) {{'.format(
+        object_type))
+    lines.append('var {} = icinga2api_object'.format(variable))
+    if object_type in HOST_JOIN_TYPES:
+        lines.append('var host = get_host(icinga2api_object.host_name)')
+    if filters:
+        lines.append('if (!({})) {{ continue }}'.format(filters))
+    increment = _value(value) if value else '1'
+    if not group_by:
+        lines.append('icinga2api_result += {}'.format(increment))
+    else:
+        lines.append('var icinga2api_group0 = icinga2api_result')
+    for level, path in enumerate(group_by):
+        keys = 'icinga2api_keys{}'.format(level)
+        key = 'icinga2api_key{}'.format(level)
+        group = 'icinga2api_group{}'.format(level)
+        lines.append('var {} = {}'.format(keys, path))
+        lines.append('if (typeof({0}) != Array) {{ {0} = [ {0} ] }}'.format(
+            keys))
+        lines.append('for ({} in {}) {{'.format(key, keys))
+        if level + 1 < len(group_by):
+            lines.append('if (!{0}.contains({1})) {{ {0}[{1}] = {{}} }}'.format(
+                group, key))
+            lines.append('var icinga2api_group{} = {}[{}]'.format(
+                level + 1, group, key))
+        else:
+            lines.append('if (!{0}.contains({1})) {{ {0}[{1}] = 0 }}'.format(
+                group, key))
+            lines.append('{}[{}] += {}'.format(group, key, increment))
+    lines.extend('}' * len(group_by))
+    lines.append('}')
+    lines.append('icinga2api_result')
+
+    depth = 0
+    for number, line in enumerate(lines):
+        if line == '}':
+            depth -= 1
+        lines[number] = '  ' * depth + line
+        if line.endswith('{'):
+            depth += 1
+    return '\n'.join(lines)
+
+
+class Console(Base):
+    '''
+    Icinga 2 API console class
+    '''
+
+    base_url_path = 'v1/console'
+
+    def execute_script(self, command, session=None, sandboxed=None):
+        '''
+        execute a script and return its result
+
+        example 1:
+        execute_script('get_objects(Host).len()')
+
+        :param command: the script in the Icinga 2 DSL
+        :type command: string
+        :param session: session id to keep variables between scripts
+        :type session: string
+        :param sandboxed: run the script sandboxed
+        :type sandboxed: bool
+        :returns: the value of the last expression
+        '''
+
+        url = '{}/{}'.format(self.base_url_path, 'execute-script')
+
+        payload = {
+            'command': command,
+        }
+        if session:
+            payload['session'] = session
+        if sandboxed is not None:
+            payload['sandboxed'] = sandboxed
+
+        result = self._request('POST', url, payload)['results'][0]
+        if int(result.get('code', 200)) != 200:
+            raise Icinga2ApiException(
+                'Script failed with status {}: {}'.format(
+                    int(result['code']), result.get('status')),
+                status_code=int(result['code']))
+        return result.get('result')
+
+    def count(self, object_type, filters=None, filter_vars=None):
+        '''
+        count objects on the master
+
+        example 1:
+        count('Service', 'service.state == 2')
+
+        :param object_type: type of the objects, e.g. Service
+        :type object_type: string
+        :param filters: only count objects matching this filter
+        :type filters: string
+        :param filter_vars: variables used in the filters expression
+        :type filter_vars: dictionary
+        :returns: the number of objects
+        :rtype: int
+        '''
+
+        return int(self.execute_script(aggregation_script(
+            object_type, filters=filters, filter_vars=filter_vars),
+            sandboxed=True))
+
+    def group_by(self, object_type, paths, filters=None, filter_vars=None):
+        '''
+        count objects on the master grouped by attributes
+
+        Groups are keyed by the attribute values as strings, they are nested
+        in the order of the paths.
+
+        example 1:
+        group_by('Service', ['host.groups', 'service.state'])
+
+        :param object_type: type of the objects, e.g. Service
+        :type object_type: string
+        :param paths: attribute paths, e.g. ['service.state']
+        :type paths: list
+        :param filters: only count objects matching this filter
+        :type filters: string
+        :param filter_vars: variables used in the filters expression
+        :type filter_vars: dictionary
+        :returns: the number of objects per group
+        :rtype: dictionary
+        '''
+
+        if isinstance(paths, TEXT_TYPES):
+            paths = [paths]
+        return self.execute_script(aggregation_script(
+            object_type, paths, filters=filters, filter_vars=filter_vars),
+            sandboxed=True)
+
+    def sum(self, object_type, path, group_by=None, filters=None,
+            filter_vars=None):
+        '''
+        sum an attribute of objects on the master, optionally grouped
+
+        example 1:
+        sum('Service', 'service.last_check_result.execution_end - '
+            'service.last_check_result.execution_start',
+            group_by=['service.zone'], filters='service.last_check_result')
+
+        :param object_type: type of the objects, e.g. Service
+        :type object_type: string
+        :param path: the attribute path to sum, or paths added or subtracted
+        :type path: string
+        :param group_by: attribute paths to group by
+        :type group_by: list
+        :param filters: only sum objects matching this filter
+        :type filters: string
+        :param filter_vars: variables used in the filters expression
+        :type filter_vars: dictionary
+        :returns: the sum or the sums per group
+        :rtype: float or dictionary
+        '''
+
+        if isinstance(group_by, TEXT_TYPES):
+            group_by = [group_by]
+        return self.execute_script(aggregation_script(
+            object_type, group_by, path, filters, filter_vars),
+            sandboxed=True)
@@ -27,13 +27,169 @@ Icinga 2 API events
 '''
 
 from __future__ import print_function
+import collections
+import json
 import logging
+import threading
+import time
+# pylint: disable=import-error
+try:
+    import queue as queue_mod
+except ImportError:
+    import Queue as queue_mod
+# pylint: enable=import-error
 
 from icinga2api.base import Base
 
 LOG = logging.getLogger(__name__)
 
 
+class EventCoalescer(object):
+    '''
+    Keep only the newest CheckResult event per host/service
+
+    Events are collected for `window` seconds and the newest event of every
+    host/service is emitted at the end of the window. Events which change the
+    state of an object (and the first event seen for an object) are emitted
+    immediately. All other event types are passed through unchanged.
+
+    Call tick() when no event arrives within timeout() seconds to emit the
+    pending events of an ended window.
+    '''
+
+    def __init__(self, window=1.0, clock=time.time):
+        '''
+        initialize object
+
+        :param window: seconds to collect events before emitting them
+        :type window: float
+        :param clock: function returning the current time in seconds
+        :type clock: callable
+        '''
+
+        self.window = window
+        self.clock = clock
+        self.received = 0
+        self.emitted = 0
+        self.transitions = 0
+        self._pending = collections.OrderedDict()
+        self._states = {}
+        self._window_start = None
+
+    @staticmethod
+    def _parse(message):
+        '''
+        return the message as dictionary
+        '''
+
+        if isinstance(message, dict):
+            return message
+        return json.loads(message)
+
+    def add(self, message):
+        '''
+        add an event and return the events ready to be emitted
+
+        :param message: the event, either as JSON string or dictionary
+        :type message: string
+        :returns: the events to emit, in the same form as they were added
+        :rtype: list
+        '''
+
+        ready = self.tick()
+        if self._window_start is None:
+            self._window_start = self.clock()
+
+        self.received += 1
+        event = self._parse(message)
+        if event.get('type') != 'CheckResult':
+            self.emitted += 1
+            ready.append(message)
+            return ready
+
+        key = (event.get('host'), event.get('service'))
+        state = (event.get('check_result') or {}).get('state')
+        if key not in self._states or self._states[key] != state:
+            # state transition, the pending event of this object is outdated
+            self._pending.pop(key, None)
+            self._states[key] = state
+            self.transitions += 1
+            self.emitted += 1
+            ready.append(message)
+        else:
+            self._pending.pop(key, None)
+            self._pending[key] = message
+
+        return ready
+
+    def timeout(self):
+        '''
+        return the seconds until the current window ends, None without window
+
+        :returns: the seconds, at least 0
+        :rtype: float
+        '''
+
+        if self._window_start is None:
+            return None
+        return max(0.0, self._window_start + self.window - self.clock())
+
+    def tick(self):
+        '''
+        return the pending events if the current window has ended
+
+        :returns: the events to emit
+        :rtype: list
+        '''
+
+        if self._window_start is not None and \
+                self.clock() - self._window_start >= self.window:
+            return self.flush()
+        return []
+
+    def flush(self):
+        '''
+        return all pending events and start a new window
+
+        :returns: the pending events
+        :rtype: list
+        '''
+
+        ready = list(self._pending.values())
+        self._pending.clear()
+        self.emitted += len(ready)
+        self._window_start = None
+        return ready
+
+    @property
+    def ratio(self):
+        '''
+        received events per emitted event
+        '''
+
+        if not self.emitted:
+            return 0.0
+        return float(self.received) / self.emitted
+
+    def stats(self):
+        '''
+        return the coalescing statistics
+
+        :returns: received, emitted, pending and coalesced events,
+                  state transitions and the coalescing ratio
+        :rtype: dictionary
+        '''
+
+        return {
+            'received': self.received,
+            'emitted': self.emitted,
+            'pending': len(self._pending),
+            'coalesced': self.received - self.emitted - len(self._pending),
+            'transitions': self.transitions,
+            'ratio': self.ratio,
+        }
+
+
 class Events(Base):
     '''
     Icinga 2 API events class
@@ -45,7 +201,8 @@ class Events(Base):
                   types,
                   queue,
                   filters=None,
-                  filter_vars=None):
+                  filter_vars=None,
+                  coalesce=None):
         '''
         subscribe to an event stream
 
@@ -56,6 +213,12 @@ class Events(Base):
         for event in subscribe(types, queue, filters):
             print event
 
+        example 2:
+        coalescer = EventCoalescer(window=5)
+        for event in subscribe(["CheckResult"], "monitor", coalesce=coalescer):
+            print event
+        print coalescer.stats()
+
         :param types: the event types to return
         :type types: array
         :param queue: the queue name to subscribe to
@@ -64,6 +227,8 @@ class Events(Base):
         :type filters: string
         :param filter_vars: variables used in the filters expression
         :type filter_vars: dict
+        :param coalesce: coalescing window in seconds or an EventCoalescer
+        :type coalesce: float
         :returns: the events
         :rtype: string
         '''
@@ -82,5 +247,62 @@ class Events(Base):
             payload,
             stream=True
         )
-        for event in self._get_message_from_stream(stream):
-            yield event
+        messages = self._get_message_from_stream(stream)
+        try:
+            if coalesce is None:
+                for event in messages:
+                    yield event
+                return
+
+            if not isinstance(coalesce, EventCoalescer):
+                coalesce = EventCoalescer(coalesce)
+            for message in self._read_ahead(messages, coalesce.timeout):
+                if message is None:
+                    # no event within the window
+                    ready = coalesce.tick()
+                else:
+                    ready = coalesce.add(message)
+                for event in ready:
+                    yield event
+            for event in coalesce.flush():
+                yield event
+        finally:
+            stream.close()
+
+    @staticmethod
+    def _read_ahead(messages, timeout):
+        '''
+        read the messages in a thread, yield None if none arrives in time
+
+        :param messages: the messages of a stream
+        :type messages: iterator
+        :param timeout: function returning the seconds to wait or None
+        :type timeout: callable
+        '''
+
+        received = queue_mod.Queue()
+        done = object()
+
+        def read():
+            try:
+                for message in messages:
+                    received.put((message, None))
+            except Exception as error:  # pylint: disable=broad-except
+                received.put((done, error))
+            else:
+                received.put((done, None))
+
+        reader = threading.Thread(target=read, name='icinga2api-events')
+        reader.daemon = True
+        reader.start()
+        while True:
+            try:
+                message, error = received.get(timeout=timeout())
+            except queue_mod.Empty:
+                yield None
+                continue
+            if message is done:
+                if error is not None:
+                    raise error
+                return
+            yield message
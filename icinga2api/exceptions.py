@@ -31,14 +31,22 @@ class Icinga2ApiException(Exception):
     Icinga 2 API exception class
     '''
 
-    def __init__(self, error):
+    def __init__(self, error, status_code=None):
         super(Icinga2ApiException, self).__init__(error)
         self.error = error
+        self.status_code = status_code
 
     def __str__(self):
         return str(self.error)
 
 
+class Icinga2ApiConnectionError(Icinga2ApiException, IOError):
+    '''
+    Icinga 2 API connection error class, raised by all transports if no
+    response was received, e.g. the connection was refused or reset
+    '''
+
+
 class Icinga2ApiConfigFileException(Exception):
     '''
     Icinga 2 API config file exception class
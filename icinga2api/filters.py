@@ -0,0 +1,647 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API filter expressions evaluated in the client
+
+Compiles the common subset of the Icinga 2 DSL used in API filters to Python
+closures and evaluates them over listed objects, e.g. of a ResultSet or a
+Snapshot:
+
+    literals      "text", 42, 1.5, 5m, true, false, null, [1, 2]
+    variables     host.name, service.vars.team, filter_vars
+    operators     ! - * / % + < > <= >= in !in == != && ||
+    functions     match(), regex(), len()
+    methods       substr(), contains(), lower(), upper(), len()
+
+The variable of the object type (e.g. 'service') refers to its attributes,
+joined objects (e.g. 'host') to the joins, other names to the filter_vars.
+'''
+
+from __future__ import print_function
+import logging
+import re
+import threading
+
+from icinga2api.exceptions import Icinga2ApiException
+
+LOG = logging.getLogger(__name__)
+
+# maximum number of compiled expressions kept
+CACHE_SIZE = 256
+
+TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<number>\d+(?:\.\d+)?(?:ms|s|m|h|d)?)
+      | (?P<string>"(?:[^"\\]|\\.)*")
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<operator>!in\b|&&|\|\||==|!=|<=|>=|[-!<>+*/%()\[\],.])
+    )''', re.VERBOSE)
+
+DURATIONS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '"': '"', '\\': '\\'}
+
+MATCH_ALL = 0
+MATCH_ANY = 1
+GLOBALS = {'MatchAll': MATCH_ALL, 'MatchAny': MATCH_ANY}
+
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+_PATTERNS = {}
+
+try:
+    TEXT_TYPES = (str, unicode)  # pylint: disable=undefined-variable
+except NameError:
+    TEXT_TYPES = (str,)
+
+
+def _tokenize(expression):
+    '''
+    split an expression into (kind, value) tokens
+    '''
+
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        token = TOKEN.match(expression, position)
+        if token is None:
+            raise Icinga2ApiException(
+                'Invalid filter "{}" at position {}.'.format(
+                    expression, position))
+        kind = token.lastgroup
+        value = token.group(kind)
+        if kind == 'number':
+            unit = value.lstrip('0123456789.')
+            number = float(value[:len(value) - len(unit)])
+            value = number * DURATIONS[unit] if unit else number
+        elif kind == 'string':
+            value = re.sub(r'\\(.)', lambda escape: ESCAPES.get(
+                escape.group(1), escape.group(0)), value[1:-1])
+        elif kind == 'name' and value in ('true', 'false', 'null', 'in'):
+            kind = 'operator' if value == 'in' else 'constant'
+            value = {'true': True, 'false': False, 'null': None,
+                     'in': 'in'}[value]
+        tokens.append((kind, value))
+        position = token.end()
+    tokens.append(('end', None))
+    return tokens
+
+
+def _truth(value):
+    '''
+    return the boolean value as in Icinga 2
+    '''
+
+    if value is None or value is False:
+        return False
+    if isinstance(value, (bool, int, float)):
+        return value != 0
+    if isinstance(value, TEXT_TYPES):
+        return value != ''
+    return True
+
+
+def _text(value):
+    '''
+    return the string value as in Icinga 2
+    '''
+
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _pattern(pattern, wildcard):
+    '''
+    return a compiled (wildcard) pattern, cached
+    '''
+
+    key = (pattern, wildcard)
+    compiled = _PATTERNS.get(key)
+    if compiled is None:
+        if wildcard:
+            source = ''.join(
+                '.*' if char == '*' else '.' if char == '?' else re.escape(char)
+                for char in pattern) + r'\Z'
+            compiled = re.compile(source, re.DOTALL)
+        else:
+            compiled = re.compile(pattern)
+        if len(_PATTERNS) >= CACHE_SIZE:
+            _PATTERNS.clear()
+        _PATTERNS[key] = compiled
+    return compiled
+
+
+def _matcher(wildcard):
+    '''
+    return the match() or regex() function
+    '''
+
+    def function(pattern, value, mode=MATCH_ALL):
+        compiled = _pattern(_text(pattern), wildcard)
+        test = compiled.match if wildcard else compiled.search
+        if isinstance(value, (list, tuple)):
+            if mode == MATCH_ANY:
+                return any(test(_text(item)) for item in value)
+            return bool(value) and all(test(_text(item)) for item in value)
+        return test(_text(value)) is not None
+    return function
+
+
+def _length(value):
+    '''
+    return the length of a string, array or dictionary, 0 for null
+    '''
+
+    if value is None:
+        return 0
+    return len(value)
+
+
+FUNCTIONS = {
+    'match': _matcher(True),
+    'regex': _matcher(False),
+    'len': _length,
+}
+
+METHODS = {
+    'substr': lambda value, start, count=None: value[
+        int(start):None if count is None else int(start) + int(count)],
+    'contains': lambda value, item: item in value,
+    'lower': lambda value: value.lower(),
+    'upper': lambda value: value.upper(),
+    'len': _length,
+}
+
+
+def _add(left, right):
+    '''
+    add numbers or concatenate strings
+    '''
+
+    if isinstance(left, TEXT_TYPES) or isinstance(right, TEXT_TYPES):
+        return _text(left) + _text(right)
+    return (left or 0) + (right or 0)
+
+
+def _compare(function):
+    '''
+    wrap a comparison, null compares like 0 or an empty string
+    '''
+
+    def compare(left, right):
+        if left is None:
+            left = '' if isinstance(right, TEXT_TYPES) else 0
+        if right is None:
+            right = '' if isinstance(left, TEXT_TYPES) else 0
+        return function(left, right)
+    return compare
+
+
+def _contains(item, container):
+    '''
+    return whether an array contains an item, false for null
+    '''
+
+    if container is None:
+        return False
+    if not isinstance(container, (list, tuple, set, frozenset)):
+        raise Icinga2ApiException(
+            'Operand of "in" must be an array, not {!r}.'.format(container))
+    return item in container
+
+
+BINARY = {
+    '*': lambda left, right: left * right,
+    '/': lambda left, right: left / right,
+    '%': lambda left, right: left % right,
+    '+': _add,
+    '-': lambda left, right: (left or 0) - (right or 0),
+    '<': _compare(lambda left, right: left < right),
+    '>': _compare(lambda left, right: left > right),
+    '<=': _compare(lambda left, right: left <= right),
+    '>=': _compare(lambda left, right: left >= right),
+    'in': _contains,
+    '!in': lambda left, right: not _contains(left, right),
+    '==': lambda left, right: left == right,
+    '!=': lambda left, right: left != right,
+}
+
+# binary operators by ascending precedence, && and || are short-circuited
+PRECEDENCE = [
+    ('==', '!='),
+    ('in', '!in'),
+    ('<', '>', '<=', '>='),
+    ('+', '-'),
+    ('*', '/', '%'),
+]
+
+
+def _object_attrs(obj):
+    '''
+    return the attributes of a listed object including its names
+    '''
+
+    attrs = obj.get('attrs') or {}
+    if '__name' not in attrs and 'name' in obj:
+        attrs = dict(attrs)
+        attrs['__name'] = obj['name']
+        attrs.setdefault('name', obj['name'].split('!')[-1])
+    return attrs
+
+
+def _variable(name):
+    '''
+    return a closure resolving a variable
+    '''
+
+    def variable(obj, filter_vars):
+        if obj is not None:
+            if name == (obj.get('type') or '').lower():
+                return _object_attrs(obj)
+            joins = obj.get('joins')
+            joined = joins.get(name) if joins else None
+            if name == 'host' and 'host_name' in (obj.get('attrs') or {}):
+                # complete the names of a partly or not joined host
+                if joined is None or 'name' not in joined:
+                    host_name = obj['attrs']['host_name']
+                    joined = dict(joined or {}, name=host_name,
+                                  __name=host_name)
+            if joined is not None:
+                return joined
+        if filter_vars and name in filter_vars:
+            return filter_vars[name]
+        if name in GLOBALS:
+            return GLOBALS[name]
+        raise Icinga2ApiException(
+            'Tried to access undefined script variable "{}".'.format(name))
+    variable.variable = name
+    return variable
+
+
+class _Parser(object):
+    '''
+    recursive descent parser building closures (obj, filter_vars) -> value
+    '''
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.position = 0
+
+    def _peek(self):
+        return self.tokens[self.position]
+
+    def _next(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def _accept(self, *operators):
+        kind, value = self._peek()
+        if kind == 'operator' and value in operators:
+            self.position += 1
+            return value
+        return None
+
+    def _expect(self, operator):
+        if self._accept(operator) is None:
+            self._error('expected "{}"'.format(operator))
+
+    def _error(self, message):
+        raise Icinga2ApiException('Invalid filter "{}": {}.'.format(
+            self.expression, message))
+
+    def parse(self):
+        function = self._or()
+        if self._peek()[0] != 'end':
+            self._unexpected(self._peek())
+        return function
+
+    def _unexpected(self, token):
+        if token[0] == 'end':
+            self._error('unexpected end')
+        self._error('unexpected {!r}'.format(token[1]))
+
+    def _or(self):
+        left = self._and()
+        while self._accept('||'):
+            right = self._and()
+            left = (lambda left, right: lambda obj, fv: _truth(
+                left(obj, fv)) or _truth(right(obj, fv)))(left, right)
+        return left
+
+    def _and(self):
+        left = self._binary(0)
+        while self._accept('&&'):
+            right = self._binary(0)
+            left = (lambda left, right: lambda obj, fv: _truth(
+                left(obj, fv)) and _truth(right(obj, fv)))(left, right)
+        return left
+
+    def _binary(self, level):
+        if level == len(PRECEDENCE):
+            return self._unary()
+        left = self._binary(level + 1)
+        while True:
+            operator = self._accept(*PRECEDENCE[level])
+            if operator is None:
+                return left
+            right = self._binary(level + 1)
+            left = (lambda operation, left, right: lambda obj, fv: operation(
+                left(obj, fv), right(obj, fv)))(BINARY[operator], left, right)
+
+    def _unary(self):
+        if self._accept('!'):
+            operand = self._unary()
+            return lambda obj, fv: not _truth(operand(obj, fv))
+        if self._accept('-'):
+            operand = self._unary()
+            return lambda obj, fv: -operand(obj, fv)
+        return self._postfix(self._primary())
+
+    def _arguments(self):
+        arguments = []
+        if not self._accept(')'):
+            arguments.append(self._or())
+            while self._accept(','):
+                arguments.append(self._or())
+            self._expect(')')
+        return arguments
+
+    def _primary(self):
+        kind, value = self._next()
+        if kind in ('number', 'string', 'constant'):
+            return lambda obj, fv: value
+        if kind == 'name':
+            if self._accept('('):
+                if value not in FUNCTIONS:
+                    self._error('unknown function "{}"'.format(value))
+                function = FUNCTIONS[value]
+                arguments = self._arguments()
+                return lambda obj, fv: function(
+                    *[argument(obj, fv) for argument in arguments])
+            return _variable(value)
+        if kind == 'operator' and value == '(':
+            function = self._or()
+            self._expect(')')
+            return function
+        if kind == 'operator' and value == '[':
+            items = []
+            if not self._accept(']'):
+                items.append(self._or())
+                while self._accept(','):
+                    items.append(self._or())
+                self._expect(']')
+            return lambda obj, fv: [item(obj, fv) for item in items]
+        self._unexpected((kind, value))
+
+    def _postfix(self, target):
+        while True:
+            if self._accept('.'):
+                kind, key = self._next()
+                if kind != 'name':
+                    self._error('expected a name after "."')
+                if self._accept('('):
+                    if key not in METHODS:
+                        self._error('unknown method "{}"'.format(key))
+                    target = self._method(target, METHODS[key],
+                                          self._arguments())
+                elif key in ('name', '__name') and \
+                        getattr(target, 'variable', None):
+                    target = self._name(target, key)
+                else:
+                    target = self._field(target, key)
+            elif self._accept('['):
+                index = self._or()
+                self._expect(']')
+                target = self._item(target, index)
+            else:
+                return target
+
+    @staticmethod
+    def _field(target, key):
+        def field(obj, fv):
+            value = target(obj, fv)
+            return value.get(key) if isinstance(value, dict) else None
+        return field
+
+    @staticmethod
+    def _name(target, key):
+        '''
+        resolve the name of a variable without completing joins
+        '''
+
+        name = target.variable
+
+        def field(obj, fv):
+            if obj is not None:
+                attrs = obj.get('attrs') or {}
+                if name == (obj.get('type') or '').lower():
+                    if key in attrs:
+                        return attrs[key]
+                elif name == 'host' and 'host_name' in attrs:
+                    return attrs['host_name']
+            value = target(obj, fv)
+            return value.get(key) if isinstance(value, dict) else None
+        return field
+
+    @staticmethod
+    def _item(target, index):
+        def item(obj, fv):
+            value = target(obj, fv)
+            key = index(obj, fv)
+            if isinstance(value, dict):
+                return value.get(key)
+            if isinstance(value, (list, tuple, TEXT_TYPES)):
+                try:
+                    return value[int(key)]
+                except (IndexError, TypeError, ValueError):
+                    return None
+            return None
+        return item
+
+    @staticmethod
+    def _method(target, method, arguments):
+        def call(obj, fv):
+            value = target(obj, fv)
+            if value is None:
+                return None
+            return method(value, *[argument(obj, fv)
+                                   for argument in arguments])
+        return call
+
+
+class Filter(object):
+    '''
+    compiled filter expression
+
+    example 1:
+    matches = Filter('service.state != 0 && "linux" in host.groups')
+    matches(service)
+
+    example 2:
+    Filter('host.name in names').select(services, {'names': names})
+    '''
+
+    def __init__(self, expression):
+        '''
+        compile the expression
+
+        :param expression: the filter expression
+        :type expression: string
+        '''
+
+        self.expression = expression
+        self._function = _Parser(expression).parse()
+
+    def __call__(self, obj, filter_vars=None):
+        '''
+        evaluate the filter for an object
+
+        :param obj: the object as in a listing, with attrs, joins and type
+        :type obj: dictionary
+        :param filter_vars: variables used in the expression
+        :type filter_vars: dictionary
+        :returns: whether the object matches
+        :rtype: bool
+        '''
+
+        try:
+            return _truth(self._function(obj, filter_vars))
+        except (TypeError, ValueError, ZeroDivisionError, re.error) as error:
+            raise Icinga2ApiException('Error evaluating filter "{}": {}'.format(
+                self.expression, error))
+
+    def select(self, objects, filter_vars=None):
+        '''
+        return the matching objects
+
+        :param objects: the objects as in a listing
+        :type objects: iterable
+        :param filter_vars: variables used in the expression
+        :type filter_vars: dictionary
+        :returns: the matching objects
+        :rtype: list
+        '''
+
+        matches = self.predicate(filter_vars)
+        return [obj for obj in objects if matches(obj)]
+
+    def predicate(self, filter_vars=None):
+        '''
+        return a function testing objects with fixed variables
+
+        Long lists in filter_vars are prepared for fast "in" tests once.
+
+        :param filter_vars: variables used in the expression
+        :type filter_vars: dictionary
+        :returns: function of an object returning whether it matches
+        :rtype: function
+        '''
+
+        filter_vars = _membership_vars(filter_vars)
+        return lambda obj: self(obj, filter_vars)
+
+    def __repr__(self):
+        return 'Filter({!r})'.format(self.expression)
+
+
+class _Members(list):
+    '''
+    list with a set for fast membership tests
+    '''
+
+    def __init__(self, items):
+        super(_Members, self).__init__(items)
+        self._set = frozenset(items)
+
+    def __contains__(self, item):
+        try:
+            return item in self._set
+        except TypeError:
+            return list.__contains__(self, item)
+
+
+def _membership_vars(filter_vars):
+    '''
+    return filter_vars with lists of names prepared for "in" tests
+    '''
+
+    if not filter_vars:
+        return filter_vars
+    prepared = dict(filter_vars)
+    for name, value in filter_vars.items():
+        if isinstance(value, list) and len(value) > 8:
+            try:
+                prepared[name] = _Members(value)
+            except TypeError:
+                pass
+    return prepared
+
+
+def compile_filter(expression):
+    '''
+    return the compiled filter of an expression, cached
+
+    :param expression: the filter expression
+    :type expression: string
+    :returns: the compiled filter
+    :rtype: Filter
+    '''
+
+    compiled = _CACHE.get(expression)
+    if compiled is None:
+        compiled = Filter(expression)
+        with _CACHE_LOCK:
+            if len(_CACHE) >= CACHE_SIZE:
+                _CACHE.clear()
+            _CACHE[expression] = compiled
+        LOG.debug('Compiled filter %s', expression)
+    return compiled
+
+
+def select(objects, expression, filter_vars=None):
+    '''
+    return the objects matching a filter expression
+
+    :param objects: the objects as in a listing
+    :type objects: iterable
+    :param expression: the filter expression
+    :type expression: string
+    :param filter_vars: variables used in the expression
+    :type filter_vars: dictionary
+    :returns: the matching objects
+    :rtype: list
+
+    example 1:
+    select(services, 'match("http*", service.name)')
+    '''
+
+    return compile_filter(expression).select(objects, filter_vars)
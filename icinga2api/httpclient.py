@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API stdlib HTTP session
+
+A minimal replacement for requests.Session built on http.client, for short
+lived processes which make a few calls and should not import requests.
+'''
+
+from __future__ import print_function
+import base64
+import json
+import logging
+import select
+import ssl
+import sys
+import zlib
+# pylint: disable=import-error,no-name-in-module
+if sys.version_info >= (3, 0):
+    import http.client as httplib
+    from urllib.parse import urlsplit
+else:
+    import httplib
+    from urlparse import urlsplit
+# pylint: enable=import-error,no-name-in-module
+
+from icinga2api.transport import iter_lines
+
+LOG = logging.getLogger(__name__)
+
+# post() takes a json argument like requests
+_dumps = json.dumps
+
+
+class HttpClientResponse(object):
+    '''
+    the parts of requests.Response used by the client
+    '''
+
+    def __init__(self, response, url, connection=None):
+        self.raw = response
+        self.url = url
+        self.status_code = response.status
+        self.headers = dict((key.lower(), value)
+                            for key, value in response.getheaders())
+        self._connection = connection
+        self._content = None
+        self._encoding = self.headers.get('content-encoding', '').lower()
+
+    def _decompressor(self):
+        '''
+        return a decompressor for a gzip or deflate body, or None
+        '''
+
+        if self._encoding in ('gzip', 'x-gzip', 'deflate'):
+            # detects the gzip or zlib header
+            return zlib.decompressobj(32 + zlib.MAX_WBITS)
+        return None
+
+    @property
+    def content(self):
+        '''
+        the body as bytes
+        '''
+
+        if self._content is None:
+            self._content = self.raw.read()
+            decompressor = self._decompressor()
+            if decompressor is not None:
+                self._content = decompressor.decompress(self._content) + \
+                    decompressor.flush()
+        return self._content
+
+    @property
+    def text(self):
+        '''
+        the body as text
+        '''
+
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        '''
+        the body decoded from JSON
+        '''
+
+        return json.loads(self.text)
+
+    def iter_lines(self):
+        '''
+        yield the body line by line as it arrives
+        '''
+
+        decompressor = self._decompressor()
+        if decompressor is None:
+            while True:
+                line = self.raw.readline()
+                if not line:
+                    break
+                yield line.rstrip(b'\r\n')
+            return
+        for line in iter_lines(self._decompressed(decompressor)):
+            yield line
+
+    def _decompressed(self, decompressor):
+        '''
+        yield the decompressed body as it arrives
+        '''
+
+        # read1 returns what is available instead of waiting for the size
+        read = getattr(self.raw, 'read1', self.raw.read)
+        while True:
+            chunk = read(8192)
+            if not chunk:
+                break
+            yield decompressor.decompress(chunk)
+        yield decompressor.flush()
+
+    def close(self):
+        '''
+        close the response and its connection
+        '''
+
+        self.raw.close()
+        if self._connection is not None:
+            self._connection.close()
+
+
+class _TlsConnection(httplib.HTTPSConnection):
+    '''
+    HTTPS connection wrapping its socket with a shared TlsContext
+    '''
+
+    def __init__(self, host, port=None, timeout=None, tls=None):
+        httplib.HTTPSConnection.__init__(self, host, port, timeout=timeout,
+                                         context=tls.context)
+        self.tls = tls
+
+    def connect(self):
+        httplib.HTTPConnection.connect(self)
+        self.sock = self.tls.wrap_socket(self.sock, self.host, self.port)
+
+    def save_session(self):
+        '''
+        remember the TLS session for the next connection
+        '''
+
+        if self.sock is not None:
+            self.tls.save_session(self.sock, self.host, self.port)
+
+
+def _dropped(connection):
+    '''
+    True if the server closed an idle keep-alive connection
+
+    An idle connection is readable only if the server closed it.
+    '''
+
+    if connection.sock is None:
+        return False
+    try:
+        return bool(select.select([connection.sock], [], [], 0)[0])
+    except (IOError, OSError, ValueError):
+        return True
+
+
+class HttpClientSession(object):
+    '''
+    the parts of requests.Session used by the client
+
+    One keep-alive connection per host is reused for regular requests,
+    streams get a connection of their own. With a TlsContext in `tls` HTTPS
+    connections share its SSL context and resume TLS sessions.
+
+    A request failing on a reused connection is sent again on a new one only
+    if it failed before it was sent, or if it is a GET override.
+    '''
+
+    def __init__(self, timeout=None):
+        '''
+        initialize object
+        '''
+
+        self.cert = None
+        self.auth = None
+        self.headers = {}
+        self.timeout = timeout
+        self.tls = None
+        self._connections = {}
+
+    def _ssl_context(self, verify):
+        '''
+        create the TLS context for verify and the client certificate
+        '''
+
+        if verify:
+            context = ssl.create_default_context(
+                cafile=verify if not isinstance(verify, bool) else None)
+        else:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        if isinstance(self.cert, tuple):
+            context.load_cert_chain(*self.cert)
+        elif self.cert:
+            context.load_cert_chain(self.cert)
+        return context
+
+    def _connect(self, parts, verify):
+        '''
+        open a connection to the host of the url
+        '''
+
+        if parts.scheme == 'https' and self.tls is not None:
+            return _TlsConnection(parts.hostname, parts.port,
+                                  timeout=self.timeout, tls=self.tls)
+        if parts.scheme == 'https':
+            return httplib.HTTPSConnection(
+                parts.hostname, parts.port, timeout=self.timeout,
+                context=self._ssl_context(verify))
+        return httplib.HTTPConnection(
+            parts.hostname, parts.port, timeout=self.timeout)
+
+    def post(self, url, headers=None, json=None,  # pylint: disable=redefined-outer-name
+             verify=False, stream=False, data=None):
+        '''
+        send a POST request
+
+        :returns: the response
+        :rtype: HttpClientResponse
+        '''
+
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        request_headers = dict(self.headers)
+        request_headers.update(headers or {})
+        if self.auth:
+            credentials = '{0}:{1}'.format(*self.auth).encode('utf-8')
+            request_headers['Authorization'] = 'Basic {0}'.format(
+                base64.b64encode(credentials).decode('ascii'))
+        body = data
+        if json is not None:
+            body = _dumps(json).encode('utf-8')
+            request_headers['Content-Type'] = 'application/json'
+        request_headers['Content-Length'] = str(len(body or b''))
+
+        if stream:
+            connection = self._connect(parts, verify)
+            connection.request('POST', path, body, request_headers)
+            return HttpClientResponse(connection.getresponse(), url,
+                                      connection)
+
+        # a request which was sent may have been processed, only requests
+        # without side effects are sent again then
+        idempotent = request_headers.get(
+            'X-HTTP-Method-Override', 'POST').upper() == 'GET'
+        key = (parts.scheme, parts.netloc)
+        for attempt in (0, 1):
+            connection = self._connections.get(key)
+            if connection is not None and _dropped(connection):
+                LOG.debug('Connection to %s was closed', parts.netloc)
+                connection.close()
+                connection = None
+            reused = connection is not None
+            if not reused:
+                connection = self._connections[key] = \
+                    self._connect(parts, verify)
+            sent = False
+            try:
+                connection.request('POST', path, body, request_headers)
+                sent = True
+                response = HttpClientResponse(connection.getresponse(), url)
+                response.content  # pylint: disable=pointless-statement
+                if not reused and isinstance(connection, _TlsConnection):
+                    connection.save_session()
+                return response
+            except (httplib.HTTPException, IOError, OSError):
+                # the server may have closed an idle keep-alive connection
+                connection.close()
+                del self._connections[key]
+                if not reused or attempt or (sent and not idempotent):
+                    raise
+                LOG.debug('Reconnecting to %s', parts.netloc)
+
+    def close(self):
+        '''
+        close all connections
+        '''
+
+        for connection in self._connections.values():
+            connection.close()
+        self._connections.clear()
+
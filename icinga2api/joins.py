@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API client-side joins
+
+Server-side joins repeat the joined host in every service of the host. A
+client-side join lists the hosts once and attaches one shared dictionary per
+host to all of its objects, in the shape of server-side joins.
+'''
+
+from __future__ import print_function
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# types with a host join through their host_name attribute
+HOST_JOIN_TYPES = ('Service', 'Comment', 'Downtime', 'Notification',
+                   'ScheduledDowntime')
+
+# the joins besides the host, still done by the server
+OTHER_JOINS = {
+    'Service': ['check_command', 'check_period', 'event_command',
+                'command_endpoint'],
+    'Comment': ['service'],
+    'Downtime': ['service'],
+    'Notification': ['service', 'command', 'period'],
+    'ScheduledDowntime': ['service'],
+}
+
+
+def split_joins(object_type, joins):
+    '''
+    split joins into the joined host attributes and the remaining joins
+
+    :param object_type: type of the listed objects
+    :type object_type: string
+    :param joins: True for all joins or a list like ['host.name']
+    :type joins: bool or list
+    :returns: host attributes (None for all, [] if the host isn't joined),
+        remaining joins
+    :rtype: tuple
+    '''
+
+    if joins is True:
+        return None, list(OTHER_JOINS.get(object_type, ()))
+    if 'host' in joins:
+        host_attrs = None
+    else:
+        host_attrs = [join.split('.', 1)[1] for join in joins
+                      if join.startswith('host.')]
+    others = [join for join in joins
+              if join != 'host' and not join.startswith('host.')]
+    return host_attrs, others
+
+
+def join_hosts(objects, results, host_attrs=None, names=None,
+               strip_host_name=False):
+    '''
+    attach the host of every result as result['joins']['host']
+
+    :param objects: the objects endpoint, e.g. client.objects
+    :type objects: Objects
+    :param results: the results of a listing, with attrs.host_name, they are
+        copied rather than changed
+    :type results: list
+    :param host_attrs: the joined host attributes, None for all
+    :type host_attrs: list
+    :param names: only get these hosts instead of listing all
+    :type names: bool
+    :param strip_host_name: remove attrs.host_name after joining
+    :type strip_host_name: bool
+    :returns: the joined results
+    :rtype: list
+    '''
+
+    host_names = set(result['attrs'].get('host_name') for result in results)
+    host_names.discard(None)
+    if names:
+        hosts = objects.get_many('Host', sorted(host_names), attrs=host_attrs)
+        hosts = hosts.values()
+    else:
+        hosts = objects.list('Host', attrs=host_attrs)
+    # one dictionary per host, shared by all of its objects
+    by_name = dict((host['name'], host['attrs']) for host in hosts)
+    joined = []
+    for result in results:
+        # the results may be shared, e.g. by single_flight listings
+        attrs = result['attrs']
+        host = by_name.get(attrs.get('host_name'))
+        result = dict(result, joins=dict(result.get('joins') or {}))
+        if host is not None:
+            result['joins']['host'] = host
+        if strip_host_name:
+            result['attrs'] = dict(attrs)
+            result['attrs'].pop('host_name', None)
+        joined.append(result)
+    LOG.debug('Joined %d hosts to %d objects', len(by_name), len(results))
+    return joined
@@ -34,6 +34,59 @@ from icinga2api.exceptions import Icinga2ApiException
 
 LOG = logging.getLogger(__name__)
 
+# object type -> url path
+OBJECT_TYPES = {
+    'ApiListener': 'apilisteners',
+    'ApiUser': 'apiusers',
+    'CheckCommand': 'checkcommands',
+    'Arguments': 'argumentss',
+    'CheckerComponent': 'checkercomponents',
+    'CheckResultReader': 'checkresultreaders',
+    'Comment': 'comments',
+    'CompatLogger': 'compatloggers',
+    'Dependency': 'dependencies',
+    'Downtime': 'downtimes',
+    'Endpoint': 'endpoints',
+    'EventCommand': 'eventcommands',
+    'ExternalCommandListener': 'externalcommandlisteners',
+    'FileLogger': 'fileloggers',
+    'GelfWriter': 'gelfwriters',
+    'GraphiteWriter': 'graphitewriters',
+    'Host': 'hosts',
+    'HostGroup': 'hostgroups',
+    'IcingaApplication': 'icingaapplications',
+    'IdoMySqlConnection': 'idomysqlconnections',
+    'IdoPgSqlConnection': 'idopgsqlconnections',
+    'LiveStatusListener': 'livestatuslisteners',
+    'Notification': 'notifications',
+    'NotificationCommand': 'notificationcommands',
+    'NotificationComponent': 'notificationcomponents',
+    'OpenTsdbWriter': 'opentsdbwriters',
+    'PerfdataWriter': 'perfdatawriters',
+    'ScheduledDowntime': 'scheduleddowntimes',
+    'Service': 'services',
+    'ServiceGroup': 'servicegroups',
+    'StatusDataWriter': 'statusdatawriters',
+    'SyslogLogger': 'syslogloggers',
+    'TimePeriod': 'timeperiods',
+    'User': 'users',
+    'UserGroup': 'usergroups',
+    'Zone': 'zones',
+}
+
+# the filter variable holding the names of get_many
+NAMES_VAR = 'icinga2api_names'
+
+
+class ObjectMap(dict):
+    '''
+    objects by name, with the requested names which were not found
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super(ObjectMap, self).__init__(*args, **kwargs)
+        self.missing = []
+
 
 class Objects(Base):
     '''
@@ -41,6 +94,8 @@ class Objects(Base):
     '''
 
     base_url_path = 'v1/objects'
+    # creating, changing and deleting objects is mostly done by scripts
+    write_priority = 'bulk'
 
     @staticmethod
     def _convert_object_type(object_type=None):
@@ -48,52 +103,14 @@ class Objects(Base):
         check if the object_type is a valid Icinga 2 object type
         '''
 
-        type_conv = {
-            'ApiListener': 'apilisteners',
-            'ApiUser': 'apiusers',
-            'CheckCommand': 'checkcommands',
-            'Arguments': 'argumentss',
-            'CheckerComponent': 'checkercomponents',
-            'CheckResultReader': 'checkresultreaders',
-            'Comment': 'comments',
-            'CompatLogger': 'compatloggers',
-            'Dependency': 'dependencys',
-            'Downtime': 'downtimes',
-            'Endpoint': 'endpoints',
-            'EventCommand': 'eventcommands',
-            'ExternalCommandListener': 'externalcommandlisteners',
-            'FileLogger': 'fileloggers',
-            'GelfWriter': 'gelfwriters',
-            'GraphiteWriter': 'graphitewriters',
-            'Host': 'hosts',
-            'HostGroup': 'hostgroups',
-            'IcingaApplication': 'icingaapplications',
-            'IdoMySqlConnection': 'idomysqlconnections',
-            'IdoPgSqlConnection': 'idopgsqlconnections',
-            'LiveStatusListener': 'livestatuslisteners',
-            'Notification': 'notifications',
-            'NotificationCommand': 'notificationcommands',
-            'NotificationComponent': 'notificationcomponents',
-            'OpenTsdbWriter': 'opentsdbwriters',
-            'PerfdataWriter': 'perfdatawriters',
-            'ScheduledDowntime': 'scheduleddowntimes',
-            'Service': 'services',
-            'ServiceGroup': 'servicegroups',
-            'StatusDataWriter': 'statusdatawriters',
-            'SyslogLogger': 'syslogloggers',
-            'TimePeriod': 'timeperiods',
-            'User': 'users',
-            'UserGroup': 'usergroups',
-            'Zone': 'zones',
-        }
-        if object_type not in type_conv:
+        try:
+            return OBJECT_TYPES[object_type]
+        except KeyError:
             raise Icinga2ApiException(
                 'Icinga 2 object type "{}" does not exist.'.format(
                     object_type
                 ))
 
-        return type_conv[object_type]
-
     def get(self,
             object_type,
             name,
@@ -126,13 +143,83 @@ class Objects(Base):
 
         return self.list(object_type, name, attrs, joins=joins)[0]
 
+    def get_many(self,
+                 object_type,
+                 names,
+                 attrs=None,
+                 joins=None,
+                 chunk_size=500,
+                 parallelism=4):
+        '''
+        get many objects by name with as few requests as possible
+
+        :param object_type: type of the object
+        :type object_type: string
+        :param names: the names of the objects
+        :type names: list
+        :param attrs: only return these attributes
+        :type attrs: list
+        :param joins: show joined object
+        :type joins: list
+        :param chunk_size: names per request
+        :type chunk_size: int
+        :param parallelism: maximum concurrent requests
+        :type parallelism: int
+        :returns: the objects by name, names not found in `missing`
+        :rtype: ObjectMap
+
+        example 1:
+        hosts = get_many('Host', ['webserver01.domain', 'webserver02.domain'])
+        print(hosts['webserver01.domain']['attrs']['state'], hosts.missing)
+
+        example 2:
+        get_many('Service', service_names, attrs=['state'], joins=['host.state'])
+        '''
+
+        self._convert_object_type(object_type)
+        # keep the order, drop duplicates
+        seen = set()
+        names = [name for name in names
+                 if not (name in seen or seen.add(name))]
+        chunks = [names[start:start + chunk_size]
+                  for start in range(0, len(names), chunk_size)]
+        filters = '{}.__name in {}'.format(object_type.lower(), NAMES_VAR)
+
+        def get_chunk(chunk):
+            return self.list(object_type,
+                             attrs=attrs,
+                             filters=filters,
+                             filter_vars={NAMES_VAR: chunk},
+                             joins=joins)
+
+        if len(chunks) > 1 and parallelism > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            from icinga2api.scheduler import carry
+
+            with ThreadPoolExecutor(
+                    max_workers=min(parallelism, len(chunks))) as executor:
+                results = list(executor.map(carry(get_chunk), chunks))
+        else:
+            results = [get_chunk(chunk) for chunk in chunks]
+
+        objects = ObjectMap()
+        for chunk_results in results:
+            for obj in chunk_results:
+                objects[obj['name']] = obj
+        objects.missing = [name for name in names if name not in objects]
+        LOG.debug("get_many %s: %d names, %d requests, %d missing",
+                  object_type, len(names), len(chunks), len(objects.missing))
+        return objects
+
     def list(self,
              object_type,
              name=None,
              attrs=None,
              filters=None,
              filter_vars=None,
-             joins=None):
+             joins=None,
+             client_joins=False,
+             indexed=False):
         '''
         get object by type or name
 
@@ -148,6 +235,11 @@ class Objects(Base):
         :type filter_vars: dict
         :param joins: show joined object
         :type joins: list
+        :param client_joins: join the host in the client, sharing one host
+            dictionary between its objects, instead of in the server
+        :type client_joins: bool
+        :param indexed: return a ResultSet with indexes on attribute paths
+        :type indexed: bool
 
         example 1:
         list('Host')
@@ -166,8 +258,26 @@ class Objects(Base):
 
         example 6:
         list('Service', joins=True)
+
+        example 7:
+        list('Service', joins=['host.address', 'host.state'],
+             client_joins=True)
+
+        example 8:
+        list('Service', indexed=True).where('attrs.host_name', 'localhost')
         '''
 
+        if indexed:
+            from icinga2api.resultset import ResultSet
+            return ResultSet(self.list(object_type, name, attrs, filters,
+                                       filter_vars, joins, client_joins))
+
+        if client_joins and joins:
+            from icinga2api.joins import HOST_JOIN_TYPES
+            if object_type in HOST_JOIN_TYPES:
+                return self._list_client_joins(
+                    object_type, name, attrs, filters, filter_vars, joins)
+
         object_type_url_path = self._convert_object_type(object_type)
         url_path = '{}/{}'.format(self.base_url_path, object_type_url_path)
         if name:
@@ -187,6 +297,161 @@ class Objects(Base):
 
         return self._request('GET', url_path, payload)['results']
 
+    def _list_client_joins(self, object_type, name, attrs, filters,
+                           filter_vars, joins):
+        '''
+        list objects and join their hosts in the client
+        '''
+
+        from icinga2api.joins import join_hosts, split_joins
+
+        host_attrs, other_joins = split_joins(object_type, joins)
+        if host_attrs == []:
+            return self.list(object_type, name, attrs, filters, filter_vars,
+                             joins)
+        strip_host_name = bool(attrs) and 'host_name' not in attrs
+        if strip_host_name:
+            attrs = list(attrs) + ['host_name']
+        results = self.list(object_type, name, attrs, filters, filter_vars,
+                            joins=other_joins or None)
+        # get only the hosts of a selection, list them all otherwise
+        return join_hosts(self, results, host_attrs,
+                          names=bool(name or filters),
+                          strip_host_name=strip_host_name)
+
+    def snapshot(self,
+                 object_type,
+                 path,
+                 attrs=None,
+                 filters=None,
+                 filter_vars=None,
+                 joins=None,
+                 base=None):
+        '''
+        write a listing of objects to a snapshot file
+
+        :param object_type: type of the object
+        :type object_type: string
+        :param path: the snapshot file
+        :type path: string
+        :param attrs: only store these attributes
+        :type attrs: list
+        :param filters: filters matched object(s)
+        :type filters: string
+        :param filter_vars: variables used in the filters expression
+        :type filter_vars: dict
+        :param joins: store joined object
+        :type joins: list
+        :param base: store only changes compared to this snapshot
+        :type base: Snapshot or string
+        :returns: the snapshot
+        :rtype: Snapshot
+
+        example 1:
+        snapshot('Host', '/var/lib/reports/hosts-1.snap', attrs=['state'])
+
+        example 2:
+        snapshot('Host', '/var/lib/reports/hosts-2.snap', attrs=['state'],
+                 base='/var/lib/reports/hosts-1.snap')
+        '''
+
+        from icinga2api.snapshot import Snapshot, SnapshotWriter
+
+        opened = None
+        if base is not None and not isinstance(base, Snapshot):
+            base = opened = Snapshot(base)
+        try:
+            with SnapshotWriter(path, object_type, base) as writer:
+                for obj in self.list(object_type,
+                                     attrs=attrs,
+                                     filters=filters,
+                                     filter_vars=filter_vars,
+                                     joins=joins):
+                    writer.add(obj)
+        finally:
+            if opened is not None:
+                opened.close()
+        LOG.debug("Snapshot %s: %d objects, %d unchanged",
+                  path, writer.count, writer.unchanged)
+
+        return Snapshot(path)
+
+    def list_sharded(self,
+                     object_type,
+                     shards=None,
+                     by='range',
+                     attrs=None,
+                     filters=None,
+                     filter_vars=None,
+                     joins=None,
+                     processes=None):
+        '''
+        list objects in disjoint shards fetched and decoded by processes
+
+        :param object_type: type of the object
+        :type object_type: string
+        :param shards: number of shards, default: number of CPUs
+        :type shards: int
+        :param by: split by name "range", name "prefix" or "zone"
+        :type by: string
+        :param attrs: only return these attributes
+        :type attrs: list
+        :param filters: filters matched object(s)
+        :type filters: string
+        :param filter_vars: variables used in the filters expression
+        :type filter_vars: dict
+        :param joins: show joined object
+        :type joins: list
+        :param processes: number of worker processes, default: shards
+        :type processes: int
+        :returns: the objects, shard by shard as they arrive
+        :rtype: iterator
+
+        example 1:
+        for service in list_sharded('Service', shards=8, attrs=['state']):
+            print(service['name'])
+
+        example 2:
+        list_sharded('Service', by='zone', joins=['host.address'])
+        '''
+
+        from icinga2api.sharding import list_sharded
+
+        self._convert_object_type(object_type)
+        return list_sharded(self, object_type, shards, by, attrs, filters,
+                            filter_vars, joins, processes)
+
+    def snapshot_sharded(self,
+                         object_type,
+                         directory,
+                         shards=None,
+                         by='range',
+                         attrs=None,
+                         filters=None,
+                         filter_vars=None,
+                         joins=None,
+                         processes=None):
+        '''
+        write objects to one snapshot file per shard, written by processes
+
+        :param directory: directory of the snapshot files
+        :type directory: string
+        :returns: the snapshots of the shards read as one
+        :rtype: ShardedSnapshot
+
+        The other parameters are the same as for list_sharded.
+
+        example 1:
+        services = snapshot_sharded('Service', '/var/lib/reports', shards=8)
+        print(services.get('webserver01.domain!ping4'))
+        '''
+
+        from icinga2api.sharding import snapshot_sharded
+
+        self._convert_object_type(object_type)
+        return snapshot_sharded(self, object_type, directory, shards, by,
+                                attrs, filters, filter_vars, joins, processes)
+
     def create(self,
                object_type,
                name,
@@ -230,12 +495,62 @@ class Objects(Base):
 
         return self._request('PUT', url_path, payload)
 
+    def create_many(self,
+                    objects,
+                    parallelism=8,
+                    progress=None):
+        '''
+        create many objects of different types in dependency order
+
+        Objects are created level by level: zones and endpoints, commands,
+        time periods and groups, hosts and users, services and finally
+        dependencies, notifications and downtimes. Objects referencing each
+        other (e.g. by host_name, groups or zone) are ordered accordingly.
+        Objects of a level are created concurrently. Failures don't abort the
+        batch, but objects referencing a failed object are skipped.
+
+        :param objects: dictionaries with type, name, templates and attrs
+        :type objects: list
+        :param parallelism: maximum concurrent requests
+        :type parallelism: int
+        :param progress: called with the BulkResult after every object
+        :type progress: callable
+        :returns: the created and the failed objects
+        :rtype: BulkResult
+
+        example 1:
+        create_many([
+            {'type': 'Host', 'name': 'localhost',
+             'templates': ['generic-host'], 'attrs': {'address': '127.0.0.1'}},
+            {'type': 'Service', 'name': 'localhost!dummy',
+             'templates': ['generic-service'],
+             'attrs': {'check_command': 'dummy'}},
+        ])
+        '''
+
+        from icinga2api.bulk import dependency_levels, run_levels
+
+        levels, cycles = dependency_levels(list(objects))
+        return run_levels(
+            levels,
+            cycles,
+            lambda obj: self.create(obj['type'],
+                                    obj['name'],
+                                    obj.get('templates'),
+                                    obj.get('attrs')),
+            parallelism=parallelism,
+            progress=progress)
+
     def update(self,
                object_type,
-               name,
-               attrs):
+               name=None,
+               attrs=None,
+               filters=None,
+               filter_vars=None):
         '''
-        update an object
+        update an object, or all objects matching a filter
+
+        Either name or filters is required.
 
         :param object_type: type of the object
         :type object_type: string
@@ -243,21 +558,94 @@ class Objects(Base):
         :type name: string
         :param attrs: object's attributes to change
         :type attrs: dictionary
+        :param filters: filters matched object(s)
+        :type filters: string
+        :param filter_vars: variables used in the filters expression
+        :type filter_vars: dict
+        :returns: one result per updated object
+        :rtype: dictionary
 
         example 1:
         update('Host', 'localhost', {'address': '127.0.1.1'})
 
         example 2:
         update('Service', 'testhost3!dummy', {'check_interval': '10m'})
+
+        example 3:
+        update('Service', attrs={'vars.maintenance_window': 'sunday'},
+               filters='service.vars.team == team', filter_vars={'team': 'db'})
         '''
+        if not name and not filters:
+            # without both the update would change every object of the type
+            raise Icinga2ApiException(
+                'Updating "{}" objects needs a name or filters.'.format(
+                    object_type
+                ))
         object_type_url_path = self._convert_object_type(object_type)
-        url_path = '{}/{}/{}'.format(
-            self.base_url_path,
-            object_type_url_path,
-            name
-        )
+        url_path = '{}/{}'.format(self.base_url_path, object_type_url_path)
+        if name:
+            url_path += '/{}'.format(name)
+
+        attrs = attrs or {}
+        # the attributes used to be sent as the payload
+        payload = dict(attrs) if 'attrs' in attrs else {'attrs': attrs}
+        if filters:
+            payload['filter'] = filters
+        if filter_vars:
+            payload['filter_vars'] = filter_vars
+
+        return self._request('POST', url_path, payload)
+
+    def update_many(self,
+                    object_type,
+                    changes,
+                    chunk_size=500,
+                    parallelism=4):
+        '''
+        update many objects, one filtered request per identical change
+
+        Objects getting the same attributes are updated together, selected
+        by a filter on their names.
+
+        :param object_type: type of the objects
+        :type object_type: string
+        :param changes: attributes to change by object name
+        :type changes: dictionary
+        :param chunk_size: names per request
+        :type chunk_size: int
+        :param parallelism: maximum concurrent requests
+        :type parallelism: int
+        :returns: one result per object as the requests finish, with name,
+            code and status
+        :rtype: iterator
+
+        example 1:
+        for result in update_many('Service', {
+                'web01!http': {'vars.maintenance_window': 'sunday'},
+                'web02!http': {'vars.maintenance_window': 'sunday'},
+                'db01!mysql': {'vars.maintenance_window': 'monday'}}):
+            if result['code'] != 200:
+                print(result['name'], result['status'])
+        '''
+
+        from icinga2api.bulk import group_changes, stream_results
+
+        self._convert_object_type(object_type)
+        filters = '{}.__name in {}'.format(object_type.lower(), NAMES_VAR)
+        requests = []
+        for attrs, names in group_changes(changes):
+            for start in range(0, len(names), chunk_size):
+                requests.append((attrs, names[start:start + chunk_size]))
+
+        def update_chunk(attrs, names):
+            return self.update(object_type,
+                               attrs={'attrs': attrs},
+                               filters=filters,
+                               filter_vars={NAMES_VAR: names})['results']
 
-        return self._request('POST', url_path, attrs)
+        LOG.debug("update_many %s: %d objects, %d requests",
+                  object_type, len(changes), len(requests))
+        return stream_results(requests, update_chunk, parallelism)
 
     def delete(self,
                object_type,
@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API config packages
+
+Deploys objects as configuration files of a config package stage: the
+objects are rendered to config text, uploaded in one request and activated
+with one reload, instead of one PUT per object.
+'''
+
+from __future__ import print_function
+import decimal
+import json
+import logging
+import math
+import re
+import time
+
+from icinga2api.base import Base
+from icinga2api.exceptions import Icinga2ApiConnectionError
+from icinga2api.exceptions import Icinga2ApiException
+
+LOG = logging.getLogger(__name__)
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# keywords of the config language, not usable as plain attribute names
+KEYWORDS = frozenset([
+    'apply', 'assign', 'break', 'const', 'continue', 'default', 'else',
+    'false', 'for', 'function', 'globals', 'if', 'ignore', 'ignore_on_error',
+    'import', 'in', 'include', 'include_recursive', 'include_zones', 'library',
+    'locals', 'namespace', 'null', 'object', 'return', 'template', 'throw',
+    'true', 'try', 'except', 'use', 'using', 'var', 'while',
+])
+
+# attributes set by the parts of full names like host!service
+NAME_PARTS = {
+    'Service': ('host_name',),
+    'Notification': ('host_name', 'service_name'),
+    'ScheduledDowntime': ('host_name', 'service_name'),
+    'Dependency': ('child_host_name', 'child_service_name'),
+}
+
+try:
+    TEXT_TYPES = (str, unicode)  # pylint: disable=undefined-variable
+except NameError:
+    TEXT_TYPES = (str,)
+
+
+def _string(value):
+    '''
+    return a string literal
+    '''
+
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _number(value):
+    '''
+    return a number literal, without exponent
+    '''
+
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            raise Icinga2ApiException(
+                'Cannot render {!r} as config text.'.format(value))
+        # repr() is the shortest exact form, but may use an exponent
+        return '{:f}'.format(decimal.Decimal(repr(value)))
+    return str(value)
+
+
+def _identifier(name):
+    '''
+    return a name as identifier, keywords are escaped with @
+    '''
+
+    return '@' + name if name in KEYWORDS else name
+
+
+def _key(key):
+    '''
+    return an attribute path like vars.team, with indexers where needed
+    '''
+
+    parts = key.split('.')
+    if not IDENTIFIER.match(parts[0]):
+        raise Icinga2ApiException('Invalid attribute "{}".'.format(key))
+    rendered = _identifier(parts[0])
+    for part in parts[1:]:
+        if IDENTIFIER.match(part):
+            rendered += '.' + _identifier(part)
+        else:
+            rendered += '[{}]'.format(_string(part))
+    return rendered
+
+
+def render_value(value, indent=''):
+    '''
+    return a value as config text
+
+    :param value: string, number, bool, None, list or dictionary
+    :returns: the config text
+    :rtype: string
+    '''
+
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return _number(value)
+    if isinstance(value, TEXT_TYPES):
+        return _string(value)
+    if isinstance(value, (list, tuple)):
+        return '[ {} ]'.format(', '.join(
+            render_value(item, indent) for item in value))
+    if isinstance(value, dict):
+        if not value:
+            return '{}'
+        inner = indent + '  '
+        return '{{\n{}\n{}}}'.format('\n'.join(
+            '{}{} = {}'.format(inner, _string(str(key)),
+                               render_value(item, inner))
+            for key, item in sorted(value.items())), indent)
+    raise Icinga2ApiException(
+        'Cannot render {!r} as config text.'.format(value))
+
+
+def render_object(obj):
+    '''
+    return an object as config text
+
+    :param obj: dictionary with type, name, templates and attrs as for
+        Objects.create_many()
+    :type obj: dictionary
+    :returns: the object definition
+    :rtype: string
+
+    example 1:
+    render_object({'type': 'Service', 'name': 'localhost!ping4',
+                   'templates': ['generic-service'],
+                   'attrs': {'check_command': 'ping4'}})
+    '''
+
+    object_type = obj['type']
+    if not IDENTIFIER.match(object_type):
+        raise Icinga2ApiException(
+            'Invalid object type "{}".'.format(object_type))
+    attrs = dict(obj.get('attrs') or {})
+    name = obj['name']
+    parts = name.split('!')
+    if len(parts) > 1:
+        name = parts[-1]
+        for attr, part in zip(NAME_PARTS.get(object_type, ()), parts[:-1]):
+            attrs.setdefault(attr, part)
+
+    lines = ['object {} {} {{'.format(object_type, _string(name))]
+    for template in obj.get('templates') or []:
+        lines.append('  import {}'.format(_string(template)))
+    for key in sorted(attrs):
+        lines.append('  {} = {}'.format(_key(key),
+                                        render_value(attrs[key], '  ')))
+    lines.append('}\n')
+    return '\n'.join(lines)
+
+
+def render_files(objects, objects_per_file=5000):
+    '''
+    render objects to config files, one object at a time
+
+    Objects with a zone attribute are placed in zones.d/<zone>/, others in
+    conf.d/. Files hold the objects of one type, at most objects_per_file.
+
+    :param objects: dictionaries with type, name, templates and attrs
+    :type objects: iterable
+    :param objects_per_file: maximum number of objects per file
+    :type objects_per_file: int
+    :returns: file contents by path
+    :rtype: dictionary
+    '''
+
+    chunks = {}
+    counts = {}
+    for obj in objects:
+        attrs = obj.get('attrs') or {}
+        zone = attrs.get('zone')
+        if zone:
+            obj = dict(obj, attrs=dict(
+                (key, value) for key, value in attrs.items() if key != 'zone'))
+            directory = 'zones.d/{}'.format(zone)
+        else:
+            directory = 'conf.d'
+        group = (directory, obj['type'].lower())
+        count = counts.get(group, 0)
+        counts[group] = count + 1
+        path = '{}/{}-{}.conf'.format(directory, group[1],
+                                      count // objects_per_file)
+        chunks.setdefault(path, []).append(render_object(obj))
+    return dict((path, '\n'.join(texts)) for path, texts in chunks.items())
+
+
+class ConfigPackages(Base):
+    '''
+    Icinga 2 API config packages class
+    '''
+
+    base_url_path = 'v1/config'
+
+    def list(self):
+        '''
+        list the config packages with their stages
+
+        :returns: the packages
+        :rtype: list
+        '''
+
+        url = '{}/{}'.format(self.base_url_path, 'packages')
+
+        return self._request('GET', url)['results']
+
+    def create(self, package):
+        '''
+        create a config package
+
+        :param package: name of the package
+        :type package: string
+        :returns: the response as json
+        :rtype: dictionary
+        '''
+
+        url = '{}/{}/{}'.format(self.base_url_path, 'packages', package)
+
+        return self._request('POST', url)
+
+    def delete(self, package):
+        '''
+        delete a config package with all its stages
+
+        :param package: name of the package
+        :type package: string
+        :returns: the response as json
+        :rtype: dictionary
+        '''
+
+        url = '{}/{}/{}'.format(self.base_url_path, 'packages', package)
+
+        return self._request('DELETE', url)
+
+    def upload(self, package, files, reload=True):
+        '''
+        upload files as a new stage, validated and activated by the master
+
+        :param package: name of the package
+        :type package: string
+        :param files: file contents by path, e.g. {'conf.d/hosts.conf': ...}
+        :type files: dictionary
+        :param reload: reload Icinga 2 if the stage is valid
+        :type reload: bool
+        :returns: name of the stage
+        :rtype: string
+        '''
+
+        url = '{}/{}/{}'.format(self.base_url_path, 'stages', package)
+
+        payload = {
+            'files': files,
+            'reload': reload,
+        }
+
+        return self._request('POST', url, payload)['results'][0]['stage']
+
+    def stage_files(self, package, stage):
+        '''
+        list the files of a stage
+
+        :param package: name of the package
+        :type package: string
+        :param stage: name of the stage
+        :type stage: string
+        :returns: the files and directories
+        :rtype: list
+        '''
+
+        url = '{}/{}/{}/{}'.format(self.base_url_path, 'stages', package, stage)
+
+        return self._request('GET', url)['results']
+
+    def delete_stage(self, package, stage):
+        '''
+        delete a stage which is not active
+
+        :param package: name of the package
+        :type package: string
+        :param stage: name of the stage
+        :type stage: string
+        :returns: the response as json
+        :rtype: dictionary
+        '''
+
+        url = '{}/{}/{}/{}'.format(self.base_url_path, 'stages', package, stage)
+
+        return self._request('DELETE', url)
+
+    def get_file(self, package, stage, path):
+        '''
+        return the content of a file of a stage
+
+        :param package: name of the package
+        :type package: string
+        :param stage: name of the stage
+        :type stage: string
+        :param path: path of the file, e.g. startup.log
+        :type path: string
+        :returns: the content
+        :rtype: string
+        '''
+
+        url = '{}/{}/{}/{}/{}'.format(self.base_url_path, 'files', package,
+                                      stage, path)
+
+        return self._request('GET', url, stream=True).text
+
+    def stage_status(self, package, stage):
+        '''
+        return the validation status of a stage
+
+        The master writes the status and startup.log files of a stage when
+        its validation finished.
+
+        :param package: name of the package
+        :type package: string
+        :param stage: name of the stage
+        :type stage: string
+        :returns: finished, valid, active and the startup log
+        :rtype: dictionary
+        '''
+
+        try:
+            status = self.get_file(package, stage, 'status').strip()
+        except Icinga2ApiException as error:
+            if error.status_code != 404:
+                raise
+            return {'finished': False, 'valid': None, 'active': False,
+                    'log': None}
+        active = [item.get('active-stage') for item in self.list()
+                  if item.get('name') == package]
+        return {
+            'finished': True,
+            'valid': status == '0',
+            'active': active == [stage],
+            'log': self.get_file(package, stage, 'startup.log'),
+        }
+
+    def wait(self, package, stage, timeout=300, interval=1.0):
+        '''
+        wait until the validation of a stage finished
+
+        Connection errors and server errors while the master reloads are
+        retried until the timeout, other errors are raised.
+
+        :param package: name of the package
+        :type package: string
+        :param stage: name of the stage
+        :type stage: string
+        :param timeout: seconds to wait at most
+        :type timeout: float
+        :param interval: seconds between polls
+        :type interval: float
+        :returns: the status as of stage_status()
+        :rtype: dictionary
+        '''
+
+        deadline = time.time() + timeout
+        while True:
+            try:
+                status = self.stage_status(package, stage)
+            except Icinga2ApiException as error:
+                if not isinstance(error, Icinga2ApiConnectionError) and \
+                        not (error.status_code or 0) >= 500:
+                    raise
+                LOG.debug('Polling stage %s failed: %s', stage, error)
+                status = None
+            if status is not None and status['finished']:
+                if not status['valid']:
+                    raise Icinga2ApiException(
+                        'Stage "{}" of package "{}" is invalid:\n{}'.format(
+                            stage, package, status['log']))
+                return status
+            if time.time() >= deadline:
+                raise Icinga2ApiException(
+                    'Stage "{}" of package "{}" not validated after {} '
+                    'seconds.'.format(stage, package, timeout))
+            time.sleep(interval)
+
+    def deploy(self, package, objects, objects_per_file=5000, reload=True,
+               wait=True, timeout=300):
+        '''
+        deploy objects as a new stage of a package
+
+        The package is created if it doesn't exist. The stage replaces the
+        previous stage of the package: objects which are not deployed again
+        are removed on activation.
+
+        example 1:
+        deploy('provisioning', [
+            {'type': 'Host', 'name': 'localhost',
+             'templates': ['generic-host'], 'attrs': {'address': '127.0.0.1'}},
+        ])
+
+        :param package: name of the package
+        :type package: string
+        :param objects: dictionaries with type, name, templates and attrs
+        :type objects: iterable
+        :param objects_per_file: maximum number of objects per file
+        :type objects_per_file: int
+        :param reload: reload Icinga 2 if the stage is valid
+        :type reload: bool
+        :param wait: wait for the validation
+        :type wait: bool
+        :param timeout: seconds to wait for the validation at most
+        :type timeout: float
+        :returns: name of the stage and, if waited for, its status
+        :rtype: dictionary
+        '''
+
+        files = render_files(objects, objects_per_file)
+        if package not in [item.get('name') for item in self.list()]:
+            self.create(package)
+        stage = self.upload(package, files, reload)
+        LOG.debug('Uploaded stage %s of package %s with %d files', stage,
+                  package, len(files))
+        result = {'stage': stage}
+        if wait:
+            result['status'] = self.wait(package, stage, timeout)
+        return result
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API delta polling
+'''
+
+from __future__ import print_function
+import json
+import logging
+
+LOG = logging.getLogger(__name__)
+
+
+class DeltaPoller(object):
+    '''
+    Poll a listing of objects, transferring only changed objects
+
+    The poller remembers the highest value of a change field, e.g.
+    `last_check`, `last_state_change` or `version`, and lists only objects with
+    a newer value. The results are merged into `results`. Deleted objects are
+    only noticed by a full poll, use `full_every` to schedule them.
+    '''
+
+    since_var = 'icinga2api_since'
+
+    def __init__(self,
+                 objects,
+                 object_type,
+                 attrs=None,
+                 change_field='last_check',
+                 filters=None,
+                 filter_vars=None,
+                 joins=None,
+                 overlap=1.0,
+                 full_every=None):
+        '''
+        initialize object
+
+        :param objects: the objects endpoint, e.g. client.objects
+        :type objects: Objects
+        :param object_type: type of the object
+        :type object_type: string
+        :param attrs: only return these attributes
+        :type attrs: list
+        :param change_field: attribute growing with every change
+        :type change_field: string
+        :param filters: filters matched object(s)
+        :type filters: string
+        :param filter_vars: variables used in the filters expression
+        :type filter_vars: dict
+        :param joins: show joined object
+        :type joins: list
+        :param overlap: also list objects changed this much before the mark
+        :type overlap: float
+        :param full_every: do a full poll every this many polls
+        :type full_every: int
+        '''
+
+        self.objects = objects
+        self.object_type = object_type
+        self.change_field = change_field
+        self.attrs = attrs
+        if attrs and change_field.split('.')[0] not in attrs:
+            self.attrs = list(attrs) + [change_field.split('.')[0]]
+        self.filters = filters
+        self.filter_vars = filter_vars or {}
+        self.joins = joins
+        self.overlap = overlap
+        self.full_every = full_every
+        self.high_water_mark = None
+        self.results = {}
+        self.polls = 0
+        self.full_polls = 0
+        self.objects_received = 0
+        self.objects_saved = 0
+        self.bytes_received = 0
+        self.bytes_saved = 0
+        self._sizes = {}
+        self._size_total = 0
+
+    def _change_value(self, obj):
+        '''
+        return the value of the change field of an object
+        '''
+
+        value = obj.get('attrs', {})
+        for part in self.change_field.split('.'):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+        return value
+
+    def _delta_filter(self):
+        '''
+        return the filter expression and variables for a delta poll
+        '''
+
+        delta = '{}.{} > {}'.format(
+            self.object_type.lower(), self.change_field, self.since_var)
+        if self.filters:
+            delta = '({}) && {}'.format(self.filters, delta)
+        filter_vars = dict(self.filter_vars)
+        filter_vars[self.since_var] = self.high_water_mark - self.overlap
+        return delta, filter_vars
+
+    def _store(self, obj):
+        '''
+        store an object and account its size
+        '''
+
+        size = len(json.dumps(obj))
+        name = obj['name']
+        self._size_total += size - self._sizes.get(name, 0)
+        self._sizes[name] = size
+        self.results[name] = obj
+        value = self._change_value(obj)
+        if value is not None and \
+                (self.high_water_mark is None or value > self.high_water_mark):
+            self.high_water_mark = value
+        return size
+
+    def poll(self, full=False):
+        '''
+        list the objects changed since the last poll and merge them
+
+        example 1:
+        poller = DeltaPoller(client.objects, 'Service', attrs=['state'])
+        while True:
+            for service in poller.poll():
+                print(service['name'], service['attrs']['state'])
+            time.sleep(30)
+
+        :param full: list all objects and drop deleted ones
+        :type full: bool
+        :returns: the changed objects
+        :rtype: list
+        '''
+
+        full = full or self.high_water_mark is None or \
+            (self.full_every and self.polls % self.full_every == 0)
+        self.polls += 1
+
+        if full:
+            filters, filter_vars = self.filters, self.filter_vars or None
+        else:
+            filters, filter_vars = self._delta_filter()
+        changed = self.objects.list(self.object_type,
+                                    attrs=self.attrs,
+                                    filters=filters,
+                                    filter_vars=filter_vars,
+                                    joins=self.joins)
+
+        if full:
+            self.full_polls += 1
+            names = set(obj['name'] for obj in changed)
+            for name in [name for name in self.results if name not in names]:
+                del self.results[name]
+                self._size_total -= self._sizes.pop(name)
+
+        received = 0
+        for obj in changed:
+            received += self._store(obj)
+        self.objects_received += len(changed)
+        self.bytes_received += received
+        if not full:
+            # the objects a full listing would have transferred again
+            received_names = set(obj['name'] for obj in changed)
+            for name, size in self._sizes.items():
+                if name not in received_names:
+                    self.objects_saved += 1
+                    self.bytes_saved += size
+        LOG.debug('Delta poll of %s: %d objects changed',
+                  self.object_type, len(changed))
+
+        return changed
+
+    def stats(self):
+        '''
+        return the polling statistics
+
+        :returns: polls, full polls, received and saved objects and bytes
+        :rtype: dictionary
+        '''
+
+        return {
+            'polls': self.polls,
+            'full_polls': self.full_polls,
+            'objects': len(self.results),
+            'objects_received': self.objects_received,
+            'objects_saved': self.objects_saved,
+            'bytes_received': self.bytes_received,
+            'bytes_saved': self.bytes_saved,
+        }
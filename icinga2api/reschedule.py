@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API spread rescheduling
+
+Splits the checks to reschedule into buckets spread over a time window and
+reschedules every bucket with one request, instead of running all checks at
+the same next_check.
+'''
+
+from __future__ import print_function
+import heapq
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.scheduler import carry
+
+LOG = logging.getLogger(__name__)
+
+# filter variable holding the names of a bucket
+NAMES_VAR = 'icinga2api_names'
+
+STRATEGIES = ('cost', 'zone', 'count')
+
+
+def check_cost(obj, default=1.0):
+    '''
+    return the execution time of the last check of an object
+
+    Icinga 2 doesn't store the execution time, it is the difference of
+    execution_end and execution_start.
+
+    :param obj: the object as in a listing
+    :type obj: dictionary
+    :param default: cost of objects without a check result
+    :type default: float
+    :returns: seconds
+    :rtype: float
+    '''
+
+    result = (obj.get('attrs') or {}).get('last_check_result') or {}
+    cost = result.get('execution_time')
+    if cost is None and result.get('execution_end'):
+        cost = result['execution_end'] - result.get('execution_start', 0)
+    return float(cost) if cost and cost > 0 else default
+
+
+class ReschedulePlan(object):
+    '''
+    next_check times of buckets of objects
+    '''
+
+    def __init__(self, object_type, buckets):
+        '''
+        initialize object
+
+        :param object_type: Host or Service
+        :type object_type: string
+        :param buckets: dictionaries with next_check, names and cost
+        :type buckets: list
+        '''
+
+        self.object_type = object_type
+        self.buckets = buckets
+        self.results = []
+        self.failed = []
+
+    def __len__(self):
+        return sum(len(bucket['names']) for bucket in self.buckets)
+
+    def load_curve(self):
+        '''
+        return the objects and check cost per bucket, in time order
+
+        :returns: dictionaries with next_check, objects and cost
+        :rtype: list
+        '''
+
+        return [{
+            'next_check': bucket['next_check'],
+            'objects': len(bucket['names']),
+            'cost': bucket['cost'],
+        } for bucket in sorted(self.buckets, key=lambda b: b['next_check'])]
+
+    def peak(self):
+        '''
+        return the largest check cost of a bucket
+
+        :returns: seconds of check execution
+        :rtype: float
+        '''
+
+        return max([bucket['cost'] for bucket in self.buckets] or [0.0])
+
+    def __repr__(self):
+        return '<ReschedulePlan {} objects={} buckets={} peak={:.1f}>'.format(
+            self.object_type, len(self), len(self.buckets), self.peak())
+
+
+def plan_reschedule(object_type, objects, window=300, interval=10, by='cost',
+                    start=None, jitter=True, seed=None):
+    '''
+    spread objects over buckets of interval seconds within window
+
+    cost: balance the last check execution times over the buckets
+    zone: balance every zone's objects over the buckets separately
+    count: balance the number of objects
+
+    :param object_type: Host or Service
+    :type object_type: string
+    :param objects: objects as in a listing, with attrs.last_check_result
+        for cost and attrs.zone for zone
+    :type objects: list
+    :param window: seconds to spread the checks over
+    :type window: float
+    :param interval: seconds per bucket
+    :type interval: float
+    :param by: cost, zone or count
+    :type by: string
+    :param start: timestamp of the first bucket, now by default
+    :type start: float
+    :param jitter: shift every bucket randomly within its interval
+    :type jitter: bool
+    :param seed: seed of the jitter
+    :type seed: int
+    :returns: the plan
+    :rtype: ReschedulePlan
+    '''
+
+    if by not in STRATEGIES:
+        raise Icinga2ApiException(
+            'Unknown strategy "{}", use one of {}.'.format(
+                by, ', '.join(STRATEGIES)))
+    if not interval > 0:
+        raise Icinga2ApiException(
+            'interval needs to be positive, not {!r}.'.format(interval))
+    count = max(1, int(window // interval))
+    start = time.time() if start is None else start
+    generator = random.Random(seed)
+    buckets = [{
+        'next_check': start + number * interval + (
+            generator.uniform(0, interval) if jitter else 0),
+        'names': [],
+        'cost': 0.0,
+    } for number in range(count)]
+
+    # largest first onto the least loaded bucket, per zone for zone
+    loads = {}
+    weighted = [(check_cost(obj) if by != 'count' else 1.0, obj)
+                for obj in objects]
+    weighted.sort(key=lambda item: -item[0])
+    for cost, obj in weighted:
+        group = (obj.get('attrs') or {}).get('zone') if by == 'zone' else None
+        load = loads.get(group)
+        if load is None:
+            # zones start at different buckets to not stack their remainders
+            offset = len(loads)
+            load = loads[group] = [
+                (0.0, (number + offset) % count, number) for number in
+                range(count)]
+        total, order, number = heapq.heappop(load)
+        heapq.heappush(load, (total + cost, order, number))
+        buckets[number]['names'].append(obj['name'])
+        buckets[number]['cost'] += check_cost(obj)
+    return ReschedulePlan(object_type, [
+        bucket for bucket in buckets if bucket['names']])
+
+
+def submit_plan(actions, plan, parallelism=4, force_check=True,
+                chunk_size=500):
+    '''
+    reschedule the buckets of a plan concurrently, one request per bucket
+
+    Buckets with more than chunk_size objects are split into several
+    requests with the same next_check, to keep the filter variables small.
+    Failed requests are kept in plan.failed as (bucket, error), the bucket
+    with the next_check and the names of the request, the responses of the
+    others in plan.results.
+
+    :param actions: the actions endpoint, e.g. client.actions
+    :type actions: Actions
+    :param plan: the plan
+    :type plan: ReschedulePlan
+    :param parallelism: maximum concurrent requests
+    :type parallelism: int
+    :param force_check: ignore period restrictions and disabled checks
+    :type force_check: bool
+    :param chunk_size: names per request
+    :type chunk_size: int
+    :returns: the plan
+    :rtype: ReschedulePlan
+    '''
+
+    chunk_size = max(1, chunk_size)
+    requests = [
+        {'next_check': bucket['next_check'],
+         'names': bucket['names'][start:start + chunk_size]}
+        for bucket in plan.buckets
+        for start in range(0, len(bucket['names']), chunk_size)]
+    filters = '{}.__name in {}'.format(plan.object_type.lower(), NAMES_VAR)
+
+    def submit(bucket):
+        try:
+            return bucket, actions.reschedule_check(
+                plan.object_type,
+                filters,
+                filter_vars={NAMES_VAR: bucket['names']},
+                next_check=bucket['next_check'],
+                force_check=force_check), None
+        except Exception as error:  # pylint: disable=broad-except
+            LOG.debug('Rescheduling %d objects failed: %s',
+                      len(bucket['names']), error)
+            return bucket, None, error
+
+    with ThreadPoolExecutor(max_workers=max(1, parallelism)) as executor:
+        for bucket, response, error in executor.map(
+                carry(submit, 'bulk'), requests):
+            if error is None:
+                plan.results.append(response)
+            else:
+                plan.failed.append((bucket, error))
+    return plan
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API indexed result sets
+
+A ResultSet is the list of objects of a listing with hash indexes on
+attribute paths like 'attrs.host_name'. An index is built on its first use
+and kept up to date by upsert() and discard(). Values which are lists, like
+'attrs.groups', index the object under every element.
+'''
+
+from __future__ import print_function
+import logging
+
+LOG = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+def _lookup(obj, path):
+    '''
+    return the value at a dotted path or MISSING
+    '''
+
+    value = obj
+    for key in path.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return MISSING
+        value = value[key]
+    return value
+
+
+def _keys(obj, path):
+    '''
+    return the index keys of an object
+    '''
+
+    value = _lookup(obj, path)
+    if value is MISSING:
+        return ()
+    if isinstance(value, (list, tuple)):
+        values = value
+    else:
+        values = (value,)
+    keys = []
+    for value in values:
+        if isinstance(value, list):
+            value = tuple(value)
+        try:
+            hash(value)
+        except TypeError:
+            continue
+        if value not in keys:
+            keys.append(value)
+    return keys
+
+
+class ResultSet(list):
+    '''
+    list of objects with lazily built hash indexes on attribute paths
+
+    Change the objects with upsert() and discard(), after other changes of
+    the list or its objects call drop_index(). Indexes return the objects in
+    listing order until upsert() or discard() change the set, discard()
+    also changes the order of the list.
+
+    example 1:
+    services = client.objects.list('Service', indexed=True)
+    services.where('attrs.host_name', 'webserver01.domain')
+
+    example 2:
+    services.count_by('attrs.state')
+    '''
+
+    def __init__(self, results=()):
+        super(ResultSet, self).__init__(results)
+        self._indexes = {}
+        # list position by name
+        self._positions = None
+
+    def index_by(self, path):
+        '''
+        return the index of a path, a dictionary of value to objects
+
+        :param path: the attribute path, e.g. 'attrs.host_name'
+        :type path: string
+        :returns: objects by value, in listing order unless objects were
+            upserted or discarded since the index was built
+        :rtype: dictionary
+        '''
+
+        index = self._indexes.get(path)
+        if index is None:
+            index = {}
+            for obj in self:
+                for key in _keys(obj, path):
+                    index.setdefault(key, {})[id(obj)] = obj
+            self._indexes[path] = index
+            LOG.debug('Built index %s with %d values', path, len(index))
+        return index
+
+    def drop_index(self, path=None):
+        '''
+        drop the index of a path or all indexes
+
+        :param path: the attribute path, None for all
+        :type path: string
+        '''
+
+        # the list may have changed as well
+        self._positions = None
+        if path is None:
+            self._indexes.clear()
+        else:
+            self._indexes.pop(path, None)
+
+    def where(self, path, value):
+        '''
+        return the objects with the value at path
+
+        :param path: the attribute path, e.g. 'attrs.groups'
+        :type path: string
+        :param value: the value, for list values one element
+        :returns: the matching objects, in the order of index_by()
+        :rtype: list
+        '''
+
+        if isinstance(value, list):
+            value = tuple(value)
+        return list(self.index_by(path).get(value, {}).values())
+
+    def group_by(self, path):
+        '''
+        return the objects grouped by the value at path
+
+        :param path: the attribute path, e.g. 'attrs.zone'
+        :type path: string
+        :returns: lists of objects by value
+        :rtype: dictionary
+        '''
+
+        return dict((key, list(objects.values()))
+                    for key, objects in self.index_by(path).items())
+
+    def count_by(self, path):
+        '''
+        return the number of objects by the value at path
+
+        :param path: the attribute path, e.g. 'attrs.state'
+        :type path: string
+        :returns: count by value
+        :rtype: dictionary
+        '''
+
+        return dict((key, len(objects))
+                    for key, objects in self.index_by(path).items())
+
+    def filter(self, expression, filter_vars=None):
+        '''
+        return the objects matching a filter expression, evaluated locally
+
+        :param expression: the filter expression, e.g. 'service.state != 0'
+        :type expression: string
+        :param filter_vars: variables used in the expression
+        :type filter_vars: dictionary
+        :returns: the matching objects
+        :rtype: ResultSet
+        '''
+
+        from icinga2api.filters import select
+        return ResultSet(select(self, expression, filter_vars))
+
+    def _positions_by_name(self):
+        '''
+        return the list positions by name
+        '''
+
+        if self._positions is None:
+            self._positions = dict((obj.get('name'), position)
+                                   for position, obj in enumerate(self))
+        return self._positions
+
+    def get(self, name, default=None):
+        '''
+        return the object with a name
+
+        :param name: the object name
+        :type name: string
+        '''
+
+        position = self._positions_by_name().get(name)
+        if position is None:
+            return default
+        return self[position]
+
+    def _unindex(self, obj):
+        '''
+        remove an object from the built indexes
+        '''
+
+        for path, index in self._indexes.items():
+            for key in _keys(obj, path):
+                objects = index.get(key)
+                if objects is not None:
+                    objects.pop(id(obj), None)
+                    if not objects:
+                        del index[key]
+
+    def _reindex(self, obj):
+        '''
+        add an object to the built indexes
+        '''
+
+        for path, index in self._indexes.items():
+            for key in _keys(obj, path):
+                index.setdefault(key, {})[id(obj)] = obj
+
+    def upsert(self, obj):
+        '''
+        add an object or replace the object with the same name
+
+        A replaced object keeps its list position but comes last in the
+        built indexes.
+
+        :param obj: the object as in a listing
+        :type obj: dictionary
+        :returns: the replaced object or None
+        :rtype: dictionary
+        '''
+
+        positions = self._positions_by_name()
+        position = positions.get(obj.get('name'))
+        old = None
+        if position is not None:
+            old = self[position]
+            self._unindex(old)
+            self[position] = obj
+        else:
+            positions[obj.get('name')] = len(self)
+            list.append(self, obj)
+        self._reindex(obj)
+        return old
+
+    def discard(self, name):
+        '''
+        remove the object with a name if there is one
+
+        The last object takes the position of the removed one, so the list
+        is no longer in listing order.
+
+        :param name: the object name
+        :type name: string
+        :returns: the removed object or None
+        :rtype: dictionary
+        '''
+
+        positions = self._positions_by_name()
+        position = positions.pop(name, None)
+        if position is None:
+            return None
+        obj = self[position]
+        self._unindex(obj)
+        last = list.pop(self)
+        if last is not obj:
+            self[position] = last
+            positions[last.get('name')] = position
+        return obj
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API request scheduler
+
+Limits the concurrent requests of a client and shares them between priority
+classes. Every class has reserved slots which only it can use, the remaining
+slots are shared. Waiting requests get free slots by weighted fair queuing:
+a class with weight 4 gets four times the slots of a class with weight 1
+while both are waiting, no class is starved.
+
+The class of a request is the one set with priority() in the calling thread,
+or else the default of its endpoint, e.g. 'actions' for client.actions.
+'''
+
+from __future__ import print_function
+import collections
+import contextlib
+import logging
+import threading
+import time
+
+from icinga2api.exceptions import Icinga2ApiException
+
+LOG = logging.getLogger(__name__)
+
+PRIORITIES = ('interactive', 'actions', 'bulk', 'background')
+WEIGHTS = {'interactive': 8, 'actions': 4, 'bulk': 2, 'background': 1}
+RESERVED = {'interactive': 2, 'actions': 1}
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def priority(name):
+    '''
+    send the requests of the calling thread with a priority class
+
+    example 1:
+    with priority('bulk'):
+        client.objects.update_many('Service', changes)
+
+    :param name: the priority class, e.g. 'bulk'
+    :type name: string
+    '''
+
+    previous = getattr(_local, 'priority', None)
+    _local.priority = name
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def current_priority(default=None):
+    '''
+    return the priority class of the calling thread
+
+    :param default: returned if no priority is set
+    :type default: string
+    :returns: the priority class
+    :rtype: string
+    '''
+
+    return getattr(_local, 'priority', None) or default
+
+
+def carry(function, default=None):
+    '''
+    return function running with the priority of the calling thread
+
+    For functions run by worker threads, e.g. of an executor.
+
+    :param function: the function
+    :type function: callable
+    :param default: the priority if the calling thread has none
+    :type default: string
+    :returns: the wrapped function
+    :rtype: callable
+    '''
+
+    name = current_priority(default)
+    if name is None:
+        return function
+
+    def wrapper(*args, **kwargs):
+        with priority(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+class _Class(object):
+    '''
+    waiting requests and statistics of a priority class
+    '''
+
+    def __init__(self, weight, reserved):
+        self.weight = float(weight)
+        self.reserved = reserved
+        self.waiting = collections.deque()
+        self.running = 0
+        self.virtual = 0.0
+        self.requests = 0
+        self.queued = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+
+class RequestScheduler(object):
+    '''
+    Share the request slots of a client between priority classes
+    '''
+
+    def __init__(self, capacity=10, weights=None, reserved=None,
+                 clock=time.time):
+        '''
+        initialize object
+
+        :param capacity: maximum concurrent requests, e.g. the connection
+            pool size of the transport
+        :type capacity: int
+        :param weights: weight by priority class
+        :type weights: dictionary
+        :param reserved: slots reserved by priority class
+        :type reserved: dictionary
+        :param clock: function returning the current time in seconds
+        :type clock: callable
+        '''
+
+        weights = dict(WEIGHTS, **(weights or {}))
+        reserved = dict(RESERVED, **(reserved or {}))
+        if sum(reserved.values()) > capacity:
+            raise Icinga2ApiException(
+                'Reserved slots exceed the capacity of {}.'.format(capacity))
+        self.capacity = capacity
+        self.shared = capacity - sum(reserved.values())
+        self.clock = clock
+        self._classes = dict(
+            (name, _Class(weights.get(name, 1), reserved.get(name, 0)))
+            for name in set(weights) | set(reserved))
+        self._lock = threading.Lock()
+        self._shared_running = 0
+        self._virtual = 0.0
+
+    def _class(self, name):
+        '''
+        return a priority class by name
+        '''
+
+        try:
+            return self._classes[name]
+        except KeyError:
+            raise Icinga2ApiException(
+                'Unknown priority class "{}", use one of {}.'.format(
+                    name, ', '.join(sorted(self._classes))))
+
+    def _take(self, klass):
+        '''
+        take a reserved or shared slot for a class if one is free
+        '''
+
+        if klass.running < klass.reserved:
+            klass.running += 1
+            return True
+        if self._shared_running < self.shared:
+            klass.running += 1
+            self._shared_running += 1
+            return True
+        return False
+
+    def _charge(self, klass):
+        '''
+        advance the virtual time of a class by one request
+        '''
+
+        if not klass.waiting:
+            klass.virtual = max(klass.virtual, self._virtual)
+        self._virtual = max(self._virtual, klass.virtual)
+        klass.virtual += 1.0 / klass.weight
+
+    def _dispatch(self):
+        '''
+        hand free slots to waiting requests, lowest virtual time first
+        '''
+
+        while True:
+            candidates = [klass for klass in self._classes.values()
+                          if klass.waiting and (
+                              klass.running < klass.reserved or
+                              self._shared_running < self.shared)]
+            if not candidates:
+                return
+            # the higher weight wins a tie
+            klass = min(candidates, key=lambda klass: (
+                klass.running >= klass.reserved,
+                klass.virtual + 1.0 / klass.weight,
+                -klass.weight))
+            self._take(klass)
+            self._charge(klass)
+            klass.waiting.popleft().set()
+
+    def acquire(self, name):
+        '''
+        wait for a slot of a priority class
+
+        :param name: the priority class
+        :type name: string
+        :returns: seconds waited
+        :rtype: float
+        '''
+
+        with self._lock:
+            klass = self._class(name)
+            klass.requests += 1
+            if not klass.waiting and self._take(klass):
+                self._charge(klass)
+                return 0.0
+            if not klass.waiting:
+                # the virtual time of a waiting class only advances when it
+                # is served, else a heavier class would starve it
+                klass.virtual = max(klass.virtual, self._virtual)
+            event = threading.Event()
+            klass.waiting.append(event)
+            klass.queued += 1
+        start = self.clock()
+        event.wait()
+        waited = self.clock() - start
+        with self._lock:
+            klass.wait_total += waited
+            klass.wait_max = max(klass.wait_max, waited)
+        return waited
+
+    def release(self, name):
+        '''
+        return the slot of a priority class
+
+        :param name: the priority class
+        :type name: string
+        '''
+
+        with self._lock:
+            klass = self._classes[name]
+            if klass.running > klass.reserved:
+                self._shared_running -= 1
+            klass.running -= 1
+            self._dispatch()
+
+    @contextlib.contextmanager
+    def slot(self, default='interactive'):
+        '''
+        hold a slot of the calling thread's priority class
+
+        :param default: the class if the thread has no priority set
+        :type default: string
+        '''
+
+        name = current_priority(default)
+        self.acquire(name)
+        try:
+            yield
+        finally:
+            self.release(name)
+
+    def stats(self):
+        '''
+        return the counters of every priority class
+
+        :returns: requests, queued requests, mean and maximum wait in
+            seconds, running and waiting requests by class
+        :rtype: dictionary
+        '''
+
+        with self._lock:
+            return dict((name, {
+                'requests': klass.requests,
+                'queued': klass.queued,
+                'wait_mean': klass.wait_total / klass.queued
+                             if klass.queued else 0.0,
+                'wait_max': klass.wait_max,
+                'running': klass.running,
+                'waiting': len(klass.waiting),
+            }) for name, klass in self._classes.items())
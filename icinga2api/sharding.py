@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API sharded listings
+
+Split the listing of a type into disjoint filter shards and fetch and decode
+them in a pool of processes.
+'''
+
+from __future__ import print_function
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.transport import TRANSPORTS
+
+LOG = logging.getLogger(__name__)
+
+SHARD_VAR = 'icinga2api_shard'
+LOWER_VAR = 'icinga2api_shard_lower'
+UPPER_VAR = 'icinga2api_shard_upper'
+
+STRATEGIES = ('range', 'prefix', 'zone')
+
+
+def _key_path(object_type):
+    '''
+    return the attribute path the shards are split by
+
+    Services are split by their host, all services of a host are in the
+    same shard.
+    '''
+
+    if object_type in ('Host', 'Service'):
+        return 'host.name'
+    return '{}.__name'.format(object_type.lower())
+
+
+def _key_names(objects, object_type):
+    '''
+    return the names the shards are split by
+    '''
+
+    key_type = 'Host' if object_type in ('Host', 'Service') else object_type
+    return [obj['name'] for obj in objects.list(key_type, attrs=['name'])]
+
+
+def _distribute(keys, shards, weights=None):
+    '''
+    assign keys to shards, heaviest first to the lightest shard
+    '''
+
+    weights = weights or {}
+    loads = [0] * shards
+    result = [[] for _ in range(shards)]
+    for key in sorted(keys, key=lambda key: (-weights.get(key, 1), key)):
+        shard = loads.index(min(loads))
+        result[shard].append(key)
+        loads[shard] += weights.get(key, 1)
+    return result
+
+
+def _ranges(names, shards):
+    '''
+    split the sorted names into contiguous ranges of about equal size
+
+    :returns: (lower, upper) bounds per range, the lower one inclusive, the
+        upper one exclusive, None for the open ends
+    :rtype: list
+    '''
+
+    names = sorted(set(names))
+    shards = max(1, min(shards, len(names)))
+    bounds = [names[len(names) * number // shards]
+              for number in range(1, shards)]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def _range_filter(path, lower, upper):
+    '''
+    return the filter expression and variables of a name range
+    '''
+
+    terms = []
+    shard_vars = {}
+    if lower is not None:
+        terms.append('{} >= {}'.format(path, LOWER_VAR))
+        shard_vars[LOWER_VAR] = lower
+    if upper is not None:
+        terms.append('{} < {}'.format(path, UPPER_VAR))
+        shard_vars[UPPER_VAR] = upper
+    return ' && '.join(terms) or 'true', shard_vars
+
+
+def shard_filters(objects, object_type, shards, by='range', filters=None,
+                  filter_vars=None):
+    '''
+    return disjoint filters covering the listing of a type
+
+    range: split the sorted (host) names into contiguous ranges, the names
+        are listed once, the filters only carry the bounds
+    prefix: split the first character of the (host) names, objects with
+        another first character get a shard of their own
+    zone: split the zones, objects without a known zone get a shard of
+        their own
+
+    :param objects: the objects endpoint, e.g. client.objects
+    :type objects: Objects
+    :param object_type: type of the object
+    :type object_type: string
+    :param shards: number of shards
+    :type shards: int
+    :param by: range, prefix or zone
+    :type by: string
+    :param filters: filter all shards with this expression
+    :type filters: string
+    :param filter_vars: variables used in the filters expression
+    :type filter_vars: dict
+    :returns: filter expression and variables per shard, empty shards are
+        left out
+    :rtype: list
+    '''
+
+    _check_strategy(by)
+    path = _key_path(object_type)
+    if by == 'range':
+        names = _key_names(objects, object_type)
+        shard_list = [_range_filter(path, lower, upper)
+                      for lower, upper in _ranges(names, shards)]
+    elif by == 'prefix':
+        counts = {}
+        for name in _key_names(objects, object_type):
+            counts[name[:1]] = counts.get(name[:1], 0) + 1
+        path = '{}.substr(0, 1)'.format(path)
+        shard_list = [('{} in {}'.format(path, SHARD_VAR), {SHARD_VAR: shard})
+                      for shard in _distribute(counts, shards, counts)
+                      if shard]
+        # objects created with another first character after the listing
+        shard_list.append(('!({} in {})'.format(path, SHARD_VAR),
+                           {SHARD_VAR: sorted(counts)}))
+    else:
+        zones = [obj['name'] for obj in objects.list('Zone', attrs=['name'])]
+        path = '{}.zone'.format(object_type.lower())
+        shard_list = [('{} in {}'.format(path, SHARD_VAR), {SHARD_VAR: shard})
+                      for shard in _distribute(zones, shards) if shard]
+        # objects without a zone or in a zone which is not listed
+        shard_list.append(('!({} in {})'.format(path, SHARD_VAR),
+                           {SHARD_VAR: zones}))
+
+    result = []
+    for expression, shard_vars in shard_list:
+        if filters:
+            expression = '({}) && {}'.format(filters, expression)
+        result.append((expression, dict(filter_vars or {}, **shard_vars)))
+    return result
+
+
+def _check_strategy(by):
+    '''
+    raise an Icinga2ApiException for an unknown shard strategy
+    '''
+
+    if by not in STRATEGIES:
+        raise Icinga2ApiException(
+            'Unknown shard strategy "{}", use one of {}.'.format(
+                by, ', '.join(STRATEGIES)))
+
+
+def client_settings(client):
+    '''
+    return the arguments to rebuild a client in another process
+
+    The worker clients have no scheduler and no single_flight, these only
+    act within a process. Transports are rebuilt by name with their default
+    options, other transports can't be rebuilt.
+    '''
+
+    transport = getattr(client.transport, 'name', None)
+    if TRANSPORTS.get(transport) is not type(client.transport):
+        raise Icinga2ApiException(
+            'The transport {!r} can\'t be rebuilt in worker processes, use '
+            'one of {}.'.format(client.transport,
+                                ', '.join(sorted(TRANSPORTS))))
+    return {
+        'url': client.url,
+        'username': client.username,
+        'password': client.password,
+        'certificate': client.certificate,
+        'key': client.key,
+        'ca_certificate': client.ca_certificate,
+        'transport': transport,
+        'timeout': client.timeout,
+        'compression': client.compression,
+        'compress_requests': client.compress_requests,
+    }
+
+
+def _list_shard(settings, object_type, attrs, filters, filter_vars, joins):
+    '''
+    list one shard in a worker process
+    '''
+
+    from icinga2api.client import Client
+
+    return Client(**settings).objects.list(
+        object_type, attrs=attrs, filters=filters, filter_vars=filter_vars,
+        joins=joins)
+
+
+def _snapshot_shard(settings, object_type, path, attrs, filters, filter_vars,
+                    joins):
+    '''
+    write one shard to a snapshot file in a worker process
+    '''
+
+    from icinga2api.client import Client
+
+    snapshot = Client(**settings).objects.snapshot(
+        object_type, path, attrs=attrs, filters=filters,
+        filter_vars=filter_vars, joins=joins)
+    count = len(snapshot)
+    snapshot.close()
+    return count
+
+
+def list_sharded(objects, object_type, shards=None, by='range', attrs=None,
+                 filters=None, filter_vars=None, joins=None, processes=None):
+    '''
+    list the shards in worker processes, yield the objects as shards arrive
+
+    :param processes: number of worker processes, default: shards
+    :type processes: int
+    '''
+
+    # fail on the call rather than on the first iteration
+    _check_strategy(by)
+    shards = shards or multiprocessing.cpu_count()
+    settings = client_settings(objects.manager)
+    shard_list = shard_filters(objects, object_type, shards, by, filters,
+                               filter_vars)
+    return _iter_shards(settings, object_type, attrs, joins, shard_list,
+                        processes or shards)
+
+
+def _iter_shards(settings, object_type, attrs, joins, shard_list, processes):
+    '''
+    yield the objects of the shards as they arrive
+    '''
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(_list_shard, settings, object_type, attrs,
+                            shard_filter, shard_vars, joins)
+            for shard_filter, shard_vars in shard_list]
+        for future in as_completed(futures):
+            for obj in future.result():
+                yield obj
+
+
+def snapshot_sharded(objects, object_type, directory, shards=None, by='range',
+                     attrs=None, filters=None, filter_vars=None, joins=None,
+                     processes=None):
+    '''
+    write the shards to snapshot files in worker processes
+
+    :param directory: directory of the snapshot files, one per shard
+    :type directory: string
+    :returns: the merged snapshot
+    :rtype: ShardedSnapshot
+    '''
+
+    from icinga2api.snapshot import Snapshot
+
+    shards = shards or multiprocessing.cpu_count()
+    settings = client_settings(objects.manager)
+    shard_list = shard_filters(objects, object_type, shards, by, filters,
+                               filter_vars)
+    paths = [os.path.join(directory, '{}-{}.snap'.format(object_type, number))
+             for number in range(len(shard_list))]
+    with ProcessPoolExecutor(max_workers=processes or shards) as executor:
+        futures = [
+            executor.submit(_snapshot_shard, settings, object_type, path,
+                            attrs, shard_filter, shard_vars, joins)
+            for path, (shard_filter, shard_vars) in zip(paths, shard_list)]
+        for future in futures:
+            future.result()
+    return ShardedSnapshot([Snapshot(path) for path in paths])
+
+
+class ShardedSnapshot(object):
+    '''
+    read the snapshots of disjoint shards as one
+    '''
+
+    def __init__(self, snapshots):
+        '''
+        initialize object
+
+        :param snapshots: the snapshots of the shards
+        :type snapshots: list
+        '''
+
+        self.snapshots = snapshots
+        self._shard_of = None
+
+    def _shard_table(self):
+        if self._shard_of is None:
+            self._shard_of = {}
+            for snapshot in self.snapshots:
+                for name in snapshot.names():
+                    self._shard_of[name] = snapshot
+        return self._shard_of
+
+    def __len__(self):
+        return sum(len(snapshot) for snapshot in self.snapshots)
+
+    def __contains__(self, name):
+        return name in self._shard_table()
+
+    def __iter__(self):
+        for snapshot in self.snapshots:
+            for obj in snapshot:
+                yield obj
+
+    def names(self):
+        '''
+        return the names of all objects
+
+        :returns: the names
+        :rtype: list
+        '''
+
+        return [name for snapshot in self.snapshots
+                for name in snapshot.names()]
+
+    def get(self, name):
+        '''
+        return an object by name
+
+        :param name: the name of the object
+        :type name: string
+        :returns: the object
+        :rtype: dictionary
+        '''
+
+        try:
+            snapshot = self._shard_table()[name]
+        except KeyError:
+            raise KeyError(name)
+        return snapshot.get(name)
+
+    def close(self):
+        '''
+        close the snapshots
+        '''
+
+        for snapshot in self.snapshots:
+            snapshot.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
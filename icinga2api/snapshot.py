@@ -0,0 +1,585 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API object snapshots
+
+A snapshot stores a listing of objects in a compact binary file:
+
+    header | records | string table | string offsets | index | meta | footer
+
+All strings (keys and values) are stored once in the string table and records
+reference them by number. The index holds the name, position and a content
+digest of every record. Records which are unchanged compared to a base
+snapshot are not stored again but reference the file holding their bytes,
+the base or one of its sources, so reading a record opens at most one other
+file however long the chain of deltas is.
+'''
+
+from __future__ import print_function
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+import uuid
+
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.filters import select
+
+LOG = logging.getLogger(__name__)
+
+MAGIC = b'I2SNAP02'
+FLOAT = struct.Struct('<d')
+STRING_OFFSET = struct.Struct('<I')
+# index entry: name, record position, record length, digest, source (0 for
+# this file, else the number of the file in meta['sources'] plus one)
+INDEX_ENTRY = struct.Struct('<IQI8sH')
+# string table position, string count, string offsets position,
+# index position, index count, meta position, magic
+FOOTER = struct.Struct('<QQQQQQ8s')
+TAG_NONE = 0
+TAG_TRUE = 1
+TAG_FALSE = 2
+TAG_INT = 3
+TAG_FLOAT = 4
+TAG_STRING = 5
+TAG_LIST = 6
+TAG_DICT = 7
+
+try:
+    TEXT_TYPES = (str, unicode)  # pylint: disable=undefined-variable
+    INT_TYPES = (int, long)  # pylint: disable=undefined-variable
+except NameError:
+    TEXT_TYPES = (str,)
+    INT_TYPES = (int,)
+
+
+def _write_varint(buf, value):
+    '''
+    append an unsigned integer as varint
+    '''
+
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _read_varint(buf, pos):
+    '''
+    read a varint, return the value and the new position
+    '''
+
+    value = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+class SnapshotWriter(object):
+    '''
+    Write objects to a snapshot file
+    '''
+
+    def __init__(self, path, object_type=None, base=None):
+        '''
+        initialize object
+
+        :param path: the snapshot file
+        :type path: string
+        :param object_type: the type of the objects
+        :type object_type: string
+        :param base: store only changes compared to this snapshot
+        :type base: Snapshot
+        '''
+
+        self.path = path
+        self.object_type = object_type
+        self.base = base
+        self.count = 0
+        self.unchanged = 0
+        self._strings = {}
+        self._index = []
+        # files holding referenced records: (path, id), number by id
+        self._sources = []
+        self._source_numbers = {}
+        self._base_records = base.locations() if base is not None else {}
+        target = os.path.realpath(path)
+        if base is not None and target in set(
+                os.path.realpath(record[1])
+                for record in self._base_records.values()) | set(
+                    [os.path.realpath(base.path)]):
+            raise Icinga2ApiException(
+                'Snapshot "{}" can\'t replace its own base.'.format(path))
+        self._handle = open(path, 'wb')
+        self._handle.write(MAGIC)
+
+    def _intern(self, value):
+        '''
+        return the number of a string in the string table
+        '''
+
+        try:
+            return self._strings[value]
+        except KeyError:
+            number = self._strings[value] = len(self._strings)
+            return number
+
+    def _encode(self, value, buf):
+        '''
+        encode a value into buf
+        '''
+
+        if value is None:
+            buf.append(TAG_NONE)
+        elif value is True:
+            buf.append(TAG_TRUE)
+        elif value is False:
+            buf.append(TAG_FALSE)
+        elif isinstance(value, INT_TYPES):
+            buf.append(TAG_INT)
+            _write_varint(buf, (value << 1) if value >= 0
+                          else ((-value) << 1) - 1)
+        elif isinstance(value, float):
+            buf.append(TAG_FLOAT)
+            buf.extend(FLOAT.pack(value))
+        elif isinstance(value, TEXT_TYPES):
+            buf.append(TAG_STRING)
+            _write_varint(buf, self._intern(value))
+        elif isinstance(value, (list, tuple)):
+            buf.append(TAG_LIST)
+            _write_varint(buf, len(value))
+            for item in value:
+                self._encode(item, buf)
+        elif isinstance(value, dict):
+            buf.append(TAG_DICT)
+            _write_varint(buf, len(value))
+            for key, item in value.items():
+                self._encode(key, buf)
+                self._encode(item, buf)
+        else:
+            raise Icinga2ApiException(
+                'Can\'t store value of type "{}" in a snapshot.'.format(
+                    type(value).__name__
+                ))
+
+    def add(self, obj):
+        '''
+        add an object as returned by Objects.list()
+
+        :param obj: the object
+        :type obj: dictionary
+        '''
+
+        # the digest must not depend on the string table of this file
+        digest = hashlib.sha1(json.dumps(
+            obj, sort_keys=True, separators=(',', ':')
+        ).encode('utf-8')).digest()[:8]
+        name = obj['name']
+
+        # records the base references from its own base are stored again
+        known = self._base_records.get(name)
+        if known is not None and known[0] == digest:
+            self.unchanged += 1
+            _, path, source_id, position, length = known
+            self._index.append((self._intern(name), position, length, digest,
+                                self._source(path, source_id)))
+        else:
+            buf = bytearray()
+            self._encode(obj, buf)
+            position = self._handle.tell()
+            self._handle.write(buf)
+            self._index.append(
+                (self._intern(name), position, len(buf), digest, 0))
+        self.count += 1
+
+    def _source(self, path, source_id):
+        '''
+        return the number of a file holding referenced records
+        '''
+
+        number = self._source_numbers.get(source_id)
+        if number is None:
+            self._sources.append((path, source_id))
+            number = self._source_numbers[source_id] = len(self._sources)
+        return number
+
+    def close(self):
+        '''
+        write string table, index and footer and close the file
+        '''
+
+        handle = self._handle
+        strings = sorted(self._strings, key=self._strings.get)
+
+        strings_position = handle.tell()
+        offsets = bytearray(STRING_OFFSET.pack(0))
+        size = 0
+        for string in strings:
+            text = string.encode('utf-8')
+            handle.write(text)
+            size += len(text)
+            offsets.extend(STRING_OFFSET.pack(size))
+        offsets_position = handle.tell()
+        handle.write(offsets)
+
+        index_position = handle.tell()
+        for entry in self._index:
+            handle.write(INDEX_ENTRY.pack(*entry))
+
+        meta = {
+            'id': uuid.uuid4().hex,
+            'object_type': self.object_type,
+            'created': time.time(),
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if self.base is not None:
+            meta['base'] = os.path.relpath(
+                os.path.abspath(self.base.path), directory)
+            meta['base_id'] = self.base.meta['id']
+        meta['sources'] = [
+            {'path': os.path.relpath(path, directory), 'id': source_id}
+            for path, source_id in self._sources]
+        meta_position = handle.tell()
+        handle.write(json.dumps(meta).encode('utf-8'))
+
+        handle.write(FOOTER.pack(strings_position, len(strings),
+                                 offsets_position, index_position,
+                                 len(self._index), meta_position, MAGIC))
+        handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._handle.close()
+
+
+class Snapshot(object):
+    '''
+    Read a snapshot file
+
+    The file is memory-mapped, opening is independent of the number of
+    objects. Strings, the name lookup table and objects are decoded on demand.
+    '''
+
+    def __init__(self, path):
+        '''
+        initialize object
+
+        :param path: the snapshot file
+        :type path: string
+        '''
+
+        self.path = path
+        with open(path, 'rb') as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < len(MAGIC) + FOOTER.size or \
+                self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise Icinga2ApiException(
+                'File "{}" is not a snapshot.'.format(path))
+        (self._strings_position,
+         self._strings_count,
+         self._offsets_position,
+         self._index_position,
+         self._count,
+         meta_position,
+         _) = FOOTER.unpack_from(self._map, len(self._map) - FOOTER.size)
+        self.meta = json.loads(self._map[
+            meta_position:len(self._map) - FOOTER.size].decode('utf-8'))
+        self._string_cache = {}
+        self._names = None
+        self._digests = None
+        self._sources = {}
+
+    @property
+    def object_type(self):
+        '''
+        the type of the objects
+        '''
+
+        return self.meta.get('object_type')
+
+    def _source_path(self, number):
+        '''
+        return the absolute path of a source file
+        '''
+
+        return os.path.join(os.path.dirname(os.path.abspath(self.path)),
+                            self.meta['sources'][number - 1]['path'])
+
+    def _source(self, number):
+        '''
+        return the opened snapshot holding the records of a source
+        '''
+
+        source = self._sources.get(number)
+        if source is None:
+            path = self._source_path(number)
+            source = Snapshot(path)
+            if source.meta['id'] != self.meta['sources'][number - 1]['id']:
+                source.close()
+                raise Icinga2ApiException(
+                    'Base snapshot "{}" has been replaced.'.format(path))
+            self._sources[number] = source
+        return source
+
+    def _string(self, number):
+        '''
+        return a string from the string table
+        '''
+
+        try:
+            return self._string_cache[number]
+        except KeyError:
+            start, end = struct.unpack_from(
+                '<II', self._map,
+                self._offsets_position + number * STRING_OFFSET.size)
+            start += self._strings_position
+            end += self._strings_position
+            value = self._string_cache[number] = \
+                self._map[start:end].decode('utf-8')
+            return value
+
+    def _entry(self, number):
+        '''
+        return an index entry
+        '''
+
+        return INDEX_ENTRY.unpack_from(
+            self._map, self._index_position + number * INDEX_ENTRY.size)
+
+    def _decode(self, buf, pos):
+        '''
+        decode a value, return the value and the new position
+        '''
+
+        tag = buf[pos]
+        pos += 1
+        if tag == TAG_STRING:
+            number, pos = _read_varint(buf, pos)
+            return self._string(number), pos
+        if tag == TAG_DICT:
+            count, pos = _read_varint(buf, pos)
+            value = {}
+            for _ in range(count):
+                key, pos = self._decode(buf, pos)
+                value[key], pos = self._decode(buf, pos)
+            return value, pos
+        if tag == TAG_LIST:
+            count, pos = _read_varint(buf, pos)
+            value = []
+            for _ in range(count):
+                item, pos = self._decode(buf, pos)
+                value.append(item)
+            return value, pos
+        if tag == TAG_INT:
+            number, pos = _read_varint(buf, pos)
+            if number & 1:
+                return -((number + 1) >> 1), pos
+            return number >> 1, pos
+        if tag == TAG_FLOAT:
+            return FLOAT.unpack_from(buf, pos)[0], pos + FLOAT.size
+        if tag == TAG_NONE:
+            return None, pos
+        if tag == TAG_TRUE:
+            return True, pos
+        if tag == TAG_FALSE:
+            return False, pos
+        raise Icinga2ApiException(
+            'Snapshot "{}" is corrupt.'.format(self.path))
+
+    def _load(self, number):
+        '''
+        decode the object of an index entry
+        '''
+
+        _, position, length, _, source = self._entry(number)
+        snapshot = self._source(source) if source else self
+        # pylint: disable=protected-access
+        buf = bytearray(snapshot._map[position:position + length])
+        return snapshot._decode(buf, 0)[0]
+
+    def _name_table(self):
+        '''
+        return a dictionary mapping names to index entries
+        '''
+
+        if self._names is None:
+            self._names = dict(
+                (self._string(self._entry(number)[0]), number)
+                for number in range(self._count)
+            )
+        return self._names
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, name):
+        return name in self._name_table()
+
+    def __iter__(self):
+        for number in range(self._count):
+            yield self._load(number)
+
+    def names(self):
+        '''
+        return the names of all objects
+
+        :returns: the names
+        :rtype: list
+        '''
+
+        return [self._string(self._entry(number)[0])
+                for number in range(self._count)]
+
+    def get(self, name):
+        '''
+        return an object by name
+
+        :param name: the name of the object
+        :type name: string
+        :returns: the object
+        :rtype: dictionary
+        '''
+
+        try:
+            number = self._name_table()[name]
+        except KeyError:
+            raise KeyError(name)
+        return self._load(number)
+
+    def filter(self, expression, filter_vars=None):
+        '''
+        return the objects matching a filter expression, evaluated locally
+
+        :param expression: the filter expression, e.g. 'host.state != 0'
+        :type expression: string
+        :param filter_vars: variables used in the expression
+        :type filter_vars: dictionary
+        :returns: the matching objects
+        :rtype: list
+        '''
+
+        return select(self, expression, filter_vars)
+
+    def digests(self):
+        '''
+        return the content digests of all objects
+
+        :returns: name to digest mapping
+        :rtype: dictionary
+        '''
+
+        if self._digests is None:
+            self._digests = {}
+            for number in range(self._count):
+                name, _, _, digest, _ = self._entry(number)
+                self._digests[self._string(name)] = digest
+        return self._digests
+
+    def stored_digests(self):
+        '''
+        return the content digests of the objects stored in this file, not
+        referencing the base snapshot
+
+        :returns: name to digest mapping
+        :rtype: dictionary
+        '''
+
+        digests = {}
+        for number in range(self._count):
+            name, _, _, digest, source = self._entry(number)
+            if not source:
+                digests[self._string(name)] = digest
+        return digests
+
+    def locations(self):
+        '''
+        return where the bytes of every record are stored
+
+        :returns: name to (digest, path, snapshot id, position, length) of
+            the file holding the record
+        :rtype: dictionary
+        '''
+
+        path = os.path.abspath(self.path)
+        locations = {}
+        for number in range(self._count):
+            name, position, length, digest, source = self._entry(number)
+            if source:
+                location = (self._source_path(source),
+                            self.meta['sources'][source - 1]['id'])
+            else:
+                location = (path, self.meta['id'])
+            locations[self._string(name)] = (digest,) + location + (
+                position, length)
+        return locations
+
+    def diff(self, other):
+        '''
+        compare the snapshot to an older one without decoding the objects
+
+        :param other: the older snapshot
+        :type other: Snapshot
+        :returns: names of the added, removed and changed objects
+        :rtype: dictionary
+        '''
+
+        new = self.digests()
+        old = other.digests()
+        return {
+            'added': sorted(name for name in new if name not in old),
+            'removed': sorted(name for name in old if name not in new),
+            'changed': sorted(name for name, digest in new.items()
+                              if name in old and old[name] != digest),
+        }
+
+    def close(self):
+        '''
+        close the snapshot and the opened source files
+        '''
+
+        self._map.close()
+        for source in self._sources.values():
+            source.close()
+        self._sources.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
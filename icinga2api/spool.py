@@ -0,0 +1,566 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API event spool
+
+Persist an event stream to an append-only, segmented log on disk.
+'''
+
+from __future__ import print_function
+import bisect
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from icinga2api.exceptions import Icinga2ApiException
+
+LOG = logging.getLogger(__name__)
+
+# record header in the log: payload length, timestamp
+RECORD_HEADER = struct.Struct('<Id')
+# index entry: position of the record in the log, timestamp
+INDEX_ENTRY = struct.Struct('<Qd')
+
+
+class _Segment(object):
+    '''
+    a log segment and its offset index
+    '''
+
+    def __init__(self, directory, base_offset):
+        self.base_offset = base_offset
+        name = os.path.join(directory, '{0:020d}'.format(base_offset))
+        self.log_path = name + '.log'
+        self.index_path = name + '.idx'
+
+    def entries(self):
+        '''
+        number of complete index entries
+        '''
+
+        if not os.path.exists(self.index_path):
+            return 0
+        return os.path.getsize(self.index_path) // INDEX_ENTRY.size
+
+    def size(self):
+        '''
+        size of the log and index in bytes
+        '''
+
+        size = 0
+        for path in (self.log_path, self.index_path):
+            if os.path.exists(path):
+                size += os.path.getsize(path)
+        return size
+
+    def _timestamp(self, entry):
+        '''
+        timestamp of an index entry
+        '''
+
+        with open(self.index_path, 'rb') as index:
+            index.seek(entry * INDEX_ENTRY.size)
+            return INDEX_ENTRY.unpack(index.read(INDEX_ENTRY.size))[1]
+
+    def first_timestamp(self):
+        '''
+        timestamp of the oldest record or None
+        '''
+
+        if not self.entries():
+            return None
+        return self._timestamp(0)
+
+    def last_timestamp(self):
+        '''
+        timestamp of the newest record or None
+        '''
+
+        entries = self.entries()
+        if not entries:
+            return None
+        return self._timestamp(entries - 1)
+
+    def remove(self):
+        '''
+        delete the segment files
+        '''
+
+        for path in (self.log_path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class EventSpool(object):
+    '''
+    Icinga 2 API event spool
+
+    Events are appended to segment files in `directory`. Every event gets a
+    sequential offset; consumers replay from an offset or a timestamp and store
+    their position with `commit()` to catch up after a restart.
+
+    The retention limits are applied on opening, on rotation and after every
+    fsync. With retention_seconds a segment is also rotated once its oldest
+    event is that old, so events are kept at most about twice as long.
+    '''
+
+    def __init__(self,
+                 directory,
+                 segment_bytes=64 * 1024 * 1024,
+                 fsync_every=1000,
+                 fsync_interval=1.0,
+                 max_segments=None,
+                 retention_bytes=None,
+                 retention_seconds=None,
+                 clock=time.time):
+        '''
+        initialize object
+
+        :param directory: directory for the segment files
+        :type directory: string
+        :param segment_bytes: start a new segment when this size is reached
+        :type segment_bytes: int
+        :param fsync_every: fsync after this many events
+        :type fsync_every: int
+        :param fsync_interval: fsync at least every this many seconds
+        :type fsync_interval: float
+        :param max_segments: keep at most this many segments
+        :type max_segments: int
+        :param retention_bytes: keep at most this many bytes
+        :type retention_bytes: int
+        :param retention_seconds: delete segments with only older events
+        :type retention_seconds: float
+        :param clock: function returning the current time in seconds
+        :type clock: callable
+        '''
+
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.max_segments = max_segments
+        self.retention_bytes = retention_bytes
+        self.retention_seconds = retention_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._log = None
+        self._index = None
+        self._unsynced = 0
+        self._last_sync = clock()
+        self._last_timestamp = 0.0
+        # timestamp of the first event of the current segment
+        self._segment_start = None
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._segments = [
+            _Segment(directory, int(file_name[:-4]))
+            for file_name in sorted(os.listdir(directory))
+            if file_name.endswith('.log') and file_name[:-4].isdigit()
+        ]
+        if not self._segments:
+            self._segments.append(_Segment(directory, 0))
+        self._next_offset = self._recover(self._segments[-1])
+        # appended timestamps must not go back behind the recovered ones
+        for segment in reversed(self._segments):
+            last_timestamp = segment.last_timestamp()
+            if last_timestamp is not None:
+                self._last_timestamp = last_timestamp
+                break
+        self._open_segment(self._segments[-1])
+        if self.retention_seconds and self._segment_start is not None and \
+                self._segment_start < clock() - self.retention_seconds:
+            # let the expired events of the current segment be deleted
+            self._rotate()
+        else:
+            self._apply_retention()
+
+    @staticmethod
+    def _recover(segment):
+        '''
+        drop a torn write at the end of the segment and return the next offset
+        '''
+
+        entries = segment.entries()
+        log_size = 0
+        if os.path.exists(segment.log_path):
+            log_size = os.path.getsize(segment.log_path)
+        end = 0
+        if entries:
+            with open(segment.index_path, 'rb') as index, \
+                    open(segment.log_path, 'rb') as log:
+                while entries:
+                    index.seek((entries - 1) * INDEX_ENTRY.size)
+                    position = INDEX_ENTRY.unpack(
+                        index.read(INDEX_ENTRY.size))[0]
+                    log.seek(position)
+                    header = log.read(RECORD_HEADER.size)
+                    if len(header) == RECORD_HEADER.size:
+                        length = RECORD_HEADER.unpack(header)[0]
+                        end = position + RECORD_HEADER.size + length
+                        if end <= log_size:
+                            break
+                    entries -= 1
+                    end = 0
+        if os.path.exists(segment.index_path):
+            with open(segment.index_path, 'r+b') as index:
+                index.truncate(entries * INDEX_ENTRY.size)
+        if log_size != end:
+            LOG.warning('Truncating spool segment "%s" to %d bytes.',
+                        segment.log_path, end)
+            with open(segment.log_path, 'ab') as log:
+                log.truncate(end)
+
+        return segment.base_offset + entries
+
+    def _open_segment(self, segment):
+        '''
+        open the segment for appending
+        '''
+
+        self._log = open(segment.log_path, 'ab')
+        self._index = open(segment.index_path, 'ab')
+        self._segment_start = segment.first_timestamp()
+
+    def _sync(self):
+        '''
+        flush the current segment to disk
+        '''
+
+        for handle in (self._log, self._index):
+            handle.flush()
+            os.fsync(handle.fileno())
+        self._unsynced = 0
+        self._last_sync = self.clock()
+
+    def _rotate(self):
+        '''
+        start a new segment and apply the retention limits
+        '''
+
+        self._sync()
+        self._log.close()
+        self._index.close()
+        segment = _Segment(self.directory, self._next_offset)
+        self._segments.append(segment)
+        self._open_segment(segment)
+        self._apply_retention()
+
+    def _apply_retention(self):
+        '''
+        delete the oldest segments exceeding the retention limits
+        '''
+
+        now = self.clock()
+        while len(self._segments) > 1:
+            oldest = self._segments[0]
+            expired = False
+            if self.max_segments and len(self._segments) > self.max_segments:
+                expired = True
+            elif self.retention_bytes and \
+                    sum(s.size() for s in self._segments) > self.retention_bytes:
+                expired = True
+            elif self.retention_seconds:
+                last_timestamp = oldest.last_timestamp()
+                expired = last_timestamp is None or \
+                    last_timestamp < now - self.retention_seconds
+            if not expired:
+                break
+            LOG.debug('Removing spool segment "%s".', oldest.log_path)
+            oldest.remove()
+            self._segments.pop(0)
+
+    def append(self, message, timestamp=None):
+        '''
+        append an event to the spool
+
+        :param message: the event
+        :type message: string
+        :param timestamp: the timestamp, defaults to the current time
+        :type timestamp: float
+        :returns: the offset of the event
+        :rtype: int
+        '''
+
+        if not isinstance(message, bytes):
+            message = message.encode('utf-8')
+        with self._lock:
+            if self._log is None:
+                raise Icinga2ApiException('Event spool is closed.')
+            if timestamp is None:
+                timestamp = self.clock()
+            # keep the index sorted by timestamp
+            timestamp = max(timestamp, self._last_timestamp)
+            self._last_timestamp = timestamp
+
+            position = self._log.tell()
+            self._log.write(RECORD_HEADER.pack(len(message), timestamp))
+            self._log.write(message)
+            self._index.write(INDEX_ENTRY.pack(position, timestamp))
+            offset = self._next_offset
+            self._next_offset += 1
+
+            if self._segment_start is None:
+                self._segment_start = timestamp
+
+            self._unsynced += 1
+            if self._log.tell() >= self.segment_bytes or \
+                    (self.retention_seconds and timestamp -
+                     self._segment_start >= self.retention_seconds):
+                self._rotate()
+            elif self._unsynced >= self.fsync_every or \
+                    self.clock() - self._last_sync >= self.fsync_interval:
+                self._sync()
+                self._apply_retention()
+
+        return offset
+
+    def consume(self,
+                events,
+                types,
+                queue,
+                filters=None,
+                filter_vars=None,
+                coalesce=None,
+                limit=None):
+        '''
+        subscribe to an event stream and append all events to the spool
+
+        example 1:
+        spool = EventSpool('/var/spool/icinga2api')
+        spool.consume(client.events, ['CheckResult'], 'spool')
+
+        :param events: the events endpoint, e.g. client.events
+        :type events: Events
+        :param types: the event types to return
+        :type types: array
+        :param queue: the queue name to subscribe to
+        :type queue: string
+        :param filters: filters matched object(s)
+        :type filters: string
+        :param filter_vars: variables used in the filters expression
+        :type filter_vars: dict
+        :param coalesce: coalescing window in seconds or an EventCoalescer
+        :type coalesce: float
+        :param limit: stop after this many events
+        :type limit: int
+        :returns: the offset of the last appended event
+        :rtype: int
+        '''
+
+        offset = None
+        count = 0
+        stream = events.subscribe(types, queue, filters, filter_vars,
+                                  coalesce=coalesce)
+        try:
+            for message in stream:
+                offset = self.append(message)
+                count += 1
+                if limit and count >= limit:
+                    break
+        finally:
+            stream.close()
+            with self._lock:
+                if self._log is not None:
+                    self._sync()
+
+        return offset
+
+    @property
+    def first_offset(self):
+        '''
+        the oldest offset still available
+        '''
+
+        return self._segments[0].base_offset
+
+    @property
+    def next_offset(self):
+        '''
+        the offset the next event will get
+        '''
+
+        return self._next_offset
+
+    def _find_timestamp(self, segments, timestamp):
+        '''
+        return the first offset with an event not older than timestamp
+        '''
+
+        for segment in segments:
+            entries = segment.entries()
+            if not entries:
+                continue
+            with open(segment.index_path, 'rb') as handle:
+                index = mmap.mmap(handle.fileno(), entries * INDEX_ENTRY.size,
+                                  access=mmap.ACCESS_READ)
+            try:
+                low, high = 0, entries
+                while low < high:
+                    middle = (low + high) // 2
+                    if INDEX_ENTRY.unpack_from(
+                            index, middle * INDEX_ENTRY.size)[1] < timestamp:
+                        low = middle + 1
+                    else:
+                        high = middle
+            finally:
+                index.close()
+            if low < entries:
+                return segment.base_offset + low
+
+        return self._next_offset
+
+    def replay(self, offset=None, since=None):
+        '''
+        yield the spooled events starting at an offset or a timestamp
+
+        example 1:
+        for offset, timestamp, event in spool.replay(spool.committed('report')):
+            handle(event)
+            spool.commit('report', offset + 1)
+
+        example 2:
+        for offset, timestamp, event in spool.replay(since=time.time() - 3600):
+            print(event)
+
+        :param offset: first offset to return, defaults to the oldest one
+        :type offset: int
+        :param since: return only events not older than this timestamp
+        :type since: float
+        :returns: offset, timestamp and event
+        :rtype: tuple
+        '''
+
+        with self._lock:
+            if self._log is not None:
+                self._log.flush()
+                self._index.flush()
+            segments = list(self._segments)
+
+        if offset is None or offset < segments[0].base_offset:
+            offset = segments[0].base_offset
+        if since is not None:
+            offset = max(offset, self._find_timestamp(segments, since))
+
+        bases = [segment.base_offset for segment in segments]
+        position = max(bisect.bisect_right(bases, offset) - 1, 0)
+        for segment in segments[position:]:
+            entries = segment.entries()
+            first = offset - segment.base_offset
+            if first >= entries:
+                continue
+            for record in self._read_segment(segment, first, entries):
+                yield record
+            offset = segment.base_offset + entries
+
+    @staticmethod
+    def _read_segment(segment, first, entries):
+        '''
+        yield the records first..entries of a segment using mmap
+        '''
+
+        with open(segment.index_path, 'rb') as handle:
+            index = mmap.mmap(handle.fileno(), entries * INDEX_ENTRY.size,
+                              access=mmap.ACCESS_READ)
+        try:
+            end, _ = INDEX_ENTRY.unpack_from(
+                index, (entries - 1) * INDEX_ENTRY.size)
+            with open(segment.log_path, 'rb') as handle:
+                handle.seek(end)
+                length = RECORD_HEADER.unpack(
+                    handle.read(RECORD_HEADER.size))[0]
+                log = mmap.mmap(handle.fileno(),
+                                end + RECORD_HEADER.size + length,
+                                access=mmap.ACCESS_READ)
+            try:
+                for entry in range(first, entries):
+                    position, timestamp = INDEX_ENTRY.unpack_from(
+                        index, entry * INDEX_ENTRY.size)
+                    length = RECORD_HEADER.unpack_from(log, position)[0]
+                    start = position + RECORD_HEADER.size
+                    yield (segment.base_offset + entry,
+                           timestamp,
+                           log[start:start + length].decode('utf-8'))
+            finally:
+                log.close()
+        finally:
+            index.close()
+
+    def _offset_path(self, consumer):
+        '''
+        path of the file storing the offset of a consumer
+        '''
+
+        return os.path.join(self.directory, '{0}.offset'.format(consumer))
+
+    def commit(self, consumer, offset):
+        '''
+        store the offset a consumer continues with after a restart
+
+        :param consumer: name of the consumer
+        :type consumer: string
+        :param offset: the next offset to read
+        :type offset: int
+        '''
+
+        path = self._offset_path(consumer)
+        with open(path + '.tmp', 'w') as handle:
+            handle.write(str(offset))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.rename(path + '.tmp', path)
+
+    def committed(self, consumer):
+        '''
+        return the stored offset of a consumer or None
+
+        :param consumer: name of the consumer
+        :type consumer: string
+        :returns: the next offset to read
+        :rtype: int
+        '''
+
+        path = self._offset_path(consumer)
+        if not os.path.exists(path):
+            return None
+        with open(path) as handle:
+            return int(handle.read().strip())
+
+    def close(self):
+        '''
+        flush and close the spool
+        '''
+
+        with self._lock:
+            if self._log is None:
+                return
+            self._sync()
+            self._log.close()
+            self._index.close()
+            self._log = None
+            self._index = None
@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API check result submitter
+
+Submit passive check results in the background.
+'''
+
+from __future__ import print_function
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.scheduler import carry
+
+LOG = logging.getLogger(__name__)
+
+
+class CheckResultSubmitter(object):
+    '''
+    Queue check results and send them with background workers
+
+    submit() never blocks: results are kept in a bounded queue and, if the
+    queue is full, appended to an optional spill file. A newer result for an
+    object replaces a queued older one. Workers send the results over pooled
+    connections and retry transient failures (connection errors and 5xx
+    responses).
+    '''
+
+    def __init__(self,
+                 actions,
+                 workers=4,
+                 max_queue=10000,
+                 batch_size=100,
+                 spill_path=None,
+                 max_retries=3,
+                 retry_delay=1.0):
+        '''
+        initialize object
+
+        :param actions: the actions endpoint, e.g. client.actions
+        :type actions: Actions
+        :param workers: number of background workers
+        :type workers: int
+        :param max_queue: maximum number of queued results
+        :type max_queue: int
+        :param batch_size: results a worker takes from the queue at once
+        :type batch_size: int
+        :param spill_path: append results to this file if the queue is full
+        :type spill_path: string
+        :param max_retries: retries of a failed result
+        :type max_retries: int
+        :param retry_delay: seconds before the first retry, doubled per retry
+        :type retry_delay: float
+        '''
+
+        self.actions = actions
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.spill_path = spill_path
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.submitted = 0
+        self.superseded = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+        self._latencies = collections.deque(maxlen=1000)
+        self._queue = collections.OrderedDict()
+        self._busy = 0
+        # keys being sent, newer results of them wait in the queue
+        self._in_flight = set()
+        self._spill_offset = 0
+        self._spill_size = 0
+        if spill_path and os.path.exists(spill_path):
+            # results spilled before a restart
+            self._spill_size = os.path.getsize(spill_path)
+        self._closed = False
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._workers = []
+        for number in range(workers):
+            worker = threading.Thread(
+                target=carry(self._work),
+                name='CheckResultSubmitter-{0}'.format(number))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self,
+               object_type,
+               name,
+               exit_status,
+               plugin_output,
+               performance_data=None,
+               check_command=None,
+               check_source=None):
+        '''
+        queue a check result, see Actions.process_check_result()
+
+        :returns: False if the result was dropped
+        :rtype: bool
+        '''
+
+        if object_type not in ['Host', 'Service']:
+            raise Icinga2ApiException(
+                'object_type needs to be "Host" or "Service".'
+            )
+        item = {
+            'object_type': object_type,
+            'name': name,
+            'exit_status': exit_status,
+            'plugin_output': plugin_output,
+            'performance_data': performance_data,
+            'check_command': check_command,
+            'check_source': check_source,
+            'submitted': time.time(),
+        }
+        with self._lock:
+            if self._closed:
+                raise Icinga2ApiException('Submitter is closed.')
+            self.submitted += 1
+            return self._enqueue(item)
+
+    def _enqueue(self, item):
+        '''
+        queue, spill or drop an item, the lock must be held
+        '''
+
+        key = (item['object_type'], item['name'])
+        if key in self._queue:
+            self.superseded += 1
+            self._queue[key] = item
+        elif len(self._queue) < self.max_queue and not self._spill_pending():
+            self._queue[key] = item
+        elif self.spill_path:
+            self._spill(item)
+        else:
+            self.dropped += 1
+            LOG.warning('Check result queue is full, dropping result for %s.',
+                        item['name'])
+            return False
+        self._changed.notify()
+        return True
+
+    def _spill(self, item):
+        '''
+        append an item to the spill file, the lock must be held
+        '''
+
+        line = json.dumps(item) + '\n'
+        with open(self.spill_path, 'a') as spill:
+            spill.write(line)
+        self._spill_size += len(line.encode('utf-8'))
+        self.spilled += 1
+
+    def _spill_pending(self):
+        '''
+        True if the spill file has unread results
+        '''
+
+        return self._spill_size > self._spill_offset
+
+    def _refill(self):
+        '''
+        move spilled results back into the queue, the lock must be held
+        '''
+
+        if not self._spill_pending():
+            return
+        with open(self.spill_path) as spill:
+            spill.seek(self._spill_offset)
+            while len(self._queue) < self.max_queue:
+                line = spill.readline()
+                if not line.endswith('\n'):
+                    break
+                self._spill_offset = spill.tell()
+                item = json.loads(line)
+                key = (item['object_type'], item['name'])
+                queued = self._queue.get(key)
+                if queued is None:
+                    self._queue[key] = item
+                else:
+                    self.superseded += 1
+                    if queued['submitted'] < item['submitted']:
+                        self._queue[key] = item
+        if not self._spill_pending():
+            os.remove(self.spill_path)
+            self._spill_offset = 0
+            self._spill_size = 0
+
+    def _take(self):
+        '''
+        wait for and return a batch of items, None when closed
+        '''
+
+        with self._lock:
+            while True:
+                if len(self._queue) <= self.max_queue // 2:
+                    self._refill()
+                batch = []
+                for key in list(self._queue):
+                    if len(batch) >= self.batch_size:
+                        break
+                    if key not in self._in_flight:
+                        batch.append(self._queue.pop(key))
+                        self._in_flight.add(key)
+                if batch:
+                    self._busy += 1
+                    return batch
+                if self._closed and not self._queue:
+                    return None
+                self._changed.wait()
+
+    def _release(self, item):
+        '''
+        let newer results of an item's object be sent
+        '''
+
+        with self._lock:
+            self._in_flight.discard((item['object_type'], item['name']))
+            self._changed.notify_all()
+
+    def _work(self):
+        '''
+        send batches of results until the submitter is closed
+        '''
+
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            try:
+                for item in batch:
+                    self._send(item)
+            finally:
+                with self._lock:
+                    for item in batch:
+                        self._in_flight.discard(
+                            (item['object_type'], item['name']))
+                    self._busy -= 1
+                    self._changed.notify_all()
+
+    @staticmethod
+    def _transient(error):
+        '''
+        True if sending may succeed later
+        '''
+
+        if isinstance(error, (IOError, OSError)):
+            # includes the Icinga2ApiConnectionError of the transports
+            return True
+        if isinstance(error, Icinga2ApiException):
+            return bool(error.status_code and error.status_code >= 500)
+        return False
+
+    def _send(self, item):
+        '''
+        send one result, then let newer results of the object be sent
+        '''
+
+        try:
+            self._send_retrying(item)
+        finally:
+            self._release(item)
+
+    def _send_retrying(self, item):
+        '''
+        send one result, retrying transient failures
+        '''
+
+        key = (item['object_type'], item['name'])
+        attempt = 0
+        while True:
+            try:
+                self.actions.process_check_result(
+                    item['object_type'],
+                    item['name'],
+                    item['exit_status'],
+                    item['plugin_output'],
+                    performance_data=item['performance_data'],
+                    check_command=item['check_command'],
+                    check_source=item['check_source'])
+            except Exception as error:  # pylint: disable=broad-except
+                if not self._transient(error) or attempt >= self.max_retries:
+                    self._fail(item, error)
+                    return
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+                with self._lock:
+                    if key in self._queue:
+                        # a newer result is waiting, don't resend this one
+                        self.superseded += 1
+                        return
+                continue
+            with self._lock:
+                self.sent += 1
+                self._latencies.append(time.time() - item['submitted'])
+            return
+
+    def _fail(self, item, error):
+        '''
+        spill or give up a result which couldn't be sent
+        '''
+
+        with self._lock:
+            if self.spill_path and self._transient(error):
+                self._spill(item)
+                return
+            self.failed += 1
+        LOG.error('Sending check result for %s failed: %s', item['name'], error)
+
+    def flush(self, timeout=None):
+        '''
+        wait until all queued results are sent
+
+        :param timeout: maximum seconds to wait
+        :type timeout: float
+        :returns: True if the queue is empty
+        :rtype: bool
+        '''
+
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while self._queue or self._busy or self._spill_pending():
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                self._changed.notify_all()
+                self._changed.wait(remaining if remaining is not None else 1)
+        return True
+
+    def close(self, timeout=None):
+        '''
+        send the queued results and stop the workers
+
+        :param timeout: maximum seconds to wait for the queue to drain
+        :type timeout: float
+        :returns: True if the queue is empty
+        :rtype: bool
+        '''
+
+        empty = self.flush(timeout)
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+        return empty
+
+    def stats(self):
+        '''
+        return queue depth, counters and the latency from submit to delivery
+
+        :returns: the statistics
+        :rtype: dictionary
+        '''
+
+        with self._lock:
+            latencies = sorted(self._latencies)
+            result = {
+                'queue_depth': len(self._queue),
+                'spill_bytes': self._spill_size - self._spill_offset,
+                'in_flight': self._busy,
+                'submitted': self.submitted,
+                'superseded': self.superseded,
+                'spilled': self.spilled,
+                'dropped': self.dropped,
+                'sent': self.sent,
+                'retries': self.retries,
+                'failed': self.failed,
+                'latency_avg': 0.0,
+                'latency_p95': 0.0,
+                'latency_max': 0.0,
+            }
+        if latencies:
+            result['latency_avg'] = sum(latencies) / len(latencies)
+            result['latency_p95'] = latencies[int(len(latencies) * 0.95)]
+            result['latency_max'] = latencies[-1]
+        return result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
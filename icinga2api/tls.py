@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API TLS context
+
+One SSL context per client, built from the certificate files on first use and
+rebuilt when they change on disk.
+'''
+
+from __future__ import print_function
+import logging
+import os
+import threading
+import time
+
+LOG = logging.getLogger(__name__)
+
+
+class TlsContext(object):
+    '''
+    Share one SSL context and TLS sessions between connections
+
+    The certificate, key and CA files are checked at most every
+    `check_interval` seconds, if one changed the context is rebuilt and
+    `generation` incremented. Connections wrapped by `wrap_socket` resume the
+    last TLS session of their host (abbreviated handshake).
+    '''
+
+    def __init__(self, certificate=None, key=None, ca_certificate=None,
+                 check_interval=1.0, resume=True, clock=time.time):
+        '''
+        initialize object
+
+        :param certificate: the client certificate (and key) file
+        :type certificate: string
+        :param key: the client key file
+        :type key: string
+        :param ca_certificate: the CA file, don't verify the server if None
+        :type ca_certificate: string
+        :param check_interval: seconds between checks of the files
+        :type check_interval: float
+        :param resume: resume TLS sessions
+        :type resume: bool
+        '''
+
+        self.certificate = certificate
+        self.key = key
+        self.ca_certificate = ca_certificate
+        self.check_interval = check_interval
+        self.resume = resume
+        self.generation = 0
+        self.handshakes = 0
+        self.resumed = 0
+        self.reloads = 0
+        self._clock = clock
+        self._context = None
+        self._stamps = None
+        self._checked = None
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @property
+    def files(self):
+        '''
+        the files the context is built from
+        '''
+
+        return [path for path in (self.certificate, self.key,
+                                  self.ca_certificate) if path]
+
+    def _file_stamps(self):
+        '''
+        return modification time, size and inode of the files
+        '''
+
+        stamps = []
+        for path in self.files:
+            try:
+                stat = os.stat(path)
+                stamps.append((stat.st_mtime, stat.st_size, stat.st_ino))
+            except OSError:
+                stamps.append(None)
+        return stamps
+
+    def _create_context(self):
+        '''
+        create the SSL context from the files
+        '''
+
+        import ssl
+
+        if self.ca_certificate:
+            context = ssl.create_default_context(cafile=self.ca_certificate)
+        else:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        if self.certificate:
+            context.load_cert_chain(self.certificate, self.key)
+        return context
+
+    def check(self):
+        '''
+        rebuild the context if the files changed
+
+        :returns: the generation of the current context
+        :rtype: int
+        '''
+
+        now = self._clock()
+        if self._checked is not None and \
+                now - self._checked < self.check_interval:
+            return self.generation
+        with self._lock:
+            if self._checked is not None and \
+                    now - self._checked < self.check_interval:
+                return self.generation
+            self._checked = now
+            stamps = self._file_stamps()
+            if self._context is not None and stamps == self._stamps:
+                return self.generation
+            try:
+                context = self._create_context()
+            except (IOError, OSError) as error:
+                # e.g. a certificate written but its key not yet
+                if self._context is None:
+                    raise
+                LOG.warning('Keeping the TLS context, loading %s failed: %s',
+                            ', '.join(self.files), error)
+                return self.generation
+            if self._context is not None:
+                self.reloads += 1
+                LOG.info('Reloaded the TLS context from %s',
+                         ', '.join(self.files))
+            self._context = context
+            self._stamps = stamps
+            self._sessions.clear()
+            self.generation += 1
+            return self.generation
+
+    @property
+    def context(self):
+        '''
+        the current SSL context
+        '''
+
+        self.check()
+        return self._context
+
+    def wrap_socket(self, sock, hostname, port=None):
+        '''
+        wrap a connected socket, resume the last TLS session of the host
+
+        :param sock: the connected socket
+        :type sock: socket
+        :param hostname: the server name to send and verify
+        :type hostname: string
+        :returns: the TLS socket
+        :rtype: ssl.SSLSocket
+        '''
+
+        context = self.context
+        cached = self._sessions.get((hostname, port))
+        session = cached[1] if cached and cached[0] is context else None
+        tls_sock = context.wrap_socket(sock, server_hostname=hostname,
+                                       session=session)
+        with self._lock:
+            self.handshakes += 1
+            if tls_sock.session_reused:
+                self.resumed += 1
+        self.save_session(tls_sock, hostname, port)
+        return tls_sock
+
+    def save_session(self, tls_sock, hostname, port=None):
+        '''
+        remember the TLS session of a socket for the next connection
+
+        TLS 1.3 servers send the session ticket after the handshake, save the
+        session again after a response was read.
+        '''
+
+        session = getattr(tls_sock, 'session', None)
+        if self.resume and session is not None and \
+                tls_sock.context is self._context:
+            self._sessions[(hostname, port)] = (tls_sock.context, session)
+
+    def stats(self):
+        '''
+        return the number of handshakes, resumed sessions and reloads
+
+        :returns: handshakes, resumed, reloads and generation
+        :rtype: dictionary
+        '''
+
+        with self._lock:
+            return {
+                'handshakes': self.handshakes,
+                'resumed': self.resumed,
+                'reloads': self.reloads,
+                'generation': self.generation,
+            }
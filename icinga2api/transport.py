@@ -0,0 +1,806 @@
+# -*- coding: utf-8 -*-
+'''
+Copyright 2017 fmnisme@gmail.com
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+this list of conditions and the following disclaimer in the documentation
+and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Icinga 2 API transports
+
+A transport sends the requests of a client. Every request is sent as POST with
+the X-HTTP-Method-Override header. Responses provide `status_code`, `url`,
+`text`, `json()`, `iter_lines()` and `close()`.
+'''
+
+from __future__ import print_function
+import base64
+import json
+import logging
+import threading
+import zlib
+
+from icinga2api.exceptions import Icinga2ApiException
+from icinga2api.exceptions import Icinga2ApiConnectionError
+
+LOG = logging.getLogger(__name__)
+
+METHOD_HEADERS = dict(
+    (method, {'X-HTTP-Method-Override': method.upper()})
+    for method in ('GET', 'POST', 'PUT', 'DELETE')
+)
+
+
+def method_headers(method):
+    '''
+    return the method override header for method
+    '''
+
+    return METHOD_HEADERS.get(method) or \
+        {'X-HTTP-Method-Override': method.upper()}
+
+
+def iter_lines(chunks):
+    '''
+    split a stream of byte chunks into lines
+    '''
+
+    pending = b''
+    for chunk in chunks:
+        if not chunk:
+            continue
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip(b'\r')
+    if pending:
+        yield pending
+
+
+class Transport(object):
+    '''
+    Icinga 2 API transport base class
+    '''
+
+    name = None
+
+    def __init__(self, client):
+        '''
+        initialize object
+
+        :param client: the client holding url, credentials and certificates
+        :type client: Client
+        '''
+
+        self.client = client
+
+    @property
+    def headers(self):
+        '''
+        the headers sent with every request
+        '''
+
+        return {
+            'User-Agent': 'Python-icinga2api/{0}'.format(self.client.version),
+            'Accept': 'application/json',
+            'Accept-Encoding':
+                'gzip, deflate' if self.client.compression else 'identity',
+        }
+
+    def encode(self, payload):
+        '''
+        return the JSON body and its headers, gzip compressed if it is larger
+        than the compress_requests threshold of the client
+
+        :param payload: the payload
+        :type payload: dictionary
+        :returns: the body and the headers
+        :rtype: tuple
+        '''
+
+        body = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        threshold = self.client.compress_requests
+        if threshold is not None and len(body) > threshold:
+            compressor = zlib.compressobj(
+                6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            body = compressor.compress(body) + compressor.flush()
+            headers['Content-Encoding'] = 'gzip'
+        return body, headers
+
+    @property
+    def cert(self):
+        '''
+        the client certificate as file or (certificate, key) tuple
+        '''
+
+        # prefer certificate authentification
+        if self.client.certificate and self.client.key:
+            # certificate and key are in different files
+            return (self.client.certificate, self.client.key)
+        # certificate and key are in the same file, or None
+        return self.client.certificate
+
+    @property
+    def tls(self):
+        '''
+        the TlsContext of the client for HTTPS urls, else None
+        '''
+
+        if self.client.url.lower().startswith('https:'):
+            return self.client.tls
+        return None
+
+    @property
+    def auth(self):
+        '''
+        username and password if no certificate is used
+        '''
+
+        if not self.client.certificate and \
+                self.client.username and self.client.password:
+            return (self.client.username, self.client.password)
+        return None
+
+    def basic_auth_header(self):
+        '''
+        return the Authorization header for basic auth or None
+        '''
+
+        if not self.auth:
+            return None
+        credentials = '{0}:{1}'.format(*self.auth).encode('utf-8')
+        return 'Basic {0}'.format(
+            base64.b64encode(credentials).decode('ascii'))
+
+    def request(self, method, url, payload=None, stream=False):
+        '''
+        send a request
+
+        :param method: the HTTP method, sent as X-HTTP-Method-Override
+        :type method: string
+        :param url: the full url
+        :type url: string
+        :param payload: the JSON payload
+        :type payload: dictionary
+        :param stream: don't read the body, return a streaming response
+        :type stream: bool
+        :returns: the response
+        :raises Icinga2ApiConnectionError: if no response was received
+        '''
+
+        raise NotImplementedError()
+
+    def connection_errors(self):
+        '''
+        return the exception classes of the HTTP library which request()
+        raises as Icinga2ApiConnectionError
+        '''
+
+        return ()
+
+    @staticmethod
+    def connection_error(url, error):
+        '''
+        return the Icinga2ApiConnectionError for an error of the HTTP library
+        '''
+
+        return Icinga2ApiConnectionError(
+            'Request to {0} failed: {1}'.format(url, error))
+
+    def close(self):
+        '''
+        close all connections
+        '''
+
+
+class SessionStream(object):
+    '''
+    streaming response closing the session it was received with
+
+    The session is closed with the response or when its lines are read.
+    '''
+
+    def __init__(self, response, session):
+        self.raw = response
+        self._session = session
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def iter_lines(self):
+        '''
+        yield the body line by line as it arrives
+        '''
+
+        try:
+            for line in self.raw.iter_lines():
+                yield line
+        finally:
+            self.close()
+
+    def close(self):
+        '''
+        close the response and its session
+        '''
+
+        session, self._session = self._session, None
+        if session is not None:
+            try:
+                self.raw.close()
+            finally:
+                session.close()
+
+
+class SessionTransport(Transport):
+    '''
+    a transport using one session object per thread
+    '''
+
+    def __init__(self, client):
+        super(SessionTransport, self).__init__(client)
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    def create_session(self):
+        '''
+        create a configured session
+        '''
+
+        raise NotImplementedError()
+
+    def session(self):
+        '''
+        return the session of the current thread, its connections are reused
+        '''
+
+        tls = self.tls
+        generation = tls.check() if tls is not None else 0
+        session = getattr(self._local, 'session', None)
+        if session is not None and self._local.generation != generation:
+            # the certificate files changed, connect with the new context
+            with self._lock:
+                self._sessions.remove(session)
+            session.close()
+            session = None
+        if session is None:
+            session = self._local.session = self.create_session()
+            self._local.generation = generation
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def request(self, method, url, payload=None, stream=False):
+        # streams keep their connection, other requests reuse a pooled one
+        session = self.create_session() if stream else self.session()
+        request_args = {
+            'url': url,
+            'headers': method_headers(method),
+            'verify': self.client.ca_certificate or False,
+        }
+        if self.tls is not None:
+            # the TLS context carries the CA certificate
+            request_args['verify'] = bool(self.client.ca_certificate)
+        if payload and self.client.compress_requests is not None:
+            request_args['data'], headers = self.encode(payload)
+            headers.update(request_args['headers'])
+            request_args['headers'] = headers
+        elif payload:
+            request_args['json'] = payload
+        if stream:
+            request_args['stream'] = True
+        try:
+            response = session.post(**request_args)
+        except Exception as error:  # pylint: disable=broad-except
+            if stream:
+                session.close()
+            if isinstance(error, self.connection_errors()):
+                raise self.connection_error(url, error)
+            raise
+        if stream:
+            return SessionStream(response, session)
+        return response
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+        self._local = threading.local()
+
+
+class RequestsTransport(SessionTransport):
+    '''
+    send requests with requests.Session
+    '''
+
+    name = 'requests'
+
+    def create_session(self):
+        import requests
+
+        session = requests.Session()
+        if self.tls is not None:
+            session.mount('https://', _tls_adapter(self.tls))
+        else:
+            session.cert = self.cert
+        session.auth = self.auth
+        session.headers = self.headers
+        return session
+
+    def connection_errors(self):
+        import requests
+
+        return (requests.RequestException,)
+
+
+def _tls_adapter(tls):
+    '''
+    return a requests adapter connecting with the SSL context of tls
+    '''
+
+    from requests.adapters import HTTPAdapter
+
+    class TlsAdapter(HTTPAdapter):
+        '''
+        HTTPAdapter using a shared SSL context
+        '''
+
+        def init_poolmanager(self, *args, **kwargs):
+            kwargs['ssl_context'] = tls.context
+            super(TlsAdapter, self).init_poolmanager(*args, **kwargs)
+
+        def cert_verify(self, conn, url, verify, cert):
+            # the context carries the certificates, requests would load the
+            # files into it for every connection
+            conn.cert_reqs = 'CERT_REQUIRED' if tls.ca_certificate \
+                else 'CERT_NONE'
+            conn.ca_certs = conn.ca_cert_dir = None
+            conn.cert_file = conn.key_file = None
+
+    return TlsAdapter()
+
+
+class StdlibTransport(SessionTransport):
+    '''
+    send requests with http.client, without third party modules
+    '''
+
+    name = 'stdlib'
+
+    def create_session(self):
+        from icinga2api.httpclient import HttpClientSession
+
+        session = HttpClientSession()
+        session.tls = self.tls
+        session.cert = self.cert
+        session.auth = self.auth
+        session.headers = self.headers
+        return session
+
+    def connection_errors(self):
+        from icinga2api.httpclient import httplib
+
+        return (httplib.HTTPException, IOError, OSError)
+
+
+class Urllib3Response(object):
+    '''
+    response of the urllib3 transport
+    '''
+
+    def __init__(self, response, url):
+        self.raw = response
+        self.url = url
+        self.status_code = response.status
+        self.headers = response.headers
+
+    @property
+    def content(self):
+        '''
+        the body as bytes
+        '''
+
+        return self.raw.data
+
+    @property
+    def text(self):
+        '''
+        the body as text
+        '''
+
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        '''
+        the body decoded from JSON
+        '''
+
+        return json.loads(self.text)
+
+    def iter_lines(self):
+        '''
+        yield the body line by line as it arrives
+        '''
+
+        return iter_lines(self.raw.stream(8192, decode_content=True))
+
+    def close(self):
+        '''
+        close the response and release its connection
+        '''
+
+        self.raw.release_conn()
+
+
+class Urllib3Transport(Transport):
+    '''
+    send requests with a thread-safe urllib3 connection pool
+    '''
+
+    name = 'urllib3'
+
+    def __init__(self, client, pool_size=10):
+        '''
+        initialize object
+
+        :param pool_size: connections kept per host
+        :type pool_size: int
+        '''
+
+        super(Urllib3Transport, self).__init__(client)
+        try:
+            import urllib3  # noqa: F401 pylint: disable=unused-import
+        except ImportError:
+            raise Icinga2ApiException(
+                'The "urllib3" transport needs the urllib3 module.')
+        self.pool_size = pool_size
+        self._headers = self.headers
+        if self.auth:
+            self._headers['Authorization'] = self.basic_auth_header()
+        self._generation = None
+        self._lock = threading.Lock()
+        self._pool = self._create_pool()
+
+    def _create_pool(self):
+        '''
+        create the pool manager
+        '''
+
+        import urllib3
+
+        pool_args = {'maxsize': self.pool_size}
+        tls = self.tls
+        if tls is not None:
+            self._generation = tls.check()
+            pool_args['ssl_context'] = tls.context
+            pool_args['cert_reqs'] = 'CERT_REQUIRED' \
+                if self.client.ca_certificate else 'CERT_NONE'
+        return urllib3.PoolManager(**pool_args)
+
+    def _current_pool(self):
+        '''
+        return the pool, recreated if the certificate files changed
+        '''
+
+        tls = self.tls
+        if tls is not None and tls.check() != self._generation:
+            with self._lock:
+                if tls.check() != self._generation:
+                    old_pool, self._pool = self._pool, self._create_pool()
+                    old_pool.clear()
+        return self._pool
+
+    def request(self, method, url, payload=None, stream=False):
+        headers = dict(self._headers)
+        headers.update(method_headers(method))
+        body = None
+        if payload:
+            body, body_headers = self.encode(payload)
+            headers.update(body_headers)
+        try:
+            response = self._current_pool().request(
+                'POST', url, body=body, headers=headers,
+                preload_content=not stream)
+        except self.connection_errors() as error:
+            raise self.connection_error(url, error)
+        return Urllib3Response(response, url)
+
+    def connection_errors(self):
+        import urllib3
+
+        return (urllib3.exceptions.HTTPError, IOError, OSError)
+
+    def close(self):
+        self._pool.clear()
+
+
+class HttpxResponse(object):
+    '''
+    response of the httpx transport
+    '''
+
+    def __init__(self, response):
+        self.raw = response
+        self.url = str(response.url)
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.http_version = response.http_version
+
+    @property
+    def content(self):
+        '''
+        the body as bytes
+        '''
+
+        return self.raw.read()
+
+    @property
+    def text(self):
+        '''
+        the body as text
+        '''
+
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        '''
+        the body decoded from JSON
+        '''
+
+        return json.loads(self.text)
+
+    def iter_lines(self):
+        '''
+        yield the body line by line as it arrives
+        '''
+
+        return iter_lines(self.raw.iter_bytes())
+
+    def close(self):
+        '''
+        close the response
+        '''
+
+        self.raw.close()
+
+
+class HttpxTransport(Transport):
+    '''
+    send requests with a thread-safe httpx client, optionally over HTTP/2
+    '''
+
+    name = 'httpx'
+
+    def __init__(self, client, http2=False, max_connections=10):
+        '''
+        initialize object
+
+        :param http2: negotiate HTTP/2, needs the h2 module
+        :type http2: bool
+        :param max_connections: maximum number of connections
+        :type max_connections: int
+        '''
+
+        super(HttpxTransport, self).__init__(client)
+        try:
+            import httpx  # noqa: F401 pylint: disable=unused-import
+        except ImportError:
+            raise Icinga2ApiException(
+                'The "httpx" transport needs the httpx module.')
+        self.max_connections = max_connections
+        self.http2 = http2
+        self._generation = None
+        self._lock = threading.Lock()
+        self._client = self._create_client()
+        # requests exceeding the HTTP/1.1 pool wait here rather than in it
+        self._slots = threading.BoundedSemaphore(
+            max_connections * (100 if http2 else 1))
+
+    def _create_client(self):
+        '''
+        create the httpx client
+        '''
+
+        import httpx
+
+        tls = self.tls
+        client_args = {
+            'verify': self.client.ca_certificate or False,
+            'cert': self.cert,
+        }
+        if tls is not None:
+            self._generation = tls.check()
+            client_args = {'verify': tls.context}
+        return httpx.Client(
+            http2=self.http2,
+            auth=self.auth,
+            headers=self.headers,
+            timeout=None,
+            limits=httpx.Limits(max_connections=self.max_connections),
+            **client_args
+        )
+
+    def _current_client(self):
+        '''
+        return the client, recreated if the certificate files changed
+        '''
+
+        tls = self.tls
+        if tls is not None and tls.check() != self._generation:
+            with self._lock:
+                if tls.check() != self._generation:
+                    old_client, self._client = \
+                        self._client, self._create_client()
+                    old_client.close()
+        return self._client
+
+    def request(self, method, url, payload=None, stream=False):
+        client = self._current_client()
+        headers = method_headers(method)
+        body = None
+        if payload:
+            body, body_headers = self.encode(payload)
+            headers = dict(headers, **body_headers)
+        request = client.build_request(
+            'POST', url, content=body, headers=headers)
+        try:
+            if stream:
+                # event streams keep their connection and don't take a slot
+                return HttpxResponse(client.send(request, stream=True))
+            with self._slots:
+                return HttpxResponse(client.send(request))
+        except self.connection_errors() as error:
+            raise self.connection_error(url, error)
+
+    def connection_errors(self):
+        import httpx
+
+        return (httpx.TransportError, IOError, OSError)
+
+    def close(self):
+        # the transport stays usable like the pooled transports
+        with self._lock:
+            old_client, self._client = self._client, self._create_client()
+        old_client.close()
+
+
+class Http2Transport(HttpxTransport):
+    '''
+    multiplex concurrent requests over few HTTP/2 connections
+
+    The first request negotiates the protocol alone. Servers or proxies which
+    don't negotiate h2 are served over a pool of HTTP/1.1 keep-alive
+    connections from then on.
+    '''
+
+    name = 'http2'
+
+    def __init__(self, client, max_streams=100, max_connections=2,
+                 http1_connections=10):
+        '''
+        initialize object
+
+        :param max_streams: maximum number of concurrent requests over HTTP/2,
+            event streams are not counted
+        :type max_streams: int
+        :param max_connections: maximum number of HTTP/2 connections
+        :type max_connections: int
+        :param http1_connections: size of the HTTP/1.1 pool and maximum number
+            of concurrent requests if h2 isn't negotiated
+        :type http1_connections: int
+        '''
+
+        try:
+            import h2  # noqa: F401 pylint: disable=unused-import
+            http2 = True
+        except ImportError:
+            LOG.warning('The h2 module is missing, using HTTP/1.1.')
+            http2 = False
+        self.max_streams = max_streams
+        self.http1_connections = http1_connections
+        super(Http2Transport, self).__init__(
+            client, http2=http2,
+            max_connections=max_connections if http2 else http1_connections)
+        if http2:
+            self._slots = threading.BoundedSemaphore(max_streams)
+        self._negotiate = threading.Lock()
+        self.negotiated = None if http2 else 'HTTP/1.1'
+        self.http_versions = {}
+
+    def request(self, method, url, payload=None, stream=False):
+        if self.negotiated is None:
+            with self._negotiate:
+                if self.negotiated is None:
+                    return self._negotiate_request(
+                        method, url, payload, stream)
+        response = super(Http2Transport, self).request(
+            method, url, payload, stream)
+        with self._lock:
+            self.http_versions[response.http_version] = \
+                self.http_versions.get(response.http_version, 0) + 1
+        return response
+
+    def _negotiate_request(self, method, url, payload, stream):
+        '''
+        send the first request, switch to HTTP/1.1 if h2 isn't negotiated
+        '''
+
+        response = super(Http2Transport, self).request(
+            method, url, payload, stream)
+        with self._lock:
+            self.http_versions[response.http_version] = 1
+        if response.http_version != 'HTTP/2':
+            LOG.info('%s did not negotiate h2, using HTTP/1.1.', url)
+            # requests waiting for the protocol of a new connection would
+            # share a HTTP/1.1 connection, use a plain pool instead
+            self.max_connections = self.http1_connections
+            self.http2 = False
+            old_client, self._client = self._client, self._create_client()
+            self._slots = threading.BoundedSemaphore(self.http1_connections)
+            if not stream:
+                old_client.close()
+        self.negotiated = response.http_version
+        return response
+
+    def stats(self):
+        '''
+        return the number of responses per negotiated HTTP version
+
+        :returns: e.g. {'HTTP/2': 120}
+        :rtype: dictionary
+        '''
+
+        with self._lock:
+            return dict(self.http_versions)
+
+
+TRANSPORTS = {
+    'requests': RequestsTransport,
+    'urllib3': Urllib3Transport,
+    'httpx': HttpxTransport,
+    'http2': Http2Transport,
+    'stdlib': StdlibTransport,
+    'http.client': StdlibTransport,
+}
+
+
+def create_transport(client, transport):
+    '''
+    return the transport for a client
+
+    :param client: the client
+    :type client: Client
+    :param transport: a name of TRANSPORTS, a Transport or a callable
+        creating a Transport for the client, e.g. a Transport subclass
+    :type transport: string
+    :returns: the transport
+    :rtype: Transport
+    '''
+
+    if isinstance(transport, Transport):
+        return transport
+    if callable(transport):
+        return transport(client)
+    if transport not in TRANSPORTS:
+        raise Icinga2ApiException(
+            'Unknown transport "{}".'.format(transport))
+    return TRANSPORTS[transport](client)
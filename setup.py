@@ -14,7 +14,12 @@ setup(
     description=DESCRIPTION,
     author=AUTHOR,
     author_email=AUTHOR_EMAIL,
-    install_requires=["requests"],
+    install_requires=["requests", "futures; python_version < '3.0'"],
+    extras_require={
+        'urllib3': ['urllib3'],
+        'httpx': ['httpx'],
+        'http2': ['httpx[http2]'],
+    },
     keywords="Icinga api",
     license="2-Clause BSD",
     url=URL,
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the single-flight execution of identical concurrent reads
+'''
+
+from __future__ import print_function
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.base import SingleFlight  # noqa: E402
+from icinga2api.client import Client  # noqa: E402
+from icinga2api.transport import Transport  # noqa: E402
+
+
+class Blocked(object):
+    '''
+    call waiting until it is released, counting its executions
+    '''
+
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.executions = 0
+
+    def __call__(self):
+        self.executions += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def run(flight, key, function, count):
+    '''
+    call flight.do from count threads, the first one leading
+
+    :returns: the results or exceptions of the callers
+    '''
+
+    outcomes = []
+
+    def caller():
+        try:
+            outcomes.append(flight.do(key, function))
+        except Exception as error:  # pylint: disable=broad-except
+            outcomes.append(error)
+
+    leader = threading.Thread(target=caller)
+    leader.start()
+    function.started.wait(5)
+    followers = [threading.Thread(target=caller) for _ in range(count - 1)]
+    for thread in followers:
+        thread.start()
+    # the followers wait for the call in flight
+    while flight.stats()['collapsed'] < count - 1:
+        time.sleep(0.001)
+    function.release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    return outcomes
+
+
+class SingleFlightTest(unittest.TestCase):
+    '''
+    one execution per key at a time
+    '''
+
+    def test_shares_result(self):
+        flight = SingleFlight()
+        result = {'results': []}
+        function = Blocked(result)
+        outcomes = run(flight, 'key', function, 5)
+        self.assertEqual(function.executions, 1)
+        self.assertEqual(len(outcomes), 5)
+        self.assertTrue(all(outcome is result for outcome in outcomes))
+        self.assertEqual(flight.stats(),
+                         {'calls': 5, 'collapsed': 4, 'in_flight': 0})
+
+    def test_shares_error(self):
+        flight = SingleFlight()
+        error = IOError('refused')
+        outcomes = run(flight, 'key', Blocked(error=error), 3)
+        self.assertEqual(outcomes, [error] * 3)
+        self.assertEqual(flight.stats()['in_flight'], 0)
+
+    def test_sequential_calls(self):
+        flight = SingleFlight()
+        calls = []
+        for number in range(3):
+            self.assertEqual(
+                flight.do('key', lambda: calls.append(1) or len(calls)),
+                number + 1)
+        self.assertEqual(flight.stats()['collapsed'], 0)
+
+
+class CountingTransport(Transport):
+    '''
+    transport failing every request, keeping the methods
+    '''
+
+    def __init__(self, client):
+        super(CountingTransport, self).__init__(client)
+        self.methods = []
+
+    def request(self, method, url, payload=None, stream=False):
+        self.methods.append(method)
+        raise AssertionError('not sent')
+
+
+class ClientTest(unittest.TestCase):
+    '''
+    single-flight of the client requests
+    '''
+
+    def test_only_reads(self):
+        client = Client('https://icinga2:5665', 'root', 'icinga',
+                        single_flight=True)
+        keys = []
+
+        def do(key, function):
+            keys.append(key)
+            return {'results': []}
+
+        client.single_flight.do = do
+        client.objects.list('Host', attrs=['name'])
+        self.assertEqual(len(keys), 1)
+        self.assertEqual(keys[0][:2], ('GET', 'v1/objects/hosts'))
+        self.assertIn('"attrs": ["name"]', keys[0][2])
+        client.transport = CountingTransport(client)
+        self.assertRaises(AssertionError, client.objects.delete,
+                          'Host', 'a')
+        self.assertEqual(client.transport.methods, ['DELETE'])
+        self.assertEqual(len(keys), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the bulk operations
+'''
+
+from __future__ import print_function
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.bulk import (  # noqa: E402
+    dependency_levels, group_changes, references, run_levels,
+    stream_results)
+from icinga2api.exceptions import Icinga2ApiException  # noqa: E402
+from icinga2api.objects import NAMES_VAR, Objects  # noqa: E402
+
+
+def definition(object_type, name, **attrs):
+    '''
+    return an object definition
+    '''
+
+    return {'type': object_type, 'name': name, 'attrs': attrs}
+
+
+def keys(objects):
+    '''
+    return the sorted (type, name) keys of objects
+    '''
+
+    return sorted((obj['type'], obj['name']) for obj in objects)
+
+
+class DependencyLevelsTest(unittest.TestCase):
+    '''
+    ordering object definitions by their references
+    '''
+
+    def test_references(self):
+        self.assertEqual(sorted(references(definition(
+            'Service', 'web!http', host_name='web', check_command='http',
+            groups=['web'], zone='dmz'))), [
+                ('CheckCommand', 'http'), ('Host', 'web'), ('Host', 'web'),
+                ('ServiceGroup', 'web'), ('Zone', 'dmz')])
+        self.assertEqual(references(definition(
+            'Dependency', 'd', parent_host_name='a', parent_service_name='s',
+            child_host_name='b')), [
+                ('Host', 'a'), ('Host', 'b'), ('Service', 'a!s')])
+        self.assertEqual(references(definition('Zone', 'dmz',
+                                               parent='master')),
+                         [('Zone', 'master')])
+
+    def test_levels(self):
+        objects = [
+            definition('Service', 'web!http', check_command='http'),
+            definition('Host', 'web', zone='dmz', groups=['linux']),
+            definition('HostGroup', 'linux'),
+            definition('Zone', 'dmz', parent='master'),
+            definition('Zone', 'master'),
+            definition('CheckCommand', 'http'),
+            definition('Host', 'db'),
+        ]
+        levels, cycles = dependency_levels(objects)
+        self.assertEqual(cycles, [])
+        self.assertEqual([keys(level) for level in levels], [
+            [('Zone', 'master')],
+            [('Zone', 'dmz')],
+            [('CheckCommand', 'http'), ('HostGroup', 'linux')],
+            [('Host', 'db'), ('Host', 'web')],
+            [('Service', 'web!http')],
+        ])
+
+    def test_same_rank(self):
+        objects = [
+            definition('Host', 'child', parent_host_name='parent'),
+            definition('Host', 'parent'),
+        ]
+        levels, _ = dependency_levels(objects)
+        self.assertEqual([keys(level) for level in levels],
+                         [[('Host', 'parent')], [('Host', 'child')]])
+
+    def test_cycles(self):
+        objects = [
+            definition('Zone', 'a', parent='b'),
+            definition('Zone', 'b', parent='a'),
+            definition('Zone', 'c', parent='a'),
+            definition('Host', 'h', zone='a'),
+            definition('Zone', 'd'),
+        ]
+        levels, cycles = dependency_levels(objects)
+        self.assertEqual(keys(cycles),
+                         [('Zone', 'a'), ('Zone', 'b'), ('Zone', 'c')])
+        self.assertEqual([keys(level) for level in levels],
+                         [[('Zone', 'd')], [('Host', 'h')]])
+
+        # objects referencing a cycle are skipped when running the levels
+        created = []
+        result = run_levels(levels, cycles, created.append)
+        self.assertEqual(keys(created), [('Zone', 'd')])
+        self.assertFalse(result.ok)
+        self.assertEqual(result.total, 5)
+        self.assertEqual(result.failed[('Zone', 'a')], 'dependency cycle')
+        self.assertEqual(result.failed[('Host', 'h')],
+                         'dependency Zone "a" failed')
+
+    def test_run_levels(self):
+        objects = [
+            definition('Zone', 'master'),
+            definition('Host', 'a', zone='master'),
+            definition('Host', 'b', zone='master'),
+            definition('Service', 'a!ping'),
+            definition('Service', 'b!ping'),
+        ]
+
+        def create(obj):
+            if obj['name'] == 'a':
+                raise ValueError('rejected')
+
+        reported = []
+        levels, cycles = dependency_levels(objects)
+        result = run_levels(levels, cycles, create, parallelism=2,
+                            progress=lambda result: reported.append(1))
+        self.assertEqual(sorted(result.done), [
+            ('Host', 'b'), ('Service', 'b!ping'), ('Zone', 'master')])
+        self.assertEqual(result.failed, {
+            ('Host', 'a'): 'rejected',
+            ('Service', 'a!ping'): 'dependency Host "a" failed'})
+        self.assertEqual(len(reported), 5)
+
+
+class GroupChangesTest(unittest.TestCase):
+    '''
+    grouping the names of identical changes
+    '''
+
+    def test_group_changes(self):
+        groups = group_changes({
+            'a': {'vars.x': 1, 'notes': 'n'},
+            'b': {'notes': 'n', 'vars.x': 1},
+            'c': {'vars.x': 2},
+            'd': {'vars.x': 1, 'notes': 'n'},
+        })
+        self.assertEqual([(attrs, sorted(names)) for attrs, names in groups],
+                         [({'vars.x': 1, 'notes': 'n'}, ['a', 'b', 'd']),
+                          ({'vars.x': 2}, ['c'])])
+        self.assertEqual(group_changes({}), [])
+
+
+class StreamResultsTest(unittest.TestCase):
+    '''
+    one result per name as the requests finish
+    '''
+
+    def test_results(self):
+        def update(attrs, names):
+            if attrs == 'denied':
+                raise Icinga2ApiException('denied', status_code=403)
+            if attrs == 'bug':
+                raise KeyError('bug')
+            return [{'name': name, 'code': 200, 'status': 'ok'}
+                    for name in names if name != 'gone']
+
+        results = stream_results([
+            ('ok', ['a', 'gone']), ('denied', ['b']), ('bug', ['c'])],
+            update, parallelism=2)
+        self.assertEqual(
+            sorted((result['name'], result['code']) for result in results),
+            [('a', 200), ('b', 403), ('c', 500), ('gone', 404)])
+
+
+class RecordingObjects(Objects):
+    '''
+    objects endpoint keeping the filtered updates
+    '''
+
+    def __init__(self):
+        super(RecordingObjects, self).__init__(None)
+        self.updates = []
+        self.lock = threading.Lock()
+
+    def update(self, object_type, name=None, attrs=None, filters=None,
+               filter_vars=None):
+        with self.lock:
+            self.updates.append((attrs, filters, filter_vars[NAMES_VAR]))
+        return {'results': [{'name': name, 'code': 200, 'status': 'ok'}
+                            for name in filter_vars[NAMES_VAR]]}
+
+
+class UpdateManyTest(unittest.TestCase):
+    '''
+    one filtered request per identical change and chunk
+    '''
+
+    def test_update_many(self):
+        objects = RecordingObjects()
+        changes = dict(('h{0}!ping'.format(number), {'vars.window': 'sun'})
+                       for number in range(5))
+        changes['db!mysql'] = {'vars.window': 'mon'}
+        results = list(objects.update_many('Service', changes, chunk_size=2))
+        self.assertEqual(sorted(result['name'] for result in results),
+                         sorted(changes))
+        self.assertEqual(len(objects.updates), 4)
+        for attrs, filters, names in objects.updates:
+            self.assertEqual(filters, 'service.__name in ' + NAMES_VAR)
+            self.assertTrue(len(names) <= 2)
+            for name in names:
+                self.assertEqual(attrs, {'attrs': changes[name]})
+
+
+if __name__ == '__main__':
+    unittest.main()
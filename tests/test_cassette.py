@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of recording and replaying a cassette
+'''
+
+from __future__ import print_function
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.cassette import record, replay  # noqa: E402
+from icinga2api.client import Client  # noqa: E402
+from icinga2api.exceptions import Icinga2ApiException  # noqa: E402
+from icinga2api.transport import Transport  # noqa: E402
+
+URL = 'https://icinga2:5665'
+
+
+class Response(object):
+    '''
+    response of the fake server
+    '''
+
+    def __init__(self, url, body, lines=None, status_code=200):
+        self.url = url
+        self.status_code = status_code
+        self.text = json.dumps(body)
+        self.lines = lines
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_lines(self):
+        for line in self.lines:
+            yield line.encode('utf-8')
+
+    def close(self):
+        pass
+
+
+class ServerTransport(Transport):
+    '''
+    transport answering from a few hosts, counting the listings
+    '''
+
+    def __init__(self, client):
+        super(ServerTransport, self).__init__(client)
+        self.listings = 0
+
+    def request(self, method, url, payload=None, stream=False):
+        if stream:
+            lines = [json.dumps({'type': 'CheckResult', 'host': name})
+                     for name in ('a', 'b')]
+            return Response(url, None, lines)
+        if url.endswith('v1/objects/hosts'):
+            self.listings += 1
+            names = (payload or {}).get('filter_vars', {}).get('names') or \
+                ['a', 'b']
+            return Response(url, {'results': [
+                {'name': name, 'attrs': {'address': '10.0.0.1',
+                                         'listing': self.listings}}
+                for name in names]})
+        return Response(url, {'error': 404, 'status': 'No objects'},
+                        status_code=404)
+
+
+class CassetteTest(unittest.TestCase):
+    '''
+    record a workload and replay it without a server
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.cassette')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def workload(self, client):
+        '''
+        return the results of some requests
+        '''
+
+        results = [
+            client.objects.list('Host'),
+            client.objects.list('Host'),
+            client.objects.list('Host', filters='host.name in names',
+                                filter_vars={'names': ['b']}),
+        ]
+        try:
+            client.status.list()
+        except Icinga2ApiException as error:
+            results.append(error.status_code)
+        results.append([json.loads(event) for event in
+                        client.events.subscribe(['CheckResult'], 'q')])
+        return results
+
+    def test_round_trip(self):
+        client = Client(URL, 'root', 'icinga', transport=record(
+            self.path, transport=ServerTransport, redact=['address']))
+        recorded = self.workload(client)
+        client.close()
+        self.assertEqual([obj['attrs']['listing'] for obj in recorded[0]],
+                         [1, 1])
+        self.assertEqual(recorded[3], 404)
+
+        client = Client('https://localhost:5665', 'other', 'secret',
+                        transport=replay(self.path))
+        replayed = self.workload(client)
+        self.assertEqual(client.transport.misses, 0)
+        # addresses are redacted in the cassette
+        for listing in recorded[:3]:
+            for obj in listing:
+                obj['attrs']['address'] = '***'
+        # repeated requests get the recorded responses in order
+        self.assertEqual(replayed, recorded)
+        # requests of another url path get a 404 response
+        self.assertRaises(Icinga2ApiException, client.objects.list,
+                          'Service')
+        self.assertEqual(client.transport.misses, 1)
+
+    def test_not_a_cassette(self):
+        with open(self.path, 'wb') as handle:
+            handle.write(b'')
+        self.assertRaises(Icinga2ApiException, Client, URL, 'root',
+                          'icinga', transport=replay(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
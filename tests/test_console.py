@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the console aggregations
+'''
+
+from __future__ import print_function
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.console import Console, aggregation_script  # noqa: E402
+from icinga2api.exceptions import Icinga2ApiException  # noqa: E402
+
+
+class RecordingConsole(Console):
+    '''
+    console endpoint returning a fixed result and keeping the payloads
+    '''
+
+    def __init__(self, result, code=200):
+        super(RecordingConsole, self).__init__(None)
+        self.result = result
+        self.code = code
+        self.payloads = []
+
+    def _request(self, method, url_path, payload=None, stream=False):
+        self.payloads.append(payload)
+        return {'results': [{'code': self.code, 'status': 'Error',
+                             'result': self.result}]}
+
+
+class AggregationScriptTest(unittest.TestCase):
+    '''
+    the generated DSL scripts
+    '''
+
+    def test_count(self):
+        script = aggregation_script('Host', filters='host.state == 1')
+        self.assertTrue(script.startswith('var icinga2api_result = 0\n'))
+        self.assertIn('for (icinga2api_object in get_objects(Host)) {',
+                      script)
+        self.assertIn('if (!(host.state == 1)) { continue }', script)
+        self.assertIn('icinga2api_result += 1', script)
+        self.assertNotIn('get_host', script)
+        self.assertTrue(script.endswith('}\nicinga2api_result'))
+
+    def test_host_join(self):
+        script = aggregation_script('Service')
+        self.assertIn('var host = get_host(icinga2api_object.host_name)',
+                      script)
+
+    def test_group_by_and_sum(self):
+        script = aggregation_script(
+            'Service', ['service.zone', 'host.groups'],
+            'service.last_check_result.execution_end - '
+            'service.last_check_result.execution_start')
+        self.assertIn('var icinga2api_keys0 = service.zone', script)
+        self.assertIn('var icinga2api_keys1 = host.groups', script)
+        self.assertIn('icinga2api_group1[icinga2api_key1] += '
+                      '(service.last_check_result.execution_end - '
+                      'service.last_check_result.execution_start)', script)
+        self.assertEqual(script.count('{'), script.count('}'))
+
+    def test_filter_vars(self):
+        script = aggregation_script(
+            'Host', filters='host.name in names',
+            filter_vars={'names': ['a', u'\xfc"'], 'limit': 2.5,
+                         'flag': None})
+        self.assertIn('var names = [ "a", "\xfc\\"" ]', script)
+        self.assertIn('var limit = 2.5', script)
+        self.assertIn('var flag = null', script)
+
+    def test_invalid_input(self):
+        for arguments in ({'object_type': 'Host; exit'},
+                          {'object_type': 'Host', 'group_by': ['a b']},
+                          {'object_type': 'Host', 'value': 'x; y'},
+                          {'object_type': 'Host',
+                           'filter_vars': {'a-b': 1}},
+                          {'object_type': 'Host',
+                           'filter_vars': {'a': object()}}):
+            self.assertRaises(Icinga2ApiException, aggregation_script,
+                              **arguments)
+
+
+class ConsoleTest(unittest.TestCase):
+    '''
+    the aggregation helpers of the endpoint
+    '''
+
+    def test_sandboxed(self):
+        console = RecordingConsole(3)
+        self.assertEqual(console.count('Host'), 3)
+        console.group_by('Service', 'service.state')
+        console.sum('Service', 'service.state', group_by='service.zone')
+        self.assertEqual([payload['sandboxed'] for payload
+                          in console.payloads], [True, True, True])
+        self.assertIn('var icinga2api_keys0 = service.zone',
+                      console.payloads[2]['command'])
+
+    def test_failed_script(self):
+        console = RecordingConsole(None, code=500)
+        with self.assertRaises(Icinga2ApiException) as context:
+            console.execute_script('1 / 0')
+        self.assertEqual(context.exception.status_code, 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
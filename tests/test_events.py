@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the coalescing of CheckResult events
+'''
+
+from __future__ import print_function
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.events import EventCoalescer, Events  # noqa: E402
+
+
+class Clock(object):
+    '''
+    clock which only moves when told to
+    '''
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def check_result(host, state, output='', service=None):
+    '''
+    return a CheckResult event
+    '''
+
+    event = {'type': 'CheckResult', 'host': host,
+             'check_result': {'state': state, 'output': output}}
+    if service:
+        event['service'] = service
+    return event
+
+
+class CoalescerTest(unittest.TestCase):
+    '''
+    keeping the newest event per object within a window
+    '''
+
+    def setUp(self):
+        self.clock = Clock()
+        self.coalescer = EventCoalescer(window=5, clock=self.clock)
+
+    def test_window_end(self):
+        add = self.coalescer.add
+        first = check_result('a', 0, '1')
+        self.assertEqual(add(first), [first])
+        self.assertEqual(add(check_result('a', 0, '2')), [])
+        newest = check_result('a', 0, '3')
+        self.assertEqual(add(newest), [])
+        other = check_result('a', 0, 'x', service='ping')
+        self.assertEqual(add(other), [other])
+        self.assertEqual(self.coalescer.timeout(), 5)
+
+        self.clock.now += 4.5
+        self.assertEqual(self.coalescer.tick(), [])
+        self.assertEqual(self.coalescer.timeout(), 0.5)
+        self.clock.now += 0.5
+        self.assertEqual(self.coalescer.tick(), [newest])
+        self.assertEqual(self.coalescer.timeout(), None)
+        self.assertEqual(self.coalescer.stats(), {
+            'received': 4, 'emitted': 3, 'pending': 0, 'coalesced': 1,
+            'transitions': 2, 'ratio': 4.0 / 3})
+
+    def test_add_after_window_end(self):
+        add = self.coalescer.add
+        add(check_result('a', 0, '1'))
+        pending = check_result('a', 0, '2')
+        add(pending)
+        self.clock.now += 6
+        latest = check_result('a', 0, '3')
+        self.assertEqual(add(latest), [pending])
+        self.assertEqual(self.coalescer.flush(), [latest])
+
+    def test_transition(self):
+        add = self.coalescer.add
+        add(check_result('a', 0))
+        add(check_result('a', 0, 'outdated'))
+        critical = check_result('a', 2)
+        self.assertEqual(add(critical), [critical])
+        # the pending event was older than the transition
+        self.assertEqual(self.coalescer.flush(), [])
+
+    def test_other_events(self):
+        message = json.dumps({'type': 'StateChange', 'host': 'a'})
+        self.assertEqual(self.coalescer.add(message), [message])
+        first = json.dumps(check_result('a', 0))
+        self.assertEqual(self.coalescer.add(first), [first])
+
+
+class StreamEvents(Events):
+    '''
+    events endpoint reading a fixed stream
+    '''
+
+    def __init__(self, lines):
+        super(StreamEvents, self).__init__(None)
+        self.stream = Stream(lines)
+
+    def _request(self, method, url_path, payload=None, stream=False):
+        self.payload = payload
+        return self.stream
+
+
+class Stream(object):
+    '''
+    streaming response
+    '''
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.closed = False
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+    def close(self):
+        self.closed = True
+
+
+class SubscribeTest(unittest.TestCase):
+    '''
+    coalescing a subscribed stream
+    '''
+
+    def test_coalesce(self):
+        lines = [json.dumps(check_result('a', 0, str(number))).encode()
+                 for number in range(5)]
+        events = StreamEvents(lines + [b''])
+        received = list(events.subscribe(['CheckResult'], 'test',
+                                         coalesce=60))
+        # the first event at once, the newest at the end of the stream
+        self.assertEqual(received, [lines[0].decode(), lines[-1].decode()])
+        self.assertEqual(events.payload,
+                         {'types': ['CheckResult'], 'queue': 'test'})
+        self.assertTrue(events.stream.closed)
+
+    def test_without_coalesce(self):
+        events = StreamEvents([b'{"a": 1}', b'', b'{"a": 2}'])
+        received = events.subscribe(['CheckResult'], 'test')
+        self.assertEqual(next(received), '{"a": 1}')
+        received.close()
+        self.assertTrue(events.stream.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
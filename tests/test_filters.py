@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the client-side filter expressions
+'''
+
+from __future__ import print_function
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.exceptions import Icinga2ApiException  # noqa: E402
+from icinga2api.filters import Filter, compile_filter, select  # noqa: E402
+
+SERVICE = {
+    'type': 'Service',
+    'name': 'web01!http',
+    'attrs': {
+        'host_name': 'web01',
+        'state': 2,
+        'groups': ['linux', 'web'],
+        'vars': {'team': 'ops', 'path': 'C:\\temp'},
+    },
+    'joins': {'host': {'state': 0, 'groups': ['linux']}},
+}
+
+
+def evaluate(expression, filter_vars=None):
+    '''
+    return the value of an expression for SERVICE
+    '''
+
+    return Filter(expression)(SERVICE, filter_vars)
+
+
+class PrecedenceTest(unittest.TestCase):
+    '''
+    operator precedence as in the Icinga 2 DSL
+    '''
+
+    def test_arithmetic(self):
+        self.assertTrue(evaluate('1 + 2 * 3 == 7'))
+        self.assertTrue(evaluate('(1 + 2) * 3 == 9'))
+        self.assertTrue(evaluate('10 - 4 - 3 == 3'))
+        self.assertTrue(evaluate('7 % 4 * 2 == 6'))
+        self.assertTrue(evaluate('-2 * 3 == -6'))
+
+    def test_and_binds_tighter_than_or(self):
+        self.assertTrue(evaluate('true || false && false'))
+        self.assertFalse(evaluate('(true || false) && false'))
+        self.assertTrue(evaluate('false && false || true'))
+
+    def test_comparison_binds_tighter_than_equality(self):
+        self.assertTrue(evaluate('2 < 3 == true'))
+        self.assertTrue(evaluate('service.state > 1 == 1 < 2'))
+
+    def test_in_binds_tighter_than_equality(self):
+        self.assertTrue(evaluate('"linux" in service.groups == true'))
+        self.assertTrue(evaluate('"mac" in service.groups == false'))
+
+    def test_in_binds_looser_than_comparison(self):
+        self.assertTrue(evaluate('1 < 2 in [true]'))
+
+    def test_not(self):
+        self.assertTrue(evaluate('!(service.state == 0) && host.state == 0'))
+        self.assertFalse(evaluate('!service.state'))
+        self.assertTrue(evaluate('!!service.state'))
+
+    def test_short_circuit(self):
+        # the right side would access an undefined variable
+        self.assertTrue(evaluate('true || undefined_variable'))
+        self.assertFalse(evaluate('false && undefined_variable'))
+
+
+class StringTest(unittest.TestCase):
+    '''
+    string literals and escapes
+    '''
+
+    def test_escapes(self):
+        self.assertTrue(evaluate(r'"a\"b" == quote', {'quote': 'a"b'}))
+        self.assertTrue(evaluate(r'"a\tb\nc" == text', {'text': 'a\tb\nc'}))
+        self.assertTrue(evaluate(r'"C:\\temp" == service.vars.path'))
+
+    def test_unknown_escape_is_kept(self):
+        # regex() patterns keep their backslashes
+        self.assertTrue(evaluate(r'"\d" == pattern', {'pattern': '\\d'}))
+        self.assertTrue(evaluate(r'regex("^web\d+$", service.host_name)'))
+
+    def test_concatenation(self):
+        self.assertTrue(evaluate('"web" + 1 == "web1"'))
+        self.assertTrue(evaluate('service.host_name + "!http" == '
+                                 'service.__name'))
+
+    def test_unterminated_string(self):
+        self.assertRaises(Icinga2ApiException, Filter, '"open == 1')
+
+
+class MembershipTest(unittest.TestCase):
+    '''
+    the in and !in operators
+    '''
+
+    def test_in(self):
+        self.assertTrue(evaluate('"web" in service.groups'))
+        self.assertFalse(evaluate('"db" in service.groups'))
+        self.assertTrue(evaluate('service.vars.team in ["ops", "dev"]'))
+
+    def test_not_in(self):
+        self.assertTrue(evaluate('"db" !in service.groups'))
+        self.assertFalse(evaluate('"web" !in service.groups'))
+        self.assertTrue(evaluate('"db"!in service.groups'))
+
+    def test_not_in_needs_a_word_boundary(self):
+        # "!inactive" is the negation of a variable, not "!in active"
+        self.assertTrue(evaluate('!inactive', {'inactive': False}))
+
+    def test_in_null(self):
+        self.assertFalse(evaluate('"web" in service.vars.missing'))
+        self.assertTrue(evaluate('"web" !in service.vars.missing'))
+
+    def test_in_requires_an_array(self):
+        self.assertRaises(Icinga2ApiException, evaluate,
+                          '"o" in service.vars.team')
+
+    def test_in_filter_vars(self):
+        names = ['web{0:02d}'.format(number) for number in range(100)]
+        predicate = compile_filter('host.name in names').predicate(
+            {'names': names})
+        self.assertTrue(predicate(SERVICE))
+        self.assertFalse(predicate(dict(SERVICE, attrs={'host_name': 'db01'})))
+
+
+class VariableTest(unittest.TestCase):
+    '''
+    variable resolution and selection
+    '''
+
+    def test_names(self):
+        self.assertTrue(evaluate('service.name == "http"'))
+        self.assertTrue(evaluate('service.__name == "web01!http"'))
+        self.assertTrue(evaluate('host.name == "web01"'))
+
+    def test_undefined_variable(self):
+        self.assertRaises(Icinga2ApiException, evaluate, 'missing == 1')
+
+    def test_durations(self):
+        self.assertTrue(evaluate('5m == 300 && 1h == 60m && 500ms == 0.5'))
+
+    def test_select(self):
+        services = [SERVICE, dict(SERVICE, name='web01!ssh',
+                                  attrs=dict(SERVICE['attrs'], state=0))]
+        selected = select(services, 'service.state != 0')
+        self.assertEqual([service['name'] for service in selected],
+                         ['web01!http'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the stdlib HTTP session
+'''
+
+from __future__ import print_function
+import gzip
+import io
+import os
+import socket
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.httpclient import (  # noqa: E402
+    HttpClientResponse, HttpClientSession, _dropped, httplib)
+
+
+class Response(object):
+    '''
+    http.client response with a fixed body
+    '''
+
+    status = 200
+
+    def __init__(self, body, headers=()):
+        self.body = io.BytesIO(body)
+        self.headers = list(headers)
+
+    def getheaders(self):
+        return self.headers
+
+    def read(self, *args):
+        return self.body.read(*args)
+
+    def readline(self):
+        return self.body.readline()
+
+    def close(self):
+        pass
+
+
+class Connection(object):
+    '''
+    http.client connection failing in request() or getresponse()
+    '''
+
+    sock = None
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.requests = []
+        self.closed = False
+
+    def request(self, method, path, body, headers):
+        if self.fail_on == 'send':
+            raise socket.error(32, 'Broken pipe')
+        self.requests.append((method, path, body, headers))
+
+    def getresponse(self):
+        if self.fail_on == 'response':
+            raise httplib.BadStatusLine('')
+        return Response(b'{"results": []}')
+
+    def close(self):
+        self.closed = True
+
+
+class Session(HttpClientSession):
+    '''
+    session connecting with scripted connections
+    '''
+
+    def __init__(self, connections):
+        super(Session, self).__init__()
+        self.connections = list(connections)
+        self.opened = []
+
+    def _connect(self, parts, verify):
+        connection = self.connections.pop(0)
+        self.opened.append(connection)
+        return connection
+
+
+def override(method):
+    '''
+    return the headers of a request with method
+    '''
+
+    return {'X-HTTP-Method-Override': method}
+
+
+class RetryTest(unittest.TestCase):
+    '''
+    requests failing on a reused keep-alive connection
+    '''
+
+    url = 'http://localhost:5665/v1/objects/hosts'
+
+    def test_reuses_connection(self):
+        session = Session([Connection()])
+        for _ in range(3):
+            response = session.post(self.url, headers=override('GET'),
+                                    json={'attrs': ['name']})
+            self.assertEqual(response.json(), {'results': []})
+        self.assertEqual(len(session.opened[0].requests), 3)
+        method, path, body, headers = session.opened[0].requests[0]
+        self.assertEqual((method, path), ('POST', '/v1/objects/hosts'))
+        self.assertEqual(body, b'{"attrs": ["name"]}')
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+
+    def test_retries_unsent(self):
+        for method in ('GET', 'POST', 'DELETE'):
+            session = Session([Connection()])
+            failing = Connection('send')
+            session._connections[('http', 'localhost:5665')] = failing
+            session.post(self.url, headers=override(method), json={})
+            self.assertTrue(failing.closed)
+            self.assertEqual(len(session.opened[0].requests), 1)
+
+    def test_retries_sent_get(self):
+        session = Session([Connection('response'), Connection()])
+        session._connections[('http', 'localhost:5665')] = \
+            session.connections.pop(0)
+        session.post(self.url, headers=override('GET'), json={})
+        self.assertEqual(len(session.opened[0].requests), 1)
+
+    def test_raises_sent_post(self):
+        for method in ('POST', 'PUT', 'DELETE'):
+            session = Session([Connection()])
+            failing = Connection('response')
+            session._connections[('http', 'localhost:5665')] = failing
+            self.assertRaises(httplib.HTTPException, session.post, self.url,
+                              headers=override(method), json={})
+            self.assertTrue(failing.closed)
+            self.assertEqual(session.opened, [])
+
+    def test_raises_new_connection(self):
+        session = Session([Connection('send'), Connection()])
+        self.assertRaises(socket.error, session.post, self.url,
+                          headers=override('GET'), json={})
+        self.assertEqual(len(session.connections), 1)
+
+    def test_dropped(self):
+        client, server = socket.socketpair()
+        connection = Connection()
+        connection.sock = client
+        try:
+            self.assertFalse(_dropped(connection))
+            server.close()
+            self.assertTrue(_dropped(connection))
+        finally:
+            client.close()
+
+
+class ResponseTest(unittest.TestCase):
+    '''
+    reading responses
+    '''
+
+    def test_gzip_lines(self):
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb') as compressed:
+            compressed.write(b'{"a": 1}\n{"b": 2}\n')
+        raw = Response(buf.getvalue(), [('Content-Encoding', 'gzip')])
+        response = HttpClientResponse(raw, 'url')
+        self.assertEqual(list(response.iter_lines()),
+                         [b'{"a": 1}', b'{"b": 2}'])
+
+
+if __name__ == '__main__':
+    unittest.main()
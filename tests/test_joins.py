@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the client-side host joins
+'''
+
+from __future__ import print_function
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.filters import select  # noqa: E402
+from icinga2api.joins import split_joins  # noqa: E402
+from icinga2api.objects import Objects  # noqa: E402
+
+HOSTS = [
+    {'name': 'a', 'type': 'Host',
+     'attrs': {'name': 'a', 'address': '10.0.0.1', 'state': 0}},
+    {'name': 'b', 'type': 'Host',
+     'attrs': {'name': 'b', 'address': '10.0.0.2', 'state': 1}},
+]
+
+SERVICES = [
+    {'name': '{0}!{1}'.format(host, service), 'type': 'Service',
+     'attrs': {'host_name': host, 'name': service, 'state': state}}
+    for host, service, state in (
+        ('a', 'ping', 0), ('a', 'http', 2), ('b', 'ping', 0))
+]
+
+
+class ServerObjects(Objects):
+    '''
+    objects endpoint answering listings of HOSTS and SERVICES, joining the
+    host like the server
+    '''
+
+    def __init__(self):
+        super(ServerObjects, self).__init__(None)
+        self.payloads = []
+
+    def _request(self, method, url_path, payload=None, stream=False):
+        self.payloads.append((url_path, payload))
+        objects = HOSTS if url_path.endswith('hosts') else SERVICES
+        if 'filter' in payload:
+            objects = select(objects, payload['filter'],
+                             payload.get('filter_vars'))
+        by_name = dict((host['name'], host['attrs']) for host in HOSTS)
+        results = []
+        for obj in objects:
+            attrs = obj['attrs']
+            if 'attrs' in payload:
+                attrs = dict((key, value) for key, value in attrs.items()
+                             if key in payload['attrs'])
+            result = {'name': obj['name'], 'type': obj['type'],
+                      'attrs': attrs, 'joins': {}}
+            joins = payload.get('joins') or ()
+            host_attrs = [join[5:] for join in joins
+                          if join.startswith('host.')]
+            if host_attrs or 'host' in joins or payload.get('all_joins'):
+                host = by_name[obj['attrs']['host_name']]
+                result['joins']['host'] = dict(
+                    (key, value) for key, value in host.items()
+                    if not host_attrs or key in host_attrs)
+            results.append(result)
+        return {'results': results}
+
+
+class SplitJoinsTest(unittest.TestCase):
+    '''
+    separating the host join from the other joins
+    '''
+
+    def test_split_joins(self):
+        self.assertEqual(split_joins('Service', ['host.address', 'host.state',
+                                                 'check_command']),
+                         (['address', 'state'], ['check_command']))
+        self.assertEqual(split_joins('Service', ['host']), (None, []))
+        self.assertEqual(split_joins('Service', ['check_command']),
+                         ([], ['check_command']))
+        host_attrs, others = split_joins('Comment', True)
+        self.assertEqual((host_attrs, others), (None, ['service']))
+
+
+class JoinHostsTest(unittest.TestCase):
+    '''
+    listings with client_joins have the shape of server-side joins
+    '''
+
+    def test_same_as_server(self):
+        objects = ServerObjects()
+        for joins in (['host.address', 'host.state'], ['host'], True):
+            for attrs in (None, ['state']):
+                server = objects.list('Service', attrs=attrs, joins=joins)
+                client = objects.list('Service', attrs=attrs, joins=joins,
+                                      client_joins=True)
+                self.assertEqual(client, server)
+
+    def test_shared_host(self):
+        objects = ServerObjects()
+        services = objects.list('Service', joins=['host.address'],
+                                client_joins=True)
+        self.assertTrue(services[0]['joins']['host'] is
+                        services[1]['joins']['host'])
+        # the services are listed without join, the hosts once
+        self.assertEqual([payload for _, payload in objects.payloads], [
+            {}, {'attrs': ['address']}])
+        self.assertNotIn('joins', SERVICES[0])
+
+    def test_selection(self):
+        objects = ServerObjects()
+        services = objects.list('Service', filters='service.state != 0',
+                                joins=['host.state'], client_joins=True)
+        self.assertEqual(services[0]['joins']['host'], {'state': 0})
+        # only the referenced hosts are requested
+        url_path, payload = objects.payloads[-1]
+        self.assertEqual(url_path, 'v1/objects/hosts')
+        self.assertEqual(list(payload['filter_vars'].values()), [['a']])
+
+
+if __name__ == '__main__':
+    unittest.main()
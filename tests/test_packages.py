@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the config rendering and stage polling of config packages
+'''
+
+from __future__ import print_function
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.exceptions import (  # noqa: E402
+    Icinga2ApiConnectionError, Icinga2ApiException)
+from icinga2api.packages import (  # noqa: E402
+    ConfigPackages, render_files, render_object, render_value)
+
+
+class RenderTest(unittest.TestCase):
+    '''
+    objects as config text
+    '''
+
+    def test_values(self):
+        self.assertEqual(render_value(None), 'null')
+        self.assertEqual(render_value(True), 'true')
+        self.assertEqual(render_value(42), '42')
+        self.assertEqual(render_value(-0.5), '-0.5')
+        self.assertEqual(render_value(1e16), '10000000000000000')
+        self.assertEqual(render_value(2.5e-7), '0.00000025')
+        self.assertEqual(render_value(u'a "b"\n'), u'"a \\"b\\"\\n"')
+        self.assertEqual(render_value(['a', 1]), '[ "a", 1 ]')
+        self.assertEqual(render_value({}), '{}')
+        self.assertEqual(render_value({'b': 1, 'a': [2]}),
+                         '{\n  "a" = [ 2 ]\n  "b" = 1\n}')
+
+    def test_invalid_values(self):
+        for value in (float('nan'), float('inf'), float('-inf'), object()):
+            self.assertRaises(Icinga2ApiException, render_value, value)
+
+    def test_object(self):
+        text = render_object({
+            'type': 'Service',
+            'name': 'web01!http',
+            'templates': ['generic-service'],
+            'attrs': {'check_command': 'http', 'vars.http_vhost': 'web01',
+                      'vars.x-y': 1, 'vars.include': True},
+        })
+        self.assertEqual(text, '\n'.join([
+            'object Service "http" {',
+            '  import "generic-service"',
+            '  check_command = "http"',
+            '  host_name = "web01"',
+            '  vars.http_vhost = "web01"',
+            '  vars.@include = true',
+            '  vars["x-y"] = 1',
+            '}\n']))
+
+    def test_invalid_object(self):
+        self.assertRaises(Icinga2ApiException, render_object,
+                          {'type': 'Host x', 'name': 'a'})
+        self.assertRaises(Icinga2ApiException, render_object,
+                          {'type': 'Host', 'name': 'a',
+                           'attrs': {'1st': 1}})
+
+    def test_files(self):
+        objects = [{'type': 'Host', 'name': 'h{0}'.format(number),
+                    'attrs': {'zone': 'dmz' if number % 2 else None}}
+                   for number in range(5)]
+        objects.append({'type': 'Service', 'name': 'h1!ping',
+                        'attrs': {'zone': 'dmz'}})
+        files = render_files(objects, objects_per_file=2)
+        self.assertEqual(sorted(files), [
+            'conf.d/host-0.conf', 'conf.d/host-1.conf',
+            'zones.d/dmz/host-0.conf', 'zones.d/dmz/service-0.conf'])
+        self.assertEqual(files['conf.d/host-0.conf'].count('object Host'), 2)
+        # the zone is given by the directory
+        self.assertNotIn('zone =', files['zones.d/dmz/host-0.conf'])
+
+
+class Packages(ConfigPackages):
+    '''
+    config packages endpoint with scripted stage status results
+    '''
+
+    def __init__(self, results):
+        super(Packages, self).__init__(None)
+        self.results = list(results)
+        self.polls = 0
+
+    def stage_status(self, package, stage):
+        self.polls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class WaitTest(unittest.TestCase):
+    '''
+    polling the validation of a stage
+    '''
+
+    valid = {'finished': True, 'valid': True, 'active': True, 'log': ''}
+
+    def test_retries_reloads(self):
+        packages = Packages([
+            Icinga2ApiConnectionError('refused'),
+            Icinga2ApiException('reloading', status_code=503),
+            {'finished': False},
+            self.valid])
+        self.assertEqual(packages.wait('p', 's', interval=0), self.valid)
+        self.assertEqual(packages.polls, 4)
+
+    def test_raises_other_errors(self):
+        for error in (Icinga2ApiException('denied', status_code=403),
+                      Icinga2ApiException('missing', status_code=404)):
+            packages = Packages([error, self.valid])
+            self.assertRaises(Icinga2ApiException, packages.wait, 'p', 's',
+                              interval=0)
+            self.assertEqual(packages.polls, 1)
+        packages = Packages([KeyError('bug'), self.valid])
+        self.assertRaises(KeyError, packages.wait, 'p', 's', interval=0)
+
+    def test_invalid_stage(self):
+        packages = Packages([dict(self.valid, valid=False, log='error')])
+        self.assertRaises(Icinga2ApiException, packages.wait, 'p', 's')
+
+    def test_timeout(self):
+        packages = Packages([{'finished': False}] * 3)
+        self.assertRaises(Icinga2ApiException, packages.wait, 'p', 's',
+                          timeout=0, interval=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
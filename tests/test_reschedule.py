@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the spread rescheduling
+'''
+
+from __future__ import print_function
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.exceptions import Icinga2ApiException  # noqa: E402
+from icinga2api.reschedule import (  # noqa: E402
+    NAMES_VAR, check_cost, plan_reschedule, submit_plan)
+
+
+def service(name, cost=None, zone=None):
+    '''
+    return a service as in a listing
+    '''
+
+    attrs = {'zone': zone, 'last_check_result': None}
+    if cost is not None:
+        attrs['last_check_result'] = {
+            'execution_start': 100.0, 'execution_end': 100.0 + cost}
+    return {'name': name, 'attrs': attrs}
+
+
+class Actions(object):
+    '''
+    actions endpoint recording reschedule-check requests
+    '''
+
+    def __init__(self, fail=()):
+        self.fail = fail
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def reschedule_check(self, object_type, filters, filter_vars=None,
+                         next_check=None, force_check=True):
+        names = filter_vars[NAMES_VAR]
+        with self.lock:
+            self.requests.append((filters, list(names), next_check))
+        if set(names) & set(self.fail):
+            raise Icinga2ApiException('failed', status_code=500)
+        return {'results': [{'code': 200}] * len(names)}
+
+
+class PlanTest(unittest.TestCase):
+    '''
+    spreading objects over buckets
+    '''
+
+    def test_check_cost(self):
+        self.assertEqual(check_cost(service('a', 2.5)), 2.5)
+        self.assertEqual(check_cost(service('a')), 1.0)
+        self.assertEqual(check_cost(service('a', 0), default=0.5), 0.5)
+
+    def test_cost(self):
+        objects = [service('slow', 30)] + [
+            service('s{0}'.format(number), 1) for number in range(30)]
+        plan = plan_reschedule('Service', objects, window=30, interval=10,
+                               start=1000, jitter=False)
+        self.assertEqual(len(plan), 31)
+        self.assertEqual(len(plan.buckets), 3)
+        self.assertEqual([point['next_check'] for point in plan.load_curve()],
+                         [1000, 1010, 1020])
+        # the slow check gets a bucket of its own
+        slow = [bucket for bucket in plan.buckets
+                if 'slow' in bucket['names']][0]
+        self.assertEqual(slow['names'], ['slow'])
+        self.assertEqual(plan.peak(), 30)
+
+    def test_count_and_jitter(self):
+        objects = [service('s{0}'.format(number), number)
+                   for number in range(10)]
+        plan = plan_reschedule('Service', objects, window=50, interval=10,
+                               by='count', start=0, seed=1)
+        self.assertEqual([point['objects'] for point in plan.load_curve()],
+                         [2] * 5)
+        for number, point in enumerate(plan.load_curve()):
+            self.assertTrue(
+                number * 10 <= point['next_check'] < (number + 1) * 10)
+
+    def test_zone(self):
+        objects = [service('a{0}'.format(number), zone='a')
+                   for number in range(4)]
+        objects += [service('b{0}'.format(number), zone='b')
+                    for number in range(2)]
+        plan = plan_reschedule('Service', objects, window=20, interval=10,
+                               by='zone', jitter=False)
+        for bucket in plan.buckets:
+            zones = [name[0] for name in bucket['names']]
+            self.assertEqual(zones.count('a'), 2)
+            self.assertEqual(zones.count('b'), 1)
+
+    def test_invalid(self):
+        self.assertRaises(Icinga2ApiException, plan_reschedule, 'Service',
+                          [], by='host')
+        self.assertRaises(Icinga2ApiException, plan_reschedule, 'Service',
+                          [], interval=0)
+
+
+class SubmitTest(unittest.TestCase):
+    '''
+    rescheduling the buckets of a plan
+    '''
+
+    def test_chunks(self):
+        objects = [service('s{0}'.format(number)) for number in range(25)]
+        plan = plan_reschedule('Service', objects, window=20, interval=10,
+                               by='count', start=0, jitter=False)
+        actions = Actions(fail=['s0'])
+        submit_plan(actions, plan, chunk_size=5)
+        self.assertEqual(len(actions.requests), 6)
+        for filters, names, next_check in actions.requests:
+            self.assertEqual(filters, 'service.__name in ' + NAMES_VAR)
+            self.assertTrue(len(names) <= 5)
+            self.assertIn(next_check, (0, 10))
+        self.assertEqual(
+            sorted(name for request in actions.requests
+                   for name in request[1]),
+            sorted(obj['name'] for obj in objects))
+        self.assertEqual(len(plan.results), 5)
+        self.assertEqual(len(plan.failed), 1)
+        bucket, error = plan.failed[0]
+        self.assertIn('s0', bucket['names'])
+        self.assertEqual(error.status_code, 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
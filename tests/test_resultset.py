@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the indexed result sets
+'''
+
+from __future__ import print_function
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.resultset import ResultSet  # noqa: E402
+
+
+def service(host, name, state=0, groups=()):
+    '''
+    return a service as in a listing
+    '''
+
+    return {'name': '{0}!{1}'.format(host, name), 'type': 'Service',
+            'attrs': {'host_name': host, 'state': state,
+                      'groups': list(groups)}}
+
+
+def names(objects):
+    '''
+    return the names of objects
+    '''
+
+    return [obj['name'] for obj in objects]
+
+
+class ResultSetTest(unittest.TestCase):
+    '''
+    indexes kept up to date by upsert() and discard()
+    '''
+
+    def setUp(self):
+        self.services = ResultSet([
+            service('a', 'ping', 0, ['web']),
+            service('a', 'http', 2, ['web', 'db']),
+            service('b', 'ping', 0),
+            service('c', 'ping', 1, ['db']),
+        ])
+
+    def test_indexes(self):
+        self.assertEqual(names(self.services.where('attrs.host_name', 'a')),
+                         ['a!ping', 'a!http'])
+        self.assertEqual(names(self.services.where('attrs.groups', 'db')),
+                         ['a!http', 'c!ping'])
+        self.assertEqual(self.services.count_by('attrs.state'),
+                         {0: 2, 1: 1, 2: 1})
+        self.assertEqual(self.services.where('attrs.missing', 1), [])
+        self.assertEqual(self.services.get('b!ping')['attrs']['state'], 0)
+        self.assertEqual(self.services.get('x!ping'), None)
+
+    def test_upsert(self):
+        self.services.count_by('attrs.state')
+        self.services.index_by('attrs.groups')
+        old = self.services.upsert(service('a', 'ping', 2, ['db']))
+        self.assertEqual(old['attrs']['state'], 0)
+        self.assertEqual(self.services.upsert(service('d', 'ping')), None)
+        self.assertEqual(len(self.services), 5)
+        self.assertEqual(self.services.count_by('attrs.state'),
+                         {0: 2, 1: 1, 2: 2})
+        self.assertEqual(names(self.services.where('attrs.groups', 'web')),
+                         ['a!http'])
+        # the replaced object keeps its position, but comes last in indexes
+        self.assertEqual(self.services[0]['attrs']['state'], 2)
+        self.assertEqual(names(self.services.where('attrs.groups', 'db')),
+                         ['a!http', 'c!ping', 'a!ping'])
+        self.assertEqual(self.services.get('d!ping')['name'], 'd!ping')
+
+    def test_discard(self):
+        self.services.count_by('attrs.host_name')
+        removed = self.services.discard('a!ping')
+        self.assertEqual(removed['name'], 'a!ping')
+        self.assertEqual(self.services.discard('a!ping'), None)
+        # the last object moved into the free position
+        self.assertEqual(names(self.services),
+                         ['c!ping', 'a!http', 'b!ping'])
+        self.assertEqual(self.services.count_by('attrs.host_name'),
+                         {'a': 1, 'b': 1, 'c': 1})
+        self.assertEqual(self.services.get('c!ping')['name'], 'c!ping')
+        self.services.discard('b!ping')
+        self.assertEqual(names(self.services), ['c!ping', 'a!http'])
+        self.assertEqual(self.services.get('a!http')['name'], 'a!http')
+
+    def test_drop_index(self):
+        self.services.count_by('attrs.state')
+        self.services[2]['attrs']['state'] = 3
+        self.services.drop_index('attrs.state')
+        self.assertEqual(self.services.count_by('attrs.state'),
+                         {0: 1, 1: 1, 2: 1, 3: 1})
+        self.services.append(service('d', 'ping'))
+        self.services.drop_index()
+        self.assertEqual(self.services.get('d!ping')['name'], 'd!ping')
+
+    def test_filter(self):
+        result = self.services.filter('service.state != 0')
+        self.assertTrue(isinstance(result, ResultSet))
+        self.assertEqual(names(result), ['a!http', 'c!ping'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the priority request scheduler
+'''
+
+from __future__ import print_function
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.client import Client  # noqa: E402
+from icinga2api.exceptions import Icinga2ApiException  # noqa: E402
+from icinga2api.scheduler import (  # noqa: E402
+    RequestScheduler, carry, current_priority, priority)
+from icinga2api.transport import Transport  # noqa: E402
+
+
+def wait_for(condition):
+    '''
+    wait until condition() is true
+    '''
+
+    deadline = time.time() + 5
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.001)
+
+
+class PriorityTest(unittest.TestCase):
+    '''
+    priority classes of threads
+    '''
+
+    def test_priority(self):
+        self.assertEqual(current_priority('interactive'), 'interactive')
+        with priority('bulk'):
+            self.assertEqual(current_priority('interactive'), 'bulk')
+            with priority('background'):
+                self.assertEqual(current_priority(), 'background')
+            self.assertEqual(current_priority(), 'bulk')
+        self.assertEqual(current_priority(), None)
+
+    def test_carry(self):
+        seen = []
+        with priority('background'):
+            function = carry(lambda: seen.append(current_priority()))
+        default = carry(lambda: seen.append(current_priority()), 'bulk')
+        for target in (function, default):
+            thread = threading.Thread(target=target)
+            thread.start()
+            thread.join()
+        self.assertEqual(seen, ['background', 'bulk'])
+
+
+class SchedulerTest(unittest.TestCase):
+    '''
+    reserved and shared slots, weighted fair queuing
+    '''
+
+    def test_invalid(self):
+        self.assertRaises(Icinga2ApiException, RequestScheduler, capacity=2)
+        scheduler = RequestScheduler()
+        self.assertRaises(Icinga2ApiException, scheduler.acquire, 'urgent')
+
+    def test_reserved(self):
+        scheduler = RequestScheduler(
+            capacity=3, reserved={'interactive': 1, 'actions': 0})
+        for _ in range(2):
+            self.assertEqual(scheduler.acquire('bulk'), 0.0)
+        # the shared slots are taken, the reserved one is still free
+        waiter = threading.Thread(target=scheduler.acquire, args=('bulk',))
+        waiter.start()
+        wait_for(lambda: scheduler.stats()['bulk']['waiting'])
+        self.assertEqual(scheduler.acquire('interactive'), 0.0)
+        scheduler.release('interactive')
+        self.assertEqual(scheduler.stats()['bulk']['waiting'], 1)
+        scheduler.release('bulk')
+        waiter.join(5)
+        stats = scheduler.stats()['bulk']
+        self.assertEqual((stats['requests'], stats['queued'],
+                          stats['running'], stats['waiting']), (3, 1, 2, 0))
+
+    def test_weights(self):
+        scheduler = RequestScheduler(
+            capacity=1, weights={'interactive': 4, 'bulk': 1},
+            reserved={'interactive': 0, 'actions': 0})
+        scheduler.acquire('background')
+        granted = []
+
+        def request(name):
+            scheduler.acquire(name)
+            granted.append(name)
+            scheduler.release(name)
+
+        threads = []
+        for name in ['bulk'] * 5 + ['interactive'] * 5:
+            thread = threading.Thread(target=request, args=(name,))
+            thread.start()
+            threads.append(thread)
+            wait_for(lambda: sum(
+                stats['waiting']
+                for stats in scheduler.stats().values()) == len(threads))
+        scheduler.release('background')
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(granted), 10)
+        # four interactive requests per bulk request while both wait
+        self.assertEqual(granted[:5].count('interactive'), 4)
+        self.assertEqual(granted[-1], 'bulk')
+
+
+class RecordingScheduler(RequestScheduler):
+    '''
+    scheduler keeping the classes of the slots
+    '''
+
+    def __init__(self):
+        super(RecordingScheduler, self).__init__()
+        self.names = []
+
+    def acquire(self, name):
+        self.names.append(name)
+        return super(RecordingScheduler, self).acquire(name)
+
+
+class Answering(Transport):
+    '''
+    transport answering every request with an empty result
+    '''
+
+    def request(self, method, url, payload=None, stream=False):
+        return Response()
+
+
+class Response(object):
+    '''
+    empty result
+    '''
+
+    status_code = 200
+    url = 'https://icinga2:5665/'
+
+    def json(self):
+        return {'results': []}
+
+
+class ClientTest(unittest.TestCase):
+    '''
+    default priority classes of the endpoints
+    '''
+
+    def test_endpoints(self):
+        scheduler = RecordingScheduler()
+        client = Client('https://icinga2:5665', 'root', 'icinga',
+                        scheduler=scheduler, transport=Answering)
+        client.objects.list('Host')
+        client.objects.delete('Host', 'a')
+        client.actions.reschedule_check('Host', 'host.name == "a"')
+        client.status.list()
+        with priority('background'):
+            client.objects.list('Host')
+        self.assertEqual(scheduler.names, [
+            'interactive', 'bulk', 'actions', 'interactive', 'background'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the shard filters
+'''
+
+from __future__ import print_function
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.client import Client  # noqa: E402
+from icinga2api.exceptions import Icinga2ApiException  # noqa: E402
+from icinga2api.filters import compile_filter  # noqa: E402
+from icinga2api.sharding import (  # noqa: E402
+    _ranges, client_settings, list_sharded, shard_filters)
+from icinga2api.transport import Transport  # noqa: E402
+
+
+class Objects(object):
+    '''
+    objects endpoint listing fixed hosts and zones
+    '''
+
+    def __init__(self, hosts, zones):
+        self.hosts = hosts
+        self.zones = zones
+
+    def list(self, object_type, attrs=None):
+        names = self.hosts if object_type == 'Host' else self.zones
+        return [{'name': name} for name in names]
+
+
+def host(name, zone=''):
+    '''
+    return a host as listed
+    '''
+
+    return {'type': 'Host', 'name': name, 'attrs': {'zone': zone}}
+
+
+class ShardFiltersTest(unittest.TestCase):
+    '''
+    shards are disjoint and cover all objects
+    '''
+
+    def assert_partition(self, shard_list, objects):
+        '''
+        every object matches exactly one shard
+        '''
+
+        for obj in objects:
+            matches = [compile_filter(expression)(obj, shard_vars)
+                       for expression, shard_vars in shard_list]
+            self.assertEqual(matches.count(True), 1, obj['name'])
+
+    def test_ranges(self):
+        self.assertEqual(_ranges(['d', 'a', 'c', 'b'], 2),
+                         [(None, 'c'), ('c', None)])
+        self.assertEqual(_ranges(['a'], 4), [(None, None)])
+        self.assertEqual(_ranges([], 4), [(None, None)])
+
+    def test_range(self):
+        names = ['web{0:02d}'.format(number) for number in range(20)]
+        shard_list = shard_filters(Objects(names, []), 'Host', 4)
+        self.assertEqual(len(shard_list), 4)
+        # the bounds are sent, not the names
+        self.assertTrue(all(len(shard_vars) <= 2
+                            for _, shard_vars in shard_list))
+        # hosts created after the listing are covered by the open ends
+        self.assert_partition(shard_list, [host(name) for name in
+                                           names + ['aaa', 'zzz', 'web05a']])
+
+    def test_prefix(self):
+        names = ['a1', 'a2', 'b1', 'c1', 'd1']
+        shard_list = shard_filters(Objects(names, []), 'Host', 2, 'prefix')
+        self.assertEqual(len(shard_list), 3)
+        self.assert_partition(shard_list, [host(name) for name in
+                                           names + ['x1', '']])
+
+    def test_zone(self):
+        shard_list = shard_filters(Objects([], ['z1', 'z2', 'z3']), 'Host',
+                                   2, 'zone', filters='host.name != "skip"')
+        self.assertEqual(len(shard_list), 3)
+        self.assert_partition(shard_list, [
+            host('a', 'z1'), host('b', 'z2'), host('c', 'z3'), host('d'),
+            host('e', 'unknown')])
+        self.assertFalse(any(compile_filter(expression)(
+            host('skip', 'z1'), shard_vars)
+            for expression, shard_vars in shard_list))
+
+    def test_filter_vars_are_kept(self):
+        shard_list = shard_filters(Objects(['a', 'b'], []), 'Host', 2,
+                                   filters='host.name in names',
+                                   filter_vars={'names': ['a']})
+        self.assertTrue(all(shard_vars['names'] == ['a']
+                            for _, shard_vars in shard_list))
+
+    def test_unknown_strategy(self):
+        objects = Objects(['a'], [])
+        self.assertRaises(Icinga2ApiException, shard_filters, objects,
+                          'Host', 2, 'hash')
+        objects.manager = Client('http://localhost:5665', 'root', 'icinga')
+        # raised by the call, not on the first iteration
+        self.assertRaises(Icinga2ApiException, list_sharded, objects,
+                          'Host', 2, 'hash')
+
+
+class ClientSettingsTest(unittest.TestCase):
+    '''
+    rebuilding clients in worker processes
+    '''
+
+    def test_settings(self):
+        client = Client('http://localhost:5665', 'root', 'icinga',
+                        timeout=5, compress_requests=1024,
+                        transport='urllib3', scheduler=True)
+        settings = client_settings(client)
+        self.assertEqual(settings['transport'], 'urllib3')
+        self.assertEqual(settings['timeout'], 5)
+        self.assertEqual(settings['compress_requests'], 1024)
+        self.assertNotIn('scheduler', settings)
+        worker = Client(**settings)
+        self.assertEqual(worker.transport.name, 'urllib3')
+
+    def test_custom_transport(self):
+        client = Client('http://localhost:5665', 'root', 'icinga',
+                        transport=Transport)
+        self.assertRaises(Icinga2ApiException, client_settings, client)
+
+
+if __name__ == '__main__':
+    unittest.main()
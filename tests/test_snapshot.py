@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the snapshot file format
+'''
+
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.exceptions import Icinga2ApiException  # noqa: E402
+from icinga2api.snapshot import Snapshot, SnapshotWriter  # noqa: E402
+
+
+def service(number, state=0):
+    '''
+    return a service as listed
+    '''
+
+    return {
+        'type': 'Service',
+        'name': 'host{0}!ping'.format(number),
+        'attrs': {'host_name': 'host{0}'.format(number), 'state': state},
+        'joins': {},
+    }
+
+
+class SnapshotTest(unittest.TestCase):
+    '''
+    writing, reading and delta snapshots
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, file_name, objects, base=None):
+        path = os.path.join(self.directory, file_name)
+        with SnapshotWriter(path, 'Service', base=base) as writer:
+            for obj in objects:
+                writer.add(obj)
+        return Snapshot(path)
+
+    def test_round_trip(self):
+        value = {
+            'type': 'Host',
+            'name': u'h\xf6st',
+            'attrs': {
+                'none': None, 'true': True, 'false': False,
+                'zero': 0, 'small': -1, 'large': 2 ** 70, 'negative': -2 ** 70,
+                'float': 1.5, 'negative_float': -0.25, 'text': u'✓ ok',
+                'empty': '', 'list': [1, 'two', [3.0], {}],
+                'nested': {'a': {'b': ['c']}},
+            },
+        }
+        with self.write('round.snap', [value, service(1)]) as snapshot:
+            self.assertEqual(len(snapshot), 2)
+            self.assertEqual(snapshot.object_type, 'Service')
+            self.assertEqual(snapshot.get(u'h\xf6st'), value)
+            self.assertEqual(list(snapshot), [value, service(1)])
+            self.assertEqual(snapshot.names(), [u'h\xf6st', 'host1!ping'])
+            self.assertTrue('host1!ping' in snapshot)
+            self.assertRaises(KeyError, snapshot.get, 'missing')
+
+    def test_filter(self):
+        objects = [service(number, number % 3) for number in range(9)]
+        with self.write('filter.snap', objects) as snapshot:
+            names = [obj['name'] for obj in snapshot.filter(
+                'service.state == 2')]
+            self.assertEqual(names, ['host2!ping', 'host5!ping',
+                                     'host8!ping'])
+
+    def test_delta(self):
+        first = self.write('1.snap', [service(number) for number in range(4)])
+        changed = [service(0, 2), service(1), service(2), service(4)]
+        second = self.write('2.snap', changed, base=first)
+        self.assertEqual(list(second), changed)
+        self.assertEqual(second.diff(first), {
+            'added': ['host4!ping'],
+            'removed': ['host3!ping'],
+            'changed': ['host0!ping'],
+        })
+        self.assertEqual(sorted(second.stored_digests()),
+                         ['host0!ping', 'host4!ping'])
+        second.close()
+        first.close()
+
+    def test_delta_chain(self):
+        objects = [service(number) for number in range(50)]
+        for obj in objects:
+            obj['attrs']['output'] = 'PING OK - {0}'.format(obj['name']) * 10
+        first = self.write('0.snap', objects)
+        previous = first
+        for generation in range(1, 4):
+            objects[0] = service(0, generation)
+            snapshot = self.write('{0}.snap'.format(generation), objects,
+                                  base=previous)
+            # every delta only stores the changed object
+            self.assertEqual(list(snapshot.stored_digests()), ['host0!ping'])
+            self.assertTrue(os.path.getsize(snapshot.path) <
+                            os.path.getsize(first.path) / 2)
+            if previous is not first:
+                previous.close()
+            previous = snapshot
+        previous.close()
+        first.close()
+        # generation 3 references the unchanged objects in generation 0
+        os.remove(os.path.join(self.directory, '1.snap'))
+        os.remove(os.path.join(self.directory, '2.snap'))
+        with Snapshot(os.path.join(self.directory, '3.snap')) as snapshot:
+            self.assertEqual(list(snapshot), objects)
+            self.assertEqual([source['path'] for source
+                              in snapshot.meta['sources']], ['0.snap'])
+
+    def test_base_is_not_replaced(self):
+        first = self.write('1.snap', [service(1)])
+        second = self.write('2.snap', [service(1)], base=first)
+        self.assertRaises(Icinga2ApiException, SnapshotWriter, first.path,
+                          base=first)
+        # 1.snap holds the records of 2.snap
+        self.assertRaises(Icinga2ApiException, SnapshotWriter, first.path,
+                          base=second)
+        self.assertEqual(second.get('host1!ping'), service(1))
+        second.close()
+        first.close()
+
+    def test_replaced_base(self):
+        first = self.write('1.snap', [service(1)])
+        self.write('2.snap', [service(1)], base=first).close()
+        first.close()
+        self.write('1.snap', [service(1)]).close()
+        with Snapshot(os.path.join(self.directory, '2.snap')) as snapshot:
+            self.assertRaises(Icinga2ApiException, snapshot.get, 'host1!ping')
+
+    def test_not_a_snapshot(self):
+        path = os.path.join(self.directory, 'text.snap')
+        with open(path, 'wb') as handle:
+            handle.write(b'not a snapshot, but long enough to have a footer'
+                         b' of fifty-six bytes')
+        self.assertRaises(Icinga2ApiException, Snapshot, path)
+
+    def test_truncated_snapshot(self):
+        snapshot = self.write('full.snap', [service(1)])
+        snapshot.close()
+        path = os.path.join(self.directory, 'full.snap')
+        with open(path, 'r+b') as handle:
+            handle.truncate(12)
+        self.assertRaises(Icinga2ApiException, Snapshot, path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the event spool file format
+'''
+
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.exceptions import Icinga2ApiException  # noqa: E402
+from icinga2api.spool import INDEX_ENTRY, EventSpool  # noqa: E402
+
+
+class Clock(object):
+    '''
+    manually advanced clock
+    '''
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class SpoolTest(unittest.TestCase):
+    '''
+    append, replay and recovery
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.clock = Clock()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def open(self, **kwargs):
+        return EventSpool(self.directory, clock=self.clock, **kwargs)
+
+    def segment_files(self, suffix):
+        return sorted(os.path.join(self.directory, file_name)
+                      for file_name in os.listdir(self.directory)
+                      if file_name.endswith(suffix))
+
+    def test_round_trip(self):
+        spool = self.open()
+        events = ['{"type": "CheckResult"}', u'{"output": "über"}', '']
+        offsets = []
+        for event in events:
+            offsets.append(spool.append(event))
+            self.clock.now += 1
+        self.assertEqual(offsets, [0, 1, 2])
+        self.assertEqual(list(spool.replay()), [
+            (0, 1000.0, events[0]), (1, 1001.0, events[1]),
+            (2, 1002.0, events[2])])
+        self.assertEqual([record[0] for record in spool.replay(1)], [1, 2])
+        self.assertEqual([record[0] for record in spool.replay(since=1001.5)],
+                         [2])
+        spool.close()
+        self.assertRaises(Icinga2ApiException, spool.append, 'closed')
+
+    def test_reopen(self):
+        spool = self.open()
+        for number in range(5):
+            spool.append('event {0}'.format(number), timestamp=2000.0)
+        spool.commit('report', 3)
+        spool.close()
+
+        spool = self.open()
+        self.assertEqual(spool.next_offset, 5)
+        self.assertEqual(spool.committed('report'), 3)
+        self.assertEqual(spool.committed('other'), None)
+        # timestamps stay sorted even if the clock is behind
+        self.assertEqual(spool.append('event 5'), 5)
+        self.assertEqual(list(spool.replay(5)), [(5, 2000.0, 'event 5')])
+        spool.close()
+
+    def test_segments(self):
+        spool = self.open(segment_bytes=100)
+        for number in range(20):
+            spool.append('event {0:02d}'.format(number))
+        self.assertTrue(len(self.segment_files('.log')) > 1)
+        self.assertEqual([record[2] for record in spool.replay(7)],
+                         ['event {0:02d}'.format(number)
+                          for number in range(7, 20)])
+        spool.close()
+
+    def test_torn_record(self):
+        spool = self.open()
+        for number in range(3):
+            spool.append('event {0}'.format(number))
+        spool.close()
+        # the last record was only partly written
+        log_path = self.segment_files('.log')[-1]
+        with open(log_path, 'r+b') as log:
+            log.truncate(os.path.getsize(log_path) - 2)
+
+        spool = self.open()
+        self.assertEqual(spool.next_offset, 2)
+        self.assertEqual([record[2] for record in spool.replay()],
+                         ['event 0', 'event 1'])
+        self.assertEqual(spool.append('event 2 again'), 2)
+        self.assertEqual([record[2] for record in spool.replay(2)],
+                         ['event 2 again'])
+        spool.close()
+
+    def test_torn_index_entry(self):
+        spool = self.open()
+        for number in range(3):
+            spool.append('event {0}'.format(number))
+        spool.close()
+        index_path = self.segment_files('.idx')[-1]
+        with open(index_path, 'ab') as index:
+            index.write(b'\x01\x02\x03')
+
+        spool = self.open()
+        self.assertEqual(spool.next_offset, 3)
+        self.assertEqual(os.path.getsize(index_path), 3 * INDEX_ENTRY.size)
+        spool.close()
+
+    def test_retention_without_traffic(self):
+        spool = self.open(retention_seconds=10, fsync_interval=0)
+        for number in range(30):
+            spool.append('event {0}'.format(number))
+            self.clock.now += 1
+        # only the segments of the last two windows are kept
+        self.assertTrue(spool.first_offset > 0)
+        spool.close()
+
+        self.clock.now += 3600
+        spool = self.open(retention_seconds=10)
+        self.assertEqual(list(spool.replay()), [])
+        self.assertEqual(spool.next_offset, 30)
+        spool.close()
+
+    def test_max_segments(self):
+        spool = self.open(segment_bytes=50, max_segments=2)
+        for number in range(20):
+            spool.append('event {0:02d}'.format(number))
+        self.assertTrue(len(self.segment_files('.log')) <= 2)
+        self.assertEqual(list(spool.replay())[-1][2], 'event 19')
+        spool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
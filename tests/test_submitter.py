@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the check result submitter
+'''
+
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from icinga2api.exceptions import (  # noqa: E402
+    Icinga2ApiConnectionError, Icinga2ApiException)
+from icinga2api.submitter import CheckResultSubmitter  # noqa: E402
+
+
+class Actions(object):
+    '''
+    actions endpoint keeping the results, optionally blocking or failing
+    '''
+
+    def __init__(self, errors=None, block=None):
+        self.errors = dict(errors or {})
+        self.block = block
+        self.blocked = threading.Event()
+        self.release = threading.Event()
+        self.results = []
+        self.lock = threading.Lock()
+
+    def process_check_result(self, object_type, name, exit_status,
+                             plugin_output, **kwargs):
+        if name == self.block and not self.release.is_set():
+            self.blocked.set()
+            self.release.wait(5)
+        with self.lock:
+            errors = self.errors.get(name)
+            if errors:
+                raise errors.pop(0)
+            self.results.append((name, plugin_output))
+
+
+class SubmitterTest(unittest.TestCase):
+    '''
+    queueing, superseding, spilling and retrying results
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spill_path = os.path.join(self.directory, 'spill')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_sends(self):
+        actions = Actions()
+        with CheckResultSubmitter(actions, workers=2) as submitter:
+            for number in range(10):
+                self.assertTrue(submitter.submit(
+                    'Service', 'h!s{0}'.format(number), 0, 'OK'))
+            self.assertTrue(submitter.flush(5))
+            stats = submitter.stats()
+        self.assertEqual(len(actions.results), 10)
+        self.assertEqual((stats['sent'], stats['queue_depth']), (10, 0))
+        self.assertRaises(Icinga2ApiException, submitter.submit,
+                          'Service', 'h!s', 0, 'OK')
+        self.assertRaises(Icinga2ApiException, submitter.submit,
+                          'Zone', 'z', 0, 'OK')
+
+    def test_in_flight(self):
+        actions = Actions(block='a')
+        submitter = CheckResultSubmitter(actions, workers=2, batch_size=1)
+        submitter.submit('Host', 'a', 0, 'first')
+        self.assertTrue(actions.blocked.wait(5))
+        # the newer result of a waits while the first one is sent
+        submitter.submit('Host', 'a', 2, 'second')
+        submitter.submit('Host', 'b', 0, 'other')
+        while not actions.results:
+            time.sleep(0.001)
+        self.assertEqual(actions.results, [('b', 'other')])
+        self.assertEqual(submitter.stats()['queue_depth'], 1)
+        actions.release.set()
+        self.assertTrue(submitter.close(5))
+        self.assertEqual(actions.results,
+                         [('b', 'other'), ('a', 'first'), ('a', 'second')])
+
+    def test_supersede_and_spill(self):
+        submitter = CheckResultSubmitter(Actions(), workers=0, max_queue=2,
+                                         spill_path=self.spill_path)
+        for name, output in (('a', '1'), ('b', '1'), ('a', '2'),
+                             ('c', '1'), ('d', '1')):
+            submitter.submit('Host', name, 0, output)
+        stats = submitter.stats()
+        self.assertEqual((stats['queue_depth'], stats['superseded'],
+                          stats['spilled']), (2, 1, 2))
+        self.assertTrue(stats['spill_bytes'] > 0)
+        self.assertFalse(submitter.close(0))
+
+        # the spilled results are sent after a restart
+        actions = Actions()
+        submitter = CheckResultSubmitter(actions, workers=1, max_queue=2,
+                                         spill_path=self.spill_path)
+        self.assertTrue(submitter.close(5))
+        self.assertEqual(actions.results, [('c', '1'), ('d', '1')])
+        self.assertFalse(os.path.exists(self.spill_path))
+
+    def test_drop(self):
+        submitter = CheckResultSubmitter(Actions(), workers=0, max_queue=1)
+        self.assertTrue(submitter.submit('Host', 'a', 0, 'OK'))
+        self.assertFalse(submitter.submit('Host', 'b', 0, 'OK'))
+        self.assertEqual(submitter.stats()['dropped'], 1)
+
+    def test_retries(self):
+        actions = Actions(errors={
+            'a': [Icinga2ApiConnectionError('refused'),
+                  Icinga2ApiException('reloading', status_code=503)],
+            'b': [Icinga2ApiException('no object', status_code=404)],
+        })
+        submitter = CheckResultSubmitter(actions, workers=1, retry_delay=0)
+        submitter.submit('Host', 'a', 0, 'OK')
+        submitter.submit('Host', 'b', 0, 'OK')
+        self.assertTrue(submitter.close(5))
+        stats = submitter.stats()
+        self.assertEqual(actions.results, [('a', 'OK')])
+        self.assertEqual((stats['sent'], stats['retries'], stats['failed']),
+                         (1, 2, 1))
+
+    def test_spills_failed(self):
+        errors = [Icinga2ApiConnectionError('refused')] * 2
+        actions = Actions(errors={'a': errors})
+        submitter = CheckResultSubmitter(actions, workers=1, max_retries=1,
+                                         retry_delay=0,
+                                         spill_path=self.spill_path)
+        submitter.submit('Host', 'a', 0, 'OK')
+        # the result is spilled after the retries and sent from the spill
+        self.assertTrue(submitter.close(5))
+        self.assertEqual(actions.results, [('a', 'OK')])
+        self.assertEqual(submitter.stats()['spilled'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
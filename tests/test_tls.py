@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the shared TLS context
+'''
+
+from __future__ import print_function
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from icinga2api.client import Client  # noqa: E402
+from icinga2api.tls import TlsContext  # noqa: E402
+from mockserver import MockIcinga  # noqa: E402
+
+
+def certificate(directory, name):
+    '''
+    create a self-signed certificate and key for localhost
+
+    :returns: the certificate and key files
+    :rtype: tuple
+    '''
+
+    certfile = os.path.join(directory, name + '.crt')
+    keyfile = os.path.join(directory, name + '.key')
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call([
+            'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+            '-subj', '/CN=localhost', '-days', '1',
+            '-keyout', keyfile, '-out', certfile], stdout=devnull,
+            stderr=devnull)
+    return certfile, keyfile
+
+
+class Clock(object):
+    '''
+    clock which only moves when told to
+    '''
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TlsContextTest(unittest.TestCase):
+    '''
+    one context, rebuilt when the files change
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        try:
+            cls.server_files = certificate(cls.directory, 'server')
+            cls.client_files = certificate(cls.directory, 'client')
+            cls.renewed_files = certificate(cls.directory, 'renewed')
+        except OSError:
+            shutil.rmtree(cls.directory)
+            raise unittest.SkipTest('openssl is missing')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def write(self, source, target):
+        '''
+        copy a file with a new modification time, as a renewal would
+        '''
+
+        shutil.copyfile(source, target)
+        self.stamp = getattr(self, 'stamp', 0) + 1
+        os.utime(target, (self.stamp, self.stamp))
+
+    def copy(self, files, certfile, keyfile):
+        '''
+        copy a certificate and key
+        '''
+
+        self.write(files[0], certfile)
+        self.write(files[1], keyfile)
+
+    def test_reload(self):
+        certfile = os.path.join(self.directory, 'current.crt')
+        keyfile = os.path.join(self.directory, 'current.key')
+        self.copy(self.client_files, certfile, keyfile)
+        clock = Clock()
+        tls = TlsContext(certfile, keyfile, check_interval=1, clock=clock)
+        context = tls.context
+        self.assertEqual(tls.check(), 1)
+        self.copy(self.renewed_files, certfile, keyfile)
+        # the files are checked at most once per check_interval
+        self.assertTrue(tls.context is context)
+        clock.now += 1
+        self.assertFalse(tls.context is context)
+        self.assertEqual(tls.stats(), {'handshakes': 0, 'resumed': 0,
+                                       'reloads': 1, 'generation': 2})
+
+    def test_keeps_context(self):
+        certfile = os.path.join(self.directory, 'partial.crt')
+        keyfile = os.path.join(self.directory, 'partial.key')
+        self.copy(self.client_files, certfile, keyfile)
+        clock = Clock()
+        tls = TlsContext(certfile, keyfile, clock=clock)
+        context = tls.context
+        # the new certificate is written, its key not yet
+        self.write(self.renewed_files[0], certfile)
+        clock.now += 2
+        self.assertTrue(tls.context is context)
+        self.assertEqual(tls.generation, 1)
+        self.write(self.renewed_files[1], keyfile)
+        clock.now += 2
+        self.assertFalse(tls.context is context)
+        self.assertEqual(tls.generation, 2)
+
+    def test_missing_files(self):
+        tls = TlsContext(os.path.join(self.directory, 'missing.crt'))
+        self.assertRaises(IOError, tls.check)
+
+    def test_resumption(self):
+        with MockIcinga(hosts=2, services_per_host=1,
+                        certfile=self.server_files[0],
+                        keyfile=self.server_files[1]) as server:
+            client = Client(server.url.replace('127.0.0.1', 'localhost'),
+                            'root', 'icinga',
+                            ca_certificate=self.server_files[0],
+                            transport='stdlib')
+            for _ in range(3):
+                self.assertEqual(len(client.objects.list('Host')), 2)
+                # the next request needs a new connection
+                client.transport.close()
+        stats = client.tls.stats()
+        self.assertEqual(stats['handshakes'], 3)
+        self.assertEqual(stats['resumed'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the transports, without HTTP libraries or a server
+'''
+
+from __future__ import print_function
+import gzip
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from icinga2api.client import Client as Icinga2Client  # noqa: E402
+from icinga2api.exceptions import (  # noqa: E402
+    Icinga2ApiConnectionError, Icinga2ApiException)
+from icinga2api.transport import (  # noqa: E402
+    TRANSPORTS, Http2Transport, SessionStream, SessionTransport,
+    Urllib3Transport, create_transport)
+from mockserver import MockIcinga  # noqa: E402
+
+
+class Client(object):
+    '''
+    the client settings used by the transports
+    '''
+
+    version = '0.0'
+    url = 'http://localhost:5665'
+    compression = False
+    compress_requests = None
+    certificate = None
+    key = None
+    ca_certificate = None
+    username = 'root'
+    password = 'icinga'
+    tls = None
+
+
+class Response(object):
+    '''
+    streaming response with some lines
+    '''
+
+    status_code = 200
+    url = 'http://localhost:5665/v1/events'
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.closed = False
+
+    def iter_lines(self):
+        for line in self.lines:
+            yield line
+
+    def close(self):
+        self.closed = True
+
+
+class Session(object):
+    '''
+    session returning a response or raising an error
+    '''
+
+    def __init__(self, result):
+        self.result = result
+        self.posts = []
+        self.closed = 0
+
+    def post(self, **kwargs):
+        self.posts.append(kwargs)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+    def close(self):
+        self.closed += 1
+
+
+class Transport(SessionTransport):
+    '''
+    session transport with scripted sessions
+    '''
+
+    name = 'test'
+
+    def __init__(self, results):
+        super(Transport, self).__init__(Client())
+        self.results = list(results)
+        self.created = []
+
+    def create_session(self):
+        session = Session(self.results.pop(0))
+        self.created.append(session)
+        return session
+
+    def connection_errors(self):
+        return (IOError,)
+
+
+class SessionTransportTest(unittest.TestCase):
+    '''
+    sessions of regular requests and streams
+    '''
+
+    def test_reuses_session(self):
+        transport = Transport([Response([])])
+        for _ in range(3):
+            transport.request('GET', Client.url, {'attrs': ['name']})
+        self.assertEqual(len(transport.created), 1)
+        post = transport.created[0].posts[0]
+        self.assertEqual(post['headers'],
+                         {'X-HTTP-Method-Override': 'GET'})
+        self.assertEqual(post['json'], {'attrs': ['name']})
+        transport.close()
+        self.assertEqual(transport.created[0].closed, 1)
+
+    def test_stream_closes_session(self):
+        response = Response([b'a', b'b'])
+        transport = Transport([response])
+        stream = transport.request('POST', Client.url, {}, stream=True)
+        self.assertTrue(isinstance(stream, SessionStream))
+        self.assertEqual(stream.status_code, 200)
+        session = transport.created[0]
+        self.assertTrue(session.posts[0]['stream'])
+        self.assertEqual(list(stream.iter_lines()), [b'a', b'b'])
+        self.assertTrue(response.closed)
+        self.assertEqual(session.closed, 1)
+        stream.close()
+        self.assertEqual(session.closed, 1)
+
+    def test_closed_stream(self):
+        transport = Transport([Response([b'a', b'b'])])
+        stream = transport.request('POST', Client.url, {}, stream=True)
+        lines = stream.iter_lines()
+        next(lines)
+        stream.close()
+        self.assertEqual(transport.created[0].closed, 1)
+
+    def test_failed_stream(self):
+        transport = Transport([IOError('refused'), KeyError('bug')])
+        self.assertRaises(Icinga2ApiConnectionError, transport.request,
+                          'POST', Client.url, {}, stream=True)
+        self.assertRaises(KeyError, transport.request,
+                          'POST', Client.url, {}, stream=True)
+        self.assertEqual([session.closed for session in transport.created],
+                         [1, 1])
+
+
+class LazyImportTest(unittest.TestCase):
+    '''
+    the stdlib transport for short-lived processes
+    '''
+
+    def test_imports(self):
+        script = '; '.join([
+            'import sys',
+            'import icinga2api',
+            'client = icinga2api.Client("https://icinga2:5665", "root", '
+            '"icinga", transport="stdlib")',
+            'print(sorted(name for name in sys.modules if name.split(".")[0]'
+            ' in ("requests", "urllib3", "httpx", "icinga2api")))',
+        ])
+        output = subprocess.check_output([sys.executable, '-c', script],
+                                         cwd=ROOT)
+        # the endpoints are imported on first access
+        self.assertEqual(output.decode().strip(), str([
+            'icinga2api', 'icinga2api.base', 'icinga2api.client',
+            'icinga2api.configfile', 'icinga2api.exceptions',
+            'icinga2api.tls', 'icinga2api.transport']))
+
+    def test_stdlib(self):
+        with MockIcinga(hosts=3, services_per_host=2) as server:
+            client = Icinga2Client(server.url, 'root', 'icinga',
+                                   transport='stdlib')
+            for _ in range(2):
+                self.assertEqual(len(client.objects.list('Service')), 6)
+            client.close()
+
+
+def installed(url):
+    '''
+    return the names of the transports whose modules are installed
+    '''
+
+    names = []
+    for name in sorted(TRANSPORTS):
+        try:
+            Icinga2Client(url, 'root', 'icinga', transport=name).close()
+        except Icinga2ApiException:
+            continue
+        names.append(name)
+    return names
+
+
+def refused_url():
+    '''
+    return the url of a port nothing listens on
+    '''
+
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return 'http://127.0.0.1:{0}/'.format(port)
+
+
+class TransportsTest(unittest.TestCase):
+    '''
+    the same behaviour of every transport against the mock server
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockIcinga(hosts=3, services_per_host=2,
+                                event_count=3).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_transports(self):
+        for name in installed(self.server.url):
+            client = Icinga2Client(self.server.url, 'root', 'icinga',
+                                   transport=name)
+            try:
+                self.assertEqual(client.transport.name,
+                                 TRANSPORTS[name].name)
+                hosts = client.objects.list('Host', attrs=['name'])
+                self.assertEqual(len(hosts), 3)
+                services = client.objects.list(
+                    'Service', filters='service.host_name == wanted',
+                    filter_vars={'wanted': hosts[0]['name']})
+                self.assertEqual(len(services), 2)
+                with self.assertRaises(Icinga2ApiException) as context:
+                    client.objects.list('User')
+                self.assertEqual(context.exception.status_code, 404)
+                events = list(client.events.subscribe(['CheckResult'], 'q'))
+                self.assertEqual(len(events), 3)
+            finally:
+                client.close()
+
+    def test_connection_errors(self):
+        url = refused_url()
+        for name in installed(url):
+            client = Icinga2Client(url, 'root', 'icinga', transport=name)
+            try:
+                self.assertRaises(Icinga2ApiConnectionError,
+                                  client.status.list)
+                self.assertRaises(IOError, client.status.list)
+            finally:
+                client.close()
+
+    def test_create_transport(self):
+        client = Icinga2Client(self.server.url, 'root', 'icinga')
+        transport = create_transport(
+            client, lambda client: Urllib3Transport(client, pool_size=2))
+        self.assertEqual(transport.pool_size, 2)
+        self.assertTrue(create_transport(client, transport) is transport)
+        self.assertRaises(Icinga2ApiException, create_transport, client,
+                          'pycurl')
+
+
+@unittest.skipUnless('http2' in installed('http://localhost:5665/'),
+                     'httpx is missing')
+class Http2Test(unittest.TestCase):
+    '''
+    the HTTP/2 transport falls back to HTTP/1.1
+    '''
+
+    def client(self, server):
+        '''
+        return a client of the server with the http2 transport
+        '''
+
+        return Icinga2Client(
+            server.url, 'root', 'icinga',
+            transport=lambda client: Http2Transport(
+                client, max_streams=4, http1_connections=3))
+
+    def test_fallback(self):
+        with MockIcinga(hosts=3, services_per_host=1,
+                        latency=0.01) as server:
+            client = self.client(server)
+            transport = client.transport
+            results = []
+
+            def list_hosts():
+                results.append(len(client.objects.list('Host')))
+
+            threads = [threading.Thread(target=list_hosts)
+                       for _ in range(12)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(10)
+            client.close()
+        self.assertEqual(results, [3] * 12)
+        # plain http doesn't negotiate h2
+        self.assertEqual(transport.negotiated, 'HTTP/1.1')
+        self.assertEqual(transport.stats(), {'HTTP/1.1': 12})
+        self.assertEqual(transport.max_connections, 3)
+
+    def test_stream_first(self):
+        with MockIcinga(hosts=3, services_per_host=1,
+                        event_count=2) as server:
+            client = self.client(server)
+            events = client.events.subscribe(['CheckResult'], 'q')
+            next(events)
+            self.assertEqual(client.transport.negotiated, 'HTTP/1.1')
+            self.assertEqual(len(client.objects.list('Host')), 3)
+            self.assertEqual(len(list(events)), 1)
+            client.close()
+
+
+class CompressionTest(unittest.TestCase):
+    '''
+    compressed responses and request bodies
+    '''
+
+    def test_encode(self):
+        transport = Transport([])
+        small = {'attrs': ['name']}
+        large = {'filter_vars': {'names': ['host'] * 100}}
+        plain = (json.dumps(small).encode('utf-8'),
+                 {'Content-Type': 'application/json'})
+        # not compressed without compress_requests
+        self.assertEqual(transport.encode(large)[1], plain[1])
+        transport.client.compress_requests = 100
+        self.assertEqual(transport.encode(small), plain)
+        body, headers = transport.encode(large)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        with gzip.GzipFile(fileobj=io.BytesIO(body)) as compressed:
+            self.assertEqual(json.loads(compressed.read().decode('utf-8')),
+                             large)
+        self.assertEqual(transport.headers['Accept-Encoding'], 'identity')
+        transport.client.compression = True
+        self.assertEqual(transport.headers['Accept-Encoding'],
+                         'gzip, deflate')
+
+    def test_transports(self):
+        with MockIcinga(hosts=20, services_per_host=2, event_count=3,
+                        compression=6) as server:
+            plain = Icinga2Client(server.url, 'root', 'icinga')
+            expected = plain.objects.list('Service')
+            plain_bytes = server.bytes_sent
+            names = [service['name'] for service in expected]
+            for name in installed(server.url):
+                client = Icinga2Client(server.url, 'root', 'icinga',
+                                       transport=name, compression=True,
+                                       compress_requests=0)
+                sent = server.bytes_sent
+                self.assertEqual(client.objects.list('Service'), expected)
+                self.assertTrue(server.bytes_sent - sent < plain_bytes / 2)
+                received = server.bytes_received
+                found = client.objects.get_many('Service', names)
+                self.assertEqual(len(found), len(names))
+                self.assertTrue(server.bytes_received - received <
+                                len(json.dumps(names)) / 2)
+                events = list(client.events.subscribe(['CheckResult'], 'q'))
+                self.assertEqual(len(events), 3)
+                client.close()
+            plain.close()
+
+
+if __name__ == '__main__':
+    unittest.main()